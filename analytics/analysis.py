@@ -1,50 +1,68 @@
 #!/usr/bin/env python3
-import sqlite3
-import pandas as pd
-from datetime import datetime
-
-DB = "data.db"  # path to API sqlite; se usar outra localização, ajuste
-
-def load_logs(start=None, end=None):
-    conn = sqlite3.connect(DB, detect_types=sqlite3.PARSE_DECLTYPES)
-    q = "SELECT * FROM access_logs "
-    params=[]
-    if start and end:
-        q += " WHERE timestamp BETWEEN ? AND ? "
-        params=[start,end]
-    df = pd.read_sql_query(q, conn, parse_dates=['timestamp'], params=params)
-    conn.close()
-    return df
-
-def daily_counts(date_str):
+from sessions import hours_per_badge, daily_sessions
+from loader import DEFAULT_COLUMNS, default_db, load_logs_lean, stream_sessions
+from cache import DailyCache
+from query import aggregate, counts_table
+from occupancy import occupancy_series, peak_occupancy
+
+DB = None  # None = réplica mais recente da API (ver loader.default_db); ou o caminho de um .db
+
+def _db():
+    # resolvido a cada chamada: uma réplica nova é usada assim que publicada
+    return DB or default_db()
+
+def load_logs(start=None, end=None, columns=DEFAULT_COLUMNS):
+    # carregamento em chunks, só as colunas pedidas, categóricas (ver loader.py)
+    return load_logs_lean(_db(), start, end, columns)
+
+def daily_counts(date_str, use_cache=False):
+    if use_cache:
+        # partição do dia em cache (só recalcula se o dia mudou, ver cache.py)
+        df = DailyCache(_db()).daily_counts(date_str, date_str)
+        if df.empty:
+            print("Nenhum log no dia", date_str); return
+        counts = df.pivot_table(index='event_type', columns='result', values='count', aggfunc='sum', fill_value=0)
+        print(f"Contagens para {date_str}:\n", counts)
+        return counts
     start = f"{date_str} 00:00:00"; end = f"{date_str} 23:59:59"
-    df = load_logs(start,end)
-    if df.empty:
+    # GROUP BY feito pelo SQLite: só as contagens saem do banco (ver query.py)
+    counts = counts_table(_db(), start=start, end=end)
+    if counts.empty:
         print("Nenhum log no dia", date_str); return
-    counts = df.groupby(['event_type','result']).size().unstack(fill_value=0)
     print(f"Contagens para {date_str}:\n", counts)
+    return counts
 
-def hours_by_collaborator(start=None,end=None):
-    df = load_logs(start,end)
-    if df.empty:
+def hours_by_collaborator(start=None,end=None,unmatched="drop",use_cache=False):
+    # pareamento vetorizado ENTRADA/ENTRY -> SAIDA/EXIT, chunk a chunk (ver sessions.py/loader.py)
+    if use_cache and start and end:
+        # sessões iniciadas em [start, end], concatenando as partições diárias
+        sessions = DailyCache(_db(), unmatched=unmatched).sessions(start, end)
+    else:
+        sessions = stream_sessions(_db(), start, end, unmatched=unmatched)
+    if sessions.empty:
         print("Nenhum log no período"); return
-    df = df.sort_values(['badge_id','timestamp'])
-    results = {}
-    for badge, g in df.groupby('badge_id'):
-        entry_time = None
-        total_hours = 0.0
-        for _, row in g.iterrows():
-            if row['event_type'] == 'ENTRADA' and row['result'] in ('GRANTED','Granted','granted',True):
-                entry_time = row['timestamp']
-            elif row['event_type'] in ('SAIDA','EXIT') and entry_time is not None:
-                delta = pd.to_datetime(row['timestamp']) - pd.to_datetime(entry_time)
-                total_hours += delta.total_seconds()/3600.0
-                entry_time = None
-        results[badge] = total_hours
-    s = pd.Series(results).sort_values(ascending=False)
+    s = hours_per_badge(sessions)
     print("Horas por colaborador (horas):\n", s)
     return s
 
+def counts_by_bucket(bucket="hour",start=None,end=None,badges=None,by=("event_type","result")):
+    # contagens por hora/dia/semana/mês (SQL) ou qualquer frequência pandas, ex. "15min"
+    return aggregate(_db(), by=by, bucket=bucket, start=start, end=end, badges=badges, distinct_badges=True)
+
+def sessions_by_day(start=None,end=None,unmatched="drop"):
+    return daily_sessions(stream_sessions(_db(), start, end, unmatched=unmatched))
+
+def occupancy(freq="1min",start=None,end=None,by_room=False):
+    # pessoas dentro a cada `freq` (+1/-1 por sessão e soma acumulada, ver occupancy.py)
+    df = load_logs(start, end, columns=("badge_id","event_type","result","timestamp","door","room"))
+    return occupancy_series(df, freq, by_room=by_room, start=start, end=end)
+
+def peak_occupancy_by_day(start=None,end=None,by_room=True):
+    df = load_logs(start, end, columns=("badge_id","event_type","result","timestamp","door","room"))
+    peaks = peak_occupancy(df, by_room=by_room)
+    print("Pico de ocupação por dia:\n", peaks)
+    return peaks
+
 if __name__ == "__main__":
     # exemplos
     daily_counts("2025-10-14")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized session engine (sessions.pair_sessions) vs. the old
+groupby/iterrows loop of hours_by_collaborator, on synthetic access logs.
+
+Usage:
+  python analytics/bench_sessions.py                       # 1M, 10M, 50M linhas
+  python analytics/bench_sessions.py --rows 1000000 --legacy-max 1000000
+
+The legacy loop is only run up to --legacy-max rows (default 1M; at 10M+ it
+takes hours) and the results of both implementations are compared there.
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from sessions import pair_sessions, hours_per_badge
+
+
+def gerar_logs(n_rows, seed=0, rows_per_badge=400):
+    """
+    Synthetic access_logs frame: each badge alternates entry/exit over consecutive
+    days, mixing ENTRADA/SAIDA and ENTRY/EXIT, ~2% denied attempts and ~1% forgotten exits.
+    """
+    rng = np.random.default_rng(seed)
+    n_badges = max(1, n_rows // rows_per_badge)
+    badge_codes = rng.integers(0, n_badges, n_rows)
+    order = np.argsort(badge_codes, kind="stable")
+    badge_codes = badge_codes[order]
+    # posição de cada linha dentro do seu badge -> entrada (par) / saída (ímpar)
+    starts = np.r_[0, np.flatnonzero(np.diff(badge_codes)) + 1]
+    counts = np.diff(np.r_[starts, n_rows])
+    pos = np.arange(n_rows) - np.repeat(starts, counts)
+    is_exit = (pos % 2) == 1
+    forgot = rng.random(n_rows) < 0.01
+    is_exit &= ~forgot
+    base = np.datetime64("2025-01-01T08:00:00", "s").astype("i8")
+    day = pos // 2
+    seconds = base + day * 86400 + np.where(is_exit, rng.integers(4 * 3600, 10 * 3600, n_rows), 0) \
+        + rng.integers(0, 1800, n_rows)
+    vocab_pt = rng.random(n_rows) < 0.5
+    event_codes = np.where(is_exit, np.where(vocab_pt, 1, 3), np.where(vocab_pt, 0, 2))
+    denied = rng.random(n_rows) < 0.02
+    event_codes = np.where(denied, 4, event_codes)
+    event_type = pd.Categorical.from_codes(event_codes, ["ENTRADA", "SAIDA", "ENTRY", "EXIT", "ACESSO_NEGADO"])
+    result = pd.Categorical.from_codes(np.where(denied, 1, 0), ["GRANTED", "DENIED"])
+    badges = pd.Categorical.from_codes(badge_codes, [f"B{i:07d}" for i in range(n_badges)])
+    return pd.DataFrame({
+        "id": np.arange(1, n_rows + 1),
+        "badge_id": badges,
+        "event_type": event_type,
+        "result": result,
+        "timestamp": pd.to_datetime(seconds, unit="s"),
+    })
+
+
+def hours_by_collaborator_loop(df):
+    """The previous implementation (groupby + iterrows), kept here only as the baseline."""
+    df = df.sort_values(['badge_id', 'timestamp'])
+    results = {}
+    for badge, g in df.groupby('badge_id', observed=True):
+        entry_time = None
+        total_hours = 0.0
+        for _, row in g.iterrows():
+            if row['event_type'] == 'ENTRADA' and row['result'] in ('GRANTED', 'Granted', 'granted', True):
+                entry_time = row['timestamp']
+            elif row['event_type'] in ('SAIDA', 'EXIT') and entry_time is not None:
+                delta = pd.to_datetime(row['timestamp']) - pd.to_datetime(entry_time)
+                total_hours += delta.total_seconds() / 3600.0
+                entry_time = None
+        results[badge] = total_hours
+    return pd.Series(results).sort_values(ascending=False)
+
+
+def medir(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark do pareamento de sessões")
+    ap.add_argument("--rows", type=int, nargs="*", default=[1_000_000, 10_000_000, 50_000_000])
+    ap.add_argument("--legacy-max", type=int, default=1_000_000,
+                    help="maior tamanho em que o loop antigo é executado")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    print(f"{'linhas':>12} {'gerar(s)':>9} {'vetorizado(s)':>14} {'badges':>11} {'loop(s)':>9} {'speedup':>8}")
+    for n in args.rows:
+        df, t_gen = medir(gerar_logs, n, args.seed)
+        sessions, t_vec = medir(lambda d: hours_per_badge(pair_sessions(d)), df)
+        linha = f"{n:>12,} {t_gen:>9.2f} {t_vec:>14.2f} {len(sessions):>11,}"
+        if n <= args.legacy_max:
+            # o loop antigo só reconhece ENTRADA como entrada: compara no mesmo vocabulário
+            only_pt = df[df["event_type"].isin(["ENTRADA", "SAIDA", "EXIT", "ACESSO_NEGADO"])]
+            legacy, t_old = medir(hours_by_collaborator_loop, only_pt)
+            novo, t_new = medir(lambda d: hours_per_badge(pair_sessions(d)), only_pt)
+            legacy = legacy[legacy > 0]
+            iguais = np.allclose(novo.reindex(legacy.index).fillna(0).to_numpy(), legacy.to_numpy())
+            linha += f" {t_old:>9.2f} {t_old / t_new:>7.0f}x {'(resultados iguais)' if iguais else '(DIVERGEM!)'}"
+        else:
+            linha += f" {'-':>9} {'-':>8}"
+        print(linha, flush=True)
+        del df, sessions
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Incremental per-day analytics cache.
+
+Per-day aggregates (event_type x result counts) and session tables are kept as
+columnar files, one partition per day:
+
+  analytics_cache/
+    manifest.json
+    counts/2025-10-14.parquet
+    sessions-drop/2025-10-14.parquet      (one directory per unmatched policy)
+
+Each partition is stamped with a fingerprint of the raw rows it was built from
+(row count and MAX(id) of that day, plus the next day for sessions, which may
+close there). `refresh()` asks SQLite for the current fingerprints of the
+range in one GROUP BY and recomputes only the days that are missing or whose
+fingerprint changed, so logs replayed late (new ids on an already cached day)
+or deleted rows invalidate just that day. `invalidate()` drops partitions by
+hand. Multi-month reports are then just a concatenation of cached partitions.
+
+Files are Parquet when pyarrow is installed (ANALYTICS_CACHE_FORMAT=feather
+also works); without pyarrow the cache falls back to pickle.
+
+Example:
+  cache = DailyCache("data.db")
+  cache.daily_counts("2025-01-01", "2025-03-31")
+  hours_per_badge(cache.sessions("2025-01-01", "2025-03-31"))
+"""
+import os
+import json
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+
+from sessions import pair_sessions, UNMATCHED_POLICIES
+from loader import load_logs_lean
+from query import aggregate
+
+CACHE_DIR = os.getenv("ANALYTICS_CACHE_DIR", "analytics_cache")
+CACHE_FORMAT = os.getenv("ANALYTICS_CACHE_FORMAT", "parquet")
+
+COUNT_COLUMNS = ["day", "event_type", "result", "count"]
+
+
+def _formato(fmt):
+    if fmt in ("parquet", "feather"):
+        try:
+            import pyarrow  # noqa: F401
+            return fmt
+        except ImportError:
+            print("[cache] pyarrow não instalado, usando pickle")
+    return "pickle"
+
+
+def _dias(start, end):
+    d0 = date.fromisoformat(start[:10])
+    d1 = date.fromisoformat(end[:10])
+    return [(d0 + timedelta(days=i)).isoformat() for i in range((d1 - d0).days + 1)]
+
+
+def _proximo(dia):
+    return (date.fromisoformat(dia) + timedelta(days=1)).isoformat()
+
+
+class DailyCache:
+    def __init__(self, db, directory=None, fmt=None, unmatched="drop"):
+        if unmatched not in UNMATCHED_POLICIES:
+            raise ValueError(f"unmatched deve ser um de {UNMATCHED_POLICIES}")
+        self.db = db
+        self.directory = directory or CACHE_DIR
+        self.fmt = _formato(fmt or CACHE_FORMAT)
+        self.unmatched = unmatched
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self.manifest = self._ler_manifest()
+
+    # ------------------ Manifest / arquivos ------------------
+    def _ler_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _gravar_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _path(self, kind, dia):
+        ext = {"parquet": ".parquet", "feather": ".feather", "pickle": ".pkl"}[self.fmt]
+        return os.path.join(self.directory, kind, dia + ext)
+
+    def _escrever(self, kind, dia, df):
+        path = self._path(kind, dia)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        df = df.reset_index(drop=True)
+        if self.fmt == "parquet":
+            df.to_parquet(tmp, index=False)
+        elif self.fmt == "feather":
+            df.to_feather(tmp)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, path)
+
+    def _ler(self, kind, dia):
+        path = self._path(kind, dia)
+        if self.fmt == "parquet":
+            return pd.read_parquet(path)
+        if self.fmt == "feather":
+            return pd.read_feather(path)
+        return pd.read_pickle(path)
+
+    @property
+    def _sessions_kind(self):
+        return f"sessions-{self.unmatched}"
+
+    # ------------------ Fingerprints ------------------
+    def fingerprints(self, start, end):
+        """{day: [rows, max_id]} for every day in [start, end] that has logs (one indexed query)."""
+        conn = sqlite3.connect(self.db)
+        try:
+            rows = conn.execute(
+                "SELECT substr(timestamp,1,10) AS dia, COUNT(*), MAX(id) FROM access_logs "
+                "WHERE timestamp >= ? AND timestamp < ? GROUP BY dia",
+                (start[:10], _proximo(end[:10]))).fetchall()
+        finally:
+            conn.close()
+        return {d: [n, m] for d, n, m in rows}
+
+    def _intervalo_db(self):
+        conn = sqlite3.connect(self.db)
+        try:
+            lo, hi = conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM access_logs").fetchone()
+        finally:
+            conn.close()
+        return lo, hi
+
+    def _stale(self, start, end):
+        dias = _dias(start, end)
+        fp = self.fingerprints(dias[0], _proximo(dias[-1]))
+        vazio = [0, None]
+        pendentes = {"counts": [], self._sessions_kind: []}
+        for dia in dias:
+            esperado = {
+                "counts": fp.get(dia, vazio),
+                # sessões abertas no dia podem fechar no dia seguinte
+                self._sessions_kind: fp.get(dia, vazio) + fp.get(_proximo(dia), vazio),
+            }
+            for kind, chave in esperado.items():
+                atual = self.manifest.get(kind, {}).get(dia)
+                if atual != chave or not os.path.exists(self._path(kind, dia)):
+                    pendentes[kind].append((dia, chave))
+        return pendentes
+
+    # ------------------ Cálculo por dia ------------------
+    def _calc_counts(self, dia):
+        counts = aggregate(self.db, by=("event_type", "result"), start=f"{dia} 00:00:00", end=f"{dia} 23:59:59")
+        counts["count"] = counts["count"].astype("int64")
+        counts.insert(0, "day", dia)
+        return counts[COUNT_COLUMNS]
+
+    def _calc_sessions(self, dia):
+        # janela de dois dias: a saída de quem entrou no dia pode cair no dia seguinte
+        fim = _proximo(dia)
+        df = load_logs_lean(self.db, f"{dia} 00:00:00", f"{fim} 23:59:59",
+                            columns=("badge_id", "event_type", "result", "timestamp"))
+        s = pair_sessions(df, unmatched=self.unmatched)
+        s = s[s["entry"] < pd.Timestamp(fim)]
+        s["badge_id"] = s["badge_id"].astype(str)
+        return s
+
+    # ------------------ API ------------------
+    def refresh(self, start=None, end=None):
+        """Recomputes missing/changed days in [start, end] (default: whole table). Returns the days rebuilt."""
+        if start is None or end is None:
+            lo, hi = self._intervalo_db()
+            if lo is None:
+                return []
+            start = start or lo
+            end = end or hi
+        calc = {"counts": self._calc_counts, self._sessions_kind: self._calc_sessions}
+        refeitos = set()
+        for kind, dias in self._stale(start, end).items():
+            for dia, chave in dias:
+                self._escrever(kind, dia, calc[kind](dia))
+                self.manifest.setdefault(kind, {})[dia] = chave
+                refeitos.add(dia)
+        if refeitos:
+            self._gravar_manifest()
+        return sorted(refeitos)
+
+    def invalidate(self, start=None, end=None):
+        """Drops cached partitions in [start, end] (default: all), e.g. after replaying old logs."""
+        for kind, dias in self.manifest.items():
+            for dia in list(dias):
+                if (start is None or dia >= start[:10]) and (end is None or dia <= end[:10]):
+                    del dias[dia]
+                    try:
+                        os.remove(self._path(kind, dia))
+                    except OSError:
+                        pass
+        self._gravar_manifest()
+
+    def _concat(self, kind, start, end):
+        self.refresh(start, end)
+        partes = [self._ler(kind, d) for d in _dias(start, end)]
+        partes = [p for p in partes if not p.empty]
+        return pd.concat(partes, ignore_index=True) if partes else None
+
+    def daily_counts(self, start, end):
+        """Long table day, event_type, result, count for [start, end]."""
+        df = self._concat("counts", start, end)
+        if df is None:
+            return pd.DataFrame({c: pd.Series(dtype="int64" if c == "count" else object) for c in COUNT_COLUMNS})
+        return df
+
+    def sessions(self, start, end):
+        """Session table (see sessions.pair_sessions) for sessions starting in [start, end]."""
+        df = self._concat(self._sessions_kind, start, end)
+        if df is None:
+            return pair_sessions(pd.DataFrame(), unmatched=self.unmatched)
+        return df.sort_values(["badge_id", "entry"], kind="stable", ignore_index=True)
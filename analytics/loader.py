@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Chunked, memory-lean loading of access_logs.
+
+ - streams the table in chunks (`iter_logs`), never holding more than one raw chunk
+ - projects only the requested columns
+ - stores event_type/result/reason/badge_id/door/room as categoricals and id as int
+ - pushes time, badge and event-type filters into the SQL WHERE clause
+ - `fold_logs`, `stream_counts` and `stream_sessions` aggregate chunk by chunk
+   without ever building the full frame
+
+By default analytics reads the newest read-only replica published by the API
+(api/snapshots.py), not the live database; see `default_db()`.
+
+Example:
+  for chunk in iter_logs(default_db(), start="2025-01-01", end="2025-02-01"):
+      ...
+"""
+import os
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from sessions import pair_sessions, normalize_event_type, normalize_result, ENTRY, EXIT
+
+ALL_COLUMNS = ("id", "badge_id", "event_type", "result", "reason", "timestamp", "door", "room")
+DEFAULT_COLUMNS = ("id", "badge_id", "event_type", "result", "timestamp")
+CATEGORICAL = ("badge_id", "event_type", "result", "reason", "door", "room")
+CHUNKSIZE = 250_000
+SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR") or os.getenv("SNAPSHOT_DIR", "snapshots")
+
+
+def _where(start=None, end=None, badges=None, event_types=None):
+    q = " WHERE 1=1 "
+    params = []
+    if start:
+        q += " AND timestamp >= ? "; params.append(start)
+    if end:
+        q += " AND timestamp <= ? "; params.append(end)
+    if badges:
+        badges = [str(b) for b in badges]
+        q += f" AND badge_id IN ({','.join('?' for _ in badges)}) "; params.extend(badges)
+    if event_types:
+        q += f" AND event_type IN ({','.join('?' for _ in event_types)}) "; params.extend(event_types)
+    return q, params
+
+
+def _lean(chunk):
+    for c in chunk.columns:
+        if c in CATEGORICAL:
+            chunk[c] = chunk[c].astype("category")
+        elif c == "timestamp":
+            chunk[c] = pd.to_datetime(chunk[c], format="ISO8601")
+        elif c == "id":
+            chunk[c] = pd.to_numeric(chunk[c], downcast="integer")
+    return chunk
+
+
+def latest_replica(directory=None):
+    """Path of the newest replica listed in <directory>/latest.json, or None."""
+    directory = directory or SNAPSHOT_DIR
+    try:
+        with open(os.path.join(directory, "latest.json"), "r", encoding="utf-8") as f:
+            path = os.path.join(directory, json.load(f)["path"])
+    except (OSError, ValueError, KeyError):
+        return None
+    return path if os.path.exists(path) else None
+
+
+def default_db():
+    """ANALYTICS_DB if set, else the newest API replica, else DB_PATH / data.db (live database)."""
+    return os.getenv("ANALYTICS_DB") or latest_replica() or os.getenv("DB_PATH", "data.db")
+
+
+def connect(db, readonly=False):
+    """sqlite3 connection; readonly=True opens the file with mode=ro (safe from worker processes)."""
+    if readonly:
+        return sqlite3.connect(f"file:{os.path.abspath(db)}?mode=ro", uri=True)
+    return sqlite3.connect(db)
+
+
+def iter_logs(db, start=None, end=None, columns=DEFAULT_COLUMNS, badges=None,
+              event_types=None, chunksize=CHUNKSIZE, order_by="id", readonly=False):
+    """Yields lean DataFrame chunks of access_logs (filters evaluated by SQLite)."""
+    cols = [c for c in columns if c in ALL_COLUMNS]
+    where, params = _where(start, end, badges, event_types)
+    q = f"SELECT {', '.join(cols)} FROM access_logs {where} ORDER BY {order_by}"
+    # sem detect_types: o parse de datas é feito vetorizado em _lean
+    conn = connect(db, readonly)
+    try:
+        for chunk in pd.read_sql_query(q, conn, params=params, chunksize=chunksize):
+            yield _lean(chunk)
+    finally:
+        conn.close()
+
+
+def concat_lean(chunks):
+    """Concatenates lean chunks keeping categoricals (categories are unioned)."""
+    chunks = [c for c in chunks if not c.empty]
+    if not chunks:
+        return pd.DataFrame()
+    out = {}
+    for c in chunks[0].columns:
+        if isinstance(chunks[0][c].dtype, pd.CategoricalDtype):
+            out[c] = union_categoricals([ch[c] for ch in chunks], ignore_order=True)
+        else:
+            out[c] = np.concatenate([ch[c].to_numpy() for ch in chunks])
+    return pd.DataFrame(out)
+
+
+def load_logs_lean(db, start=None, end=None, columns=DEFAULT_COLUMNS, **kwargs):
+    """Full frame built chunk by chunk (peak memory ~ final frame + one raw chunk)."""
+    return concat_lean(list(iter_logs(db, start, end, columns, **kwargs)))
+
+
+def fold_logs(db, fn, init, start=None, end=None, columns=DEFAULT_COLUMNS, **kwargs):
+    """acc = fn(acc, chunk) over every chunk; returns acc."""
+    acc = init
+    for chunk in iter_logs(db, start, end, columns, **kwargs):
+        acc = fn(acc, chunk)
+    return acc
+
+
+def stream_counts(db, by=("event_type", "result"), start=None, end=None, **kwargs):
+    """Row counts grouped by `by`, summed chunk by chunk."""
+    by = list(by)
+
+    def step(acc, chunk):
+        part = chunk.groupby(by, observed=True).size()
+        return part if acc is None else acc.add(part, fill_value=0)
+
+    res = fold_logs(db, step, None, start, end, columns=by, **kwargs)
+    if res is None:
+        return pd.Series(dtype="int64")
+    return res.astype("int64")
+
+
+def stream_sessions(db, start=None, end=None, unmatched="drop", **kwargs):
+    """
+    Session table (see sessions.pair_sessions) computed chunk by chunk in time order.
+    A badge whose last relevant event in a chunk is an open entry carries that
+    row to the next chunk, so sessions spanning chunk boundaries pair correctly.
+    """
+    cols = ("badge_id", "event_type", "result", "timestamp")
+    carry = None
+    parts = []
+    for chunk in iter_logs(db, start, end, cols, order_by="timestamp, id", **kwargs):
+        if carry is not None and not carry.empty:
+            chunk = concat_lean([carry, chunk])
+        kind = normalize_event_type(chunk["event_type"])
+        keep = ((kind == ENTRY) & normalize_result(chunk["result"])) | (kind == EXIT)
+        rel = chunk[keep]
+        last = rel.drop_duplicates("badge_id", keep="last")
+        carry = last[normalize_event_type(last["event_type"]) == ENTRY]
+        # as entradas em aberto ainda podem fechar no próximo chunk
+        sess = pair_sessions(chunk, unmatched=unmatched)
+        if not carry.empty and not sess.empty:
+            aberto = pd.MultiIndex.from_arrays([carry["badge_id"].astype(object).to_numpy(),
+                                                carry["timestamp"].to_numpy(dtype="datetime64[ns]")])
+            chave = pd.MultiIndex.from_arrays([sess["badge_id"].to_numpy(),
+                                               sess["entry"].to_numpy(dtype="datetime64[ns]")])
+            sess = sess[~(chave.isin(aberto) & ~sess["matched"].to_numpy())]
+        parts.append(sess)
+    if carry is not None and not carry.empty:
+        parts.append(pair_sessions(carry, unmatched=unmatched))
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pair_sessions(pd.DataFrame(), unmatched=unmatched)
+    return pd.concat(parts, ignore_index=True)
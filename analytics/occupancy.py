@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Occupancy time series (how many people were inside) from access logs.
+
+Each session (sessions.pair_sessions, paired per room) becomes a +1 delta at
+the entry and a -1 delta at the exit; the deltas are sorted (exits before
+entries at the same instant) and a cumulative sum gives the exact occupancy
+after every event. From there:
+ - `occupancy_series` resamples to any resolution ("1min", "15min", "h", ...),
+   taking the max (or last) level inside each bucket, carrying the level
+   across empty buckets
+ - `peak_occupancy` reports the peak per day (and per room) and when it happened
+
+Pairing through sessions instead of raw ENTRADA/SAIDA events keeps the count
+sane with duplicated entries and exits without entry; entries never closed are
+handled by `unmatched` (default: close at midnight, so one forgotten exit does
+not inflate every later day).
+
+Rooms come from the `room` column when the log has one (readers send their
+sala, and POST /access/decide stores it); otherwise from the `door` column
+mapped through `rooms` ({door: room}), by default the readers config in
+RFID_READERS_FILE (porta -> sala). Unmapped doors are their own room and logs
+with neither go to DEFAULT_ROOM.
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from sessions import pair_sessions
+
+DEFAULT_ROOM = "geral"
+READERS_FILE = os.getenv("RFID_READERS_FILE")
+
+
+def rooms_from_readers(path=None):
+    """{porta: sala} from the readers config (RFID_READERS_FILE), or {}."""
+    path = path or READERS_FILE
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {str(c["porta"]): c.get("sala", c["porta"]) for c in json.load(f) if "porta" in c}
+
+
+def _room_column(df, rooms):
+    room = pd.Series(np.full(len(df), None, dtype=object), index=df.index)
+    if "door" in df.columns:
+        door = df["door"].astype(object)
+        room = door.map(rooms) if rooms else door
+        room = room.where(room.notna(), door)
+    if "room" in df.columns:
+        # sala gravada no log tem prioridade; o mapeamento porta -> sala é só para logs antigos
+        gravada = df["room"].astype(object)
+        room = gravada.where(gravada.notna() & (gravada != ""), room)
+    return room.fillna(DEFAULT_ROOM).astype(str).to_numpy()
+
+
+def occupancy_deltas(df, rooms=None, unmatched="end_of_day", max_hours=12.0):
+    """DataFrame ts, room, delta (+1/-1), sorted by room, ts (exits first on ties)."""
+    if rooms is None:
+        rooms = rooms_from_readers()
+    if df.empty:
+        return pd.DataFrame({"ts": pd.Series(dtype="datetime64[ns]"),
+                             "room": pd.Series(dtype=object), "delta": pd.Series(dtype="int8")})
+    df = df.assign(room=_room_column(df, rooms))
+    partes = []
+    for room, g in df.groupby("room", sort=True):
+        s = pair_sessions(g, unmatched=unmatched, max_hours=max_hours)
+        s = s.dropna(subset=["exit"])
+        if s.empty:
+            continue
+        ts = np.concatenate([s["entry"].to_numpy(dtype="datetime64[ns]"), s["exit"].to_numpy(dtype="datetime64[ns]")])
+        delta = np.concatenate([np.ones(len(s), np.int8), -np.ones(len(s), np.int8)])
+        order = np.lexsort((delta, ts))  # no mesmo instante a saída vem antes da entrada
+        partes.append(pd.DataFrame({"ts": ts[order], "room": room, "delta": delta[order]}))
+    if not partes:
+        return occupancy_deltas(pd.DataFrame(), rooms)
+    return pd.concat(partes, ignore_index=True)
+
+
+def occupancy_levels(deltas):
+    """deltas + `level`: people inside each room right after each event (cumulative sum per room)."""
+    out = deltas.copy()
+    out["level"] = out.groupby("room", sort=False)["delta"].cumsum().astype("int32")
+    return out
+
+
+def _instantes(lv):
+    """Keeps only the level after the last event of each (room, instant)."""
+    return lv.drop_duplicates(["room", "ts"], keep="last").reset_index(drop=True)
+
+
+def _series_room(lv, freq, how, start, end):
+    lv = _instantes(lv)
+    ts = lv["ts"]
+    level = lv["level"]
+    bucket = ts.dt.floor(freq)
+    last = level.groupby(bucket).last()
+    inicio = pd.Timestamp(start).floor(freq) if start is not None else bucket.iloc[0]
+    fim = pd.Timestamp(end).floor(freq) if end is not None else bucket.iloc[-1]
+    idx = pd.date_range(inicio, fim, freq=freq)
+    # nível ao entrar no bucket = último nível de algum bucket anterior (0 antes do primeiro evento)
+    antes = last[last.index < inicio]
+    base = int(antes.iloc[-1]) if len(antes) else 0
+    carry = last.reindex(idx).ffill().shift(1).fillna(base)
+    if how == "last":
+        return last.reindex(idx).ffill().fillna(base).astype("int32")
+    peak = level.groupby(bucket).max().reindex(idx)
+    # eventos exatamente no início do bucket já substituem o nível herdado
+    no_inicio = (ts.groupby(bucket).first() == last.index.to_series()).reindex(idx, fill_value=False)
+    carry = carry.where(~no_inicio.to_numpy(), peak)
+    return np.maximum(peak.fillna(carry), carry).astype("int32")
+
+
+def occupancy_series(df, freq="1min", by_room=False, how="max", start=None, end=None,
+                     rooms=None, unmatched="end_of_day"):
+    """
+    Occupancy at resolution `freq`: Series (all rooms summed) or, with by_room,
+    a DataFrame with one column per room. how="max" is the peak inside each
+    bucket, how="last" the level at the end of it.
+    """
+    lv = occupancy_levels(occupancy_deltas(df, rooms, unmatched))
+    if lv.empty:
+        return pd.DataFrame() if by_room else pd.Series(dtype="int32")
+    if not by_room:
+        lv = lv.assign(room="total")
+        lv = occupancy_levels(lv.sort_values(["ts", "delta"], kind="stable")[["ts", "room", "delta"]])
+    start = start if start is not None else lv["ts"].min()
+    end = end if end is not None else lv["ts"].max()
+    cols = {room: _series_room(g.reset_index(drop=True), freq, how, start, end)
+            for room, g in lv.groupby("room", sort=True)}
+    out = pd.DataFrame(cols)
+    out.index.name = "ts"
+    return out if by_room else out["total"]
+
+
+def peak_occupancy(df, by_room=True, rooms=None, unmatched="end_of_day"):
+    """Peak occupancy per day (and room): columns day, room, peak, at (days with nobody inside omitted)."""
+    lv = occupancy_levels(occupancy_deltas(df, rooms, unmatched))
+    if lv.empty:
+        return pd.DataFrame(columns=["day", "room", "peak", "at"])
+    if not by_room:
+        lv = occupancy_levels(lv.sort_values(["ts", "delta"], kind="stable")[["ts", "delta"]].assign(room="total"))
+    lv = _instantes(lv)
+    lv["day"] = lv["ts"].dt.normalize()
+    lv["antes"] = lv.groupby("room", sort=False)["level"].shift(1, fill_value=0)
+    g = lv.groupby(["room", "day"], sort=True)
+    i = g["level"].idxmax()
+    out = pd.DataFrame({"peak": lv.loc[i.to_numpy(), "level"].to_numpy(),
+                        "at": lv.loc[i.to_numpy(), "ts"].to_numpy()}, index=i.index)
+    # quem atravessou a meia-noite conta no início do dia
+    inicio = g["antes"].first()
+    inicio = inicio.where(g["ts"].first().to_numpy() > inicio.index.get_level_values("day"), 0)
+    maior = inicio.to_numpy() > out["peak"].to_numpy()
+    out.loc[maior, "at"] = out.index.get_level_values("day")[maior]
+    out["peak"] = np.maximum(out["peak"].to_numpy(), inicio.to_numpy())
+    out = out.reset_index()[["day", "room", "peak", "at"]]
+    return out[out["peak"] > 0].reset_index(drop=True)  # dias só com saídas à meia-noite
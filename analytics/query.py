@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+SQL pushdown for analytics aggregations.
+
+`aggregate` builds one GROUP BY query so SQLite returns only the aggregated
+rows (a handful per bucket) instead of the whole log:
+ - grouping by any of badge_id, event_type, result, reason, door
+ - COUNT(*) and, optionally, COUNT(DISTINCT badge_id)
+ - time buckets hour/day/week/month computed from the timestamp text
+ - time range, per-badge, event-type and door filters in the WHERE clause
+ - normalize=True folds ENTRADA/ENTRY/... into ENTRY/EXIT with a CASE (see sessions.EVENT_ALIASES)
+
+Buckets SQLite can't express (any other pandas frequency, e.g. "15min")
+fall back to pandas: only the needed columns are streamed (loader.iter_logs)
+and counted chunk by chunk.
+
+Example:
+  aggregate("data.db", by=("event_type", "result"), bucket="hour",
+            start="2025-10-14 00:00:00", end="2025-10-14 23:59:59")
+"""
+import numpy as np
+import pandas as pd
+
+from loader import connect, iter_logs
+from sessions import EVENT_ALIASES, ENTRY, EXIT, normalize_event_type
+
+GROUP_COLUMNS = ("badge_id", "event_type", "result", "reason", "door")
+
+# timestamps gravados pela API: "YYYY-MM-DD HH:MM:SS"
+SQL_BUCKETS = {
+    "hour": "substr(timestamp, 1, 13) || ':00:00'",
+    "day": "substr(timestamp, 1, 10)",
+    "week": "date(timestamp, '-6 days', 'weekday 1')",  # segunda-feira da semana
+    "month": "substr(timestamp, 1, 7) || '-01'",
+}
+
+
+def _event_case():
+    entradas = [k for k, v in EVENT_ALIASES.items() if v == ENTRY]
+    saidas = [k for k, v in EVENT_ALIASES.items() if v != ENTRY]
+    lista = lambda xs: ", ".join("'" + x.replace("'", "''") + "'" for x in xs)
+    return (f"CASE WHEN upper(trim(event_type)) IN ({lista(entradas)}) THEN 'ENTRY' "
+            f"WHEN upper(trim(event_type)) IN ({lista(saidas)}) THEN 'EXIT' ELSE event_type END")
+
+
+def build_query(by=("event_type", "result"), bucket=None, start=None, end=None, badges=None,
+                event_types=None, doors=None, distinct_badges=False, normalize=False):
+    """(sql, params) for the pushed-down aggregation. Raises ValueError on unknown columns/buckets."""
+    by = list(by)
+    for c in by:
+        if c not in GROUP_COLUMNS:
+            raise ValueError(f"coluna de agrupamento inválida: {c}")
+    if bucket is not None and bucket not in SQL_BUCKETS:
+        raise ValueError(f"bucket SQL deve ser um de {tuple(SQL_BUCKETS)}")
+    # agrupa pelas expressões (um alias igual ao nome da coluna seria resolvido como a coluna crua)
+    exprs = [(SQL_BUCKETS[bucket], "bucket")] if bucket else []
+    exprs += [(_event_case() if c == "event_type" and normalize else c, c) for c in by]
+    select = [e if e == nome else f"{e} AS {nome}" for e, nome in exprs]
+    keys = [e for e, _ in exprs]
+    select.append("COUNT(*) AS count")
+    if distinct_badges:
+        select.append("COUNT(DISTINCT badge_id) AS badges")
+
+    q = f"SELECT {', '.join(select)} FROM access_logs WHERE 1=1 "
+    params = []
+    if start:
+        q += " AND timestamp >= ? "; params.append(start)
+    if end:
+        q += " AND timestamp <= ? "; params.append(end)
+    for col, valores in (("badge_id", badges), ("event_type", event_types), ("door", doors)):
+        if valores:
+            valores = [str(v) for v in valores]
+            q += f" AND {col} IN ({','.join('?' for _ in valores)}) "; params.extend(valores)
+    if keys:
+        q += f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(str(i + 1) for i in range(len(keys)))}"
+    return q, params
+
+
+def _floor(ts, freq):
+    try:
+        return ts.dt.floor(freq)
+    except ValueError:  # frequências não fixas (semana, mês): início do período
+        return ts.dt.to_period(freq).dt.start_time
+
+
+def _aggregate_pandas(db, by, freq, start, end, badges, event_types, doors, distinct_badges, normalize):
+    keys = ["bucket"] + by
+    cols = list(dict.fromkeys(by + ["badge_id", "timestamp"] + (["door"] if doors else [])))
+    counts = None
+    unicos = []
+    for chunk in iter_logs(db, start, end, cols, badges=badges, event_types=event_types):
+        if doors:
+            chunk = chunk[chunk["door"].isin([str(d) for d in doors])]
+        if chunk.empty:
+            continue
+        chunk = chunk.assign(bucket=_floor(chunk["timestamp"], freq))
+        if normalize and "event_type" in by:
+            kind = normalize_event_type(chunk["event_type"])
+            chunk["event_type"] = np.where(kind == ENTRY, "ENTRY",
+                                           np.where(kind == EXIT, "EXIT", chunk["event_type"].astype(str)))
+        parte = chunk.groupby(keys, observed=True).size()
+        counts = parte if counts is None else counts.add(parte, fill_value=0)
+        if distinct_badges:
+            unicos.append(chunk[keys + ["badge_id"]].astype({"badge_id": str}).drop_duplicates())
+    if counts is None:
+        return pd.DataFrame(columns=keys + ["count"] + (["badges"] if distinct_badges else []))
+    out = counts.astype("int64").rename("count").to_frame()
+    if distinct_badges:
+        u = pd.concat(unicos, ignore_index=True).drop_duplicates()
+        out["badges"] = u.groupby(keys, observed=True)["badge_id"].size()
+    return out.reset_index()
+
+
+def aggregate(db, by=("event_type", "result"), bucket=None, start=None, end=None, badges=None,
+              event_types=None, doors=None, distinct_badges=False, normalize=False):
+    """
+    Aggregated counts as a DataFrame (bucket?, *by, count[, badges]).
+    bucket: None, "hour", "day", "week", "month" (pushed to SQL) or any pandas
+    frequency string (pandas fallback).
+    """
+    if bucket is None or bucket in SQL_BUCKETS:
+        q, params = build_query(by, bucket, start, end, badges, event_types, doors, distinct_badges, normalize)
+        conn = connect(db, readonly=True)
+        try:
+            df = pd.read_sql_query(q, conn, params=params)
+        finally:
+            conn.close()
+        if bucket:
+            df["bucket"] = pd.to_datetime(df["bucket"])
+        return df
+    for c in by:
+        if c not in GROUP_COLUMNS:
+            raise ValueError(f"coluna de agrupamento inválida: {c}")
+    return _aggregate_pandas(db, list(by), bucket, start, end,
+                             badges, event_types, doors, distinct_badges, normalize)
+
+
+def counts_table(db, index="event_type", columns="result", **kwargs):
+    """Pivoted count table (e.g. event_type x result) straight from SQL."""
+    by = [c for c in (index, columns) if c in GROUP_COLUMNS]
+    df = aggregate(db, by=by, **kwargs)
+    if df.empty:
+        return pd.DataFrame()
+    idx = ["bucket", index] if "bucket" in df.columns else index
+    return df.pivot_table(index=idx, columns=columns, values="count", aggfunc="sum", fill_value=0)
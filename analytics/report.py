@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Parallel multi-day report: daily counts and hours per collaborator.
+
+The date range is split into partitions of --days-per-task days; each
+partition is computed in a worker process (own read-only SQLite connection,
+no shared state) and the results are merged into one report table:
+
+  day | <event_type>/<result> counts... | total | badges | hours
+
+plus the total hours per collaborator over the whole range. Sessions are
+attributed to the day they start; each partition reads one extra day so
+sessions crossing its last midnight still close.
+
+Usage:
+  python analytics/report.py 2025-01-01 2025-12-31 --workers 8 --out relatorio.csv
+  ANALYTICS_WORKERS=4 python analytics/report.py 2025-10-01 2025-10-31
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+
+from sessions import pair_sessions, daily_sessions
+from loader import default_db, load_logs_lean
+
+WORKERS = int(os.getenv("ANALYTICS_WORKERS", "0")) or os.cpu_count() or 1
+DAYS_PER_TASK = int(os.getenv("ANALYTICS_DAYS_PER_TASK", "7"))
+
+
+def particionar(start, end, days_per_task=DAYS_PER_TASK):
+    """[(first_day, last_day), ...] covering [start, end] in blocks of days_per_task days."""
+    d0 = date.fromisoformat(start[:10])
+    d1 = date.fromisoformat(end[:10])
+    partes = []
+    while d0 <= d1:
+        fim = min(d0 + timedelta(days=days_per_task - 1), d1)
+        partes.append((d0.isoformat(), fim.isoformat()))
+        d0 = fim + timedelta(days=1)
+    return partes
+
+
+def calcular_particao(db, primeiro, ultimo, unmatched="drop"):
+    """Worker: (counts per day, hours per badge per day) for [primeiro, ultimo]."""
+    fim = date.fromisoformat(ultimo) + timedelta(days=1)
+    df = load_logs_lean(db, f"{primeiro} 00:00:00", f"{fim.isoformat()} 23:59:59",
+                        columns=("badge_id", "event_type", "result", "timestamp"), readonly=True)
+    if df.empty:
+        return None, None
+    limite = pd.Timestamp(fim)
+    no_periodo = df[df["timestamp"] < limite]
+    dia = no_periodo["timestamp"].dt.normalize()
+    counts = no_periodo.groupby([dia, "event_type", "result"], observed=True).size()
+    counts.index.names = ["day", "event_type", "result"]
+    counts = counts.reset_index(name="count")
+    counts["event_type"] = counts["event_type"].astype(str)
+    counts["result"] = counts["result"].astype(str)
+
+    sess = pair_sessions(df, unmatched=unmatched)
+    sess = sess[sess["entry"] < limite]
+    horas = daily_sessions(sess, split_midnight=False)
+    horas["badge_id"] = horas["badge_id"].astype(str)
+    return counts, horas
+
+
+def gerar_relatorio(db, start, end, workers=None, days_per_task=None, unmatched="drop"):
+    """Returns (report table indexed by day, hours per collaborator)."""
+    partes = particionar(start, end, days_per_task or DAYS_PER_TASK)
+    workers = max(1, min(workers or WORKERS, len(partes)))
+    if workers == 1:
+        resultados = [calcular_particao(db, a, b, unmatched) for a, b in partes]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futs = [pool.submit(calcular_particao, db, a, b, unmatched) for a, b in partes]
+            resultados = [f.result() for f in futs]
+
+    counts = [c for c, _ in resultados if c is not None and not c.empty]
+    horas = [h for _, h in resultados if h is not None and not h.empty]
+    dias = pd.DatetimeIndex(pd.date_range(start[:10], end[:10], freq="D"), name="day")
+
+    if counts:
+        c = pd.concat(counts, ignore_index=True)
+        tabela = c.pivot_table(index="day", columns=["event_type", "result"], values="count",
+                               aggfunc="sum", fill_value=0)
+        tabela.columns = [f"{e}/{r}" for e, r in tabela.columns]
+        tabela = tabela.reindex(dias, fill_value=0)
+    else:
+        tabela = pd.DataFrame(index=dias)
+    tabela["total"] = tabela.sum(axis=1).astype("int64")
+
+    if horas:
+        h = pd.concat(horas, ignore_index=True)
+        por_dia = h.groupby("day").agg(badges=("badge_id", "nunique"), hours=("hours", "sum"))
+        tabela = tabela.join(por_dia.reindex(dias))
+        tabela["badges"] = tabela["badges"].fillna(0).astype("int64")
+        tabela["hours"] = tabela["hours"].fillna(0.0)
+        por_colab = h.groupby("badge_id")["hours"].sum().sort_values(ascending=False)
+    else:
+        tabela["badges"] = 0
+        tabela["hours"] = 0.0
+        por_colab = pd.Series(dtype=float)
+    return tabela, por_colab
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Relatório diário paralelo (contagens e horas)")
+    ap.add_argument("start", help="primeiro dia (YYYY-MM-DD)")
+    ap.add_argument("end", help="último dia (YYYY-MM-DD)")
+    ap.add_argument("--db", default=None, help="padrão: réplica mais recente da API (loader.default_db)")
+    ap.add_argument("--workers", type=int, default=None, help=f"processos (padrão {WORKERS})")
+    ap.add_argument("--days-per-task", type=int, default=None,
+                    help=f"dias por partição (padrão {DAYS_PER_TASK})")
+    ap.add_argument("--unmatched", default="drop", help="política para entradas sem saída (ver sessions.py)")
+    ap.add_argument("--out", help="grava a tabela diária em CSV")
+    args = ap.parse_args(argv)
+
+    t = time.perf_counter()
+    tabela, por_colab = gerar_relatorio(args.db or default_db(), args.start, args.end, args.workers,
+                                        args.days_per_task, args.unmatched)
+    dt = time.perf_counter() - t
+    print(f"Relatório {args.start} -> {args.end} ({len(tabela)} dias, {dt:.2f}s)")
+    print(tabela)
+    print("\nHoras por colaborador (horas):\n", por_colab)
+    if args.out:
+        tabela.to_csv(args.out, index_label="day")
+        print(f"Tabela gravada em {args.out}")
+
+
+if __name__ == "__main__":
+    main()
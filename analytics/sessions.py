@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Vectorized entry/exit session pairing for access logs.
+
+Works on whole columns with NumPy (factorized badges, one lexsort, shifted
+comparisons) instead of groupby + iterrows. Pairing rule (same as the old
+loop in analysis.hours_by_collaborator):
+ - only GRANTED entries open a session; exits close it regardless of result
+ - an entry followed (same badge) by an exit forms a session
+ - an entry followed by another entry is unmatched (the later one wins)
+ - an exit with no open entry is ignored
+
+Event vocabularies from the readers (ENTRADA/SAIDA), the API schema
+(ENTRY/EXIT) and variants are normalized by `normalize_event_type`.
+
+Unmatched entries are handled by `unmatched=`:
+ - "drop"        ignore them (previous behavior)
+ - "end_of_day"  close at the next midnight (or at the badge's next event, if earlier)
+ - "cap"         close at entry + max_hours (or at the badge's next event, if earlier)
+ - "flag"        keep them with exit = NaT and hours = NaN
+"""
+import numpy as np
+import pandas as pd
+
+ENTRY = 1
+EXIT = 2
+
+EVENT_ALIASES = {
+    "ENTRADA": ENTRY, "ENTRY": ENTRY, "IN": ENTRY, "ENTRAR": ENTRY, "CHECKIN": ENTRY,
+    "SAIDA": EXIT, "SAÍDA": EXIT, "EXIT": EXIT, "OUT": EXIT, "SAIR": EXIT, "CHECKOUT": EXIT,
+}
+GRANTED_VALUES = {"GRANTED", "TRUE", "1", "OK", "ALLOWED", "AUTORIZADO"}
+
+UNMATCHED_POLICIES = ("drop", "end_of_day", "cap", "flag")
+
+_NS_PER_HOUR = 3600 * 10**9
+_NS_PER_DAY = 24 * _NS_PER_HOUR
+
+
+def _lookup(s, fn, dtype):
+    """Applies `fn` once per distinct value of `s` and broadcasts the result through category codes."""
+    cat = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+    lut = np.array([fn(c) for c in cat.cat.categories] + [fn(None)], dtype=dtype)
+    return lut[cat.cat.codes.to_numpy()]  # code -1 (NaN) -> último item
+
+
+def normalize_event_type(s):
+    """Series of event types -> int8 array (ENTRY, EXIT or 0 for anything else)."""
+    return _lookup(s, lambda v: EVENT_ALIASES.get(str(v).strip().upper(), 0) if v is not None else 0, np.int8)
+
+
+def normalize_result(s):
+    """Series of results (GRANTED/Granted/True/1/...) -> bool array."""
+    if s.dtype == bool:
+        return s.to_numpy()
+    return _lookup(s, lambda v: v is not None and str(v).strip().upper() in GRANTED_VALUES, bool)
+
+
+def _timestamps_ns(s):
+    if not pd.api.types.is_datetime64_any_dtype(s):
+        s = pd.to_datetime(s)
+    return s.to_numpy(dtype="datetime64[ns]").view("i8")
+
+
+def pair_sessions(df, unmatched="drop", max_hours=12.0,
+                  badge_col="badge_id", ts_col="timestamp",
+                  event_col="event_type", result_col="result"):
+    """
+    Pairs entries and exits of `df` (one row per access event).
+    Returns a DataFrame with columns badge_id, entry, exit, hours, day, matched.
+    """
+    if unmatched not in UNMATCHED_POLICIES:
+        raise ValueError(f"unmatched deve ser um de {UNMATCHED_POLICIES}")
+    empty = pd.DataFrame({"badge_id": pd.Series(dtype=object),
+                          "entry": pd.Series(dtype="datetime64[ns]"),
+                          "exit": pd.Series(dtype="datetime64[ns]"),
+                          "hours": pd.Series(dtype=float),
+                          "day": pd.Series(dtype="datetime64[ns]"),
+                          "matched": pd.Series(dtype=bool)})
+    if df.empty:
+        return empty
+
+    kind = normalize_event_type(df[event_col])
+    granted = normalize_result(df[result_col])
+    keep = ((kind == ENTRY) & granted) | (kind == EXIT)
+    if not keep.any():
+        return empty
+
+    codes, uniques = pd.factorize(df[badge_col].to_numpy()[keep])
+    ts = _timestamps_ns(df[ts_col])[keep]
+    kind = kind[keep]
+
+    order = np.lexsort((ts, codes))  # estável: por badge, depois por horário
+    codes = codes[order]
+    ts = ts[order]
+    kind = kind[order]
+
+    n = len(codes)
+    same_next = np.zeros(n, dtype=bool)
+    same_next[:-1] = codes[1:] == codes[:-1]
+    next_exit = np.zeros(n, dtype=bool)
+    next_exit[:-1] = kind[1:] == EXIT
+    is_entry = kind == ENTRY
+    matched = is_entry & same_next & next_exit
+
+    m_idx = np.flatnonzero(matched)
+    entry = ts[m_idx]
+    exit_ = ts[m_idx + 1]
+    badge = codes[m_idx]
+    flags = np.ones(len(m_idx), dtype=bool)
+
+    if unmatched != "drop":
+        u_idx = np.flatnonzero(is_entry & ~matched)
+        u_entry = ts[u_idx]
+        # próximo evento do mesmo badge (entrada seguinte), se existir
+        nxt = np.full(len(u_idx), np.iinfo(np.int64).max, dtype=np.int64)
+        has_next = same_next[u_idx]
+        nxt[has_next] = ts[u_idx[has_next] + 1]
+        if unmatched == "end_of_day":
+            u_exit = np.minimum((u_entry // _NS_PER_DAY + 1) * _NS_PER_DAY, nxt)
+        elif unmatched == "cap":
+            u_exit = np.minimum(u_entry + int(max_hours * _NS_PER_HOUR), nxt)
+        else:  # flag
+            u_exit = np.full(len(u_idx), np.iinfo(np.int64).min, dtype=np.int64)  # NaT
+        entry = np.concatenate([entry, u_entry])
+        exit_ = np.concatenate([exit_, u_exit])
+        badge = np.concatenate([badge, codes[u_idx]])
+        flags = np.concatenate([flags, np.zeros(len(u_idx), dtype=bool)])
+
+    entry_dt = entry.view("datetime64[ns]")
+    exit_dt = exit_.view("datetime64[ns]")
+    hours = (exit_ - entry) / _NS_PER_HOUR
+    hours = np.where(np.isnat(exit_dt), np.nan, hours)
+    out = pd.DataFrame({
+        "badge_id": uniques[badge],
+        "entry": entry_dt,
+        "exit": exit_dt,
+        "hours": hours,
+        "day": (entry // _NS_PER_DAY * _NS_PER_DAY).view("datetime64[ns]"),
+        "matched": flags,
+    })
+    return out.sort_values(["badge_id", "entry"], kind="stable", ignore_index=True)
+
+
+def hours_per_badge(sessions):
+    """Total hours per badge, largest first."""
+    if sessions.empty:
+        return pd.Series(dtype=float)
+    return sessions.groupby("badge_id", sort=False)["hours"].sum().sort_values(ascending=False)
+
+
+def daily_sessions(sessions, split_midnight=True):
+    """
+    Per-badge, per-day table (badge_id, day, sessions, hours).
+    With split_midnight, sessions crossing midnight contribute to each day they cover.
+    """
+    s = sessions.dropna(subset=["exit"])
+    if s.empty:
+        return pd.DataFrame(columns=["badge_id", "day", "sessions", "hours"])
+    if not split_midnight:
+        g = s.groupby(["badge_id", "day"], sort=True)
+        return g["hours"].agg(sessions="size", hours="sum").reset_index()
+
+    entry = s["entry"].to_numpy(dtype="datetime64[ns]").view("i8")
+    exit_ = s["exit"].to_numpy(dtype="datetime64[ns]").view("i8")
+    first_day = entry // _NS_PER_DAY
+    n_days = np.maximum((exit_ - 1) // _NS_PER_DAY - first_day, 0) + 1  # saída às 00:00 não conta o dia seguinte
+    # uma linha por (sessão, dia coberto)
+    rep = np.repeat(np.arange(len(s)), n_days)
+    offset = np.arange(len(rep)) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+    day = (first_day[rep] + offset) * _NS_PER_DAY
+    seg_start = np.maximum(entry[rep], day)
+    seg_end = np.minimum(exit_[rep], day + _NS_PER_DAY)
+    parts = pd.DataFrame({
+        "badge_id": s["badge_id"].to_numpy()[rep],
+        "day": day.view("datetime64[ns]"),
+        "hours": (seg_end - seg_start) / _NS_PER_HOUR,
+        "first": offset == 0,  # conta a sessão só no dia em que começou
+    })
+    g = parts.groupby(["badge_id", "day"], sort=True)
+    return g.agg(sessions=("first", "sum"), hours=("hours", "sum")).reset_index()
@@ -10,25 +10,61 @@ Endpoints:
  - DELETE /collaborators/<id>  -> delete (auth)
  - POST /logs                  -> receive access log (from RPi or other)
  - GET  /logs                  -> list logs (auth + filters start/end)
+ - POST /access/decide         -> decide a tap for a thin reader and log it (auth, decisions.py)
+ - POST /button                -> button press from button.py (stored as a BOTAO log)
+ - GET  /alerts                -> recent anomaly alerts + detector state (auth)
+ - GET  /events/stream         -> server-sent events (live logs/alerts, Last-Event-ID replay; auth, also ?token=)
+ - POST /metrics/readers       -> batch of reader metric snapshots (rpi_reader/metrics.py)
+ - GET  /metrics/readers       -> latest metrics of each reader (auth)
+ - POST /snapshots             -> take a read-only analytics replica now (auth, snapshots.py)
+ - GET  /snapshots             -> latest replica, replicas kept, service state (auth)
+ - POST /admin/profile         -> start ({"duration", "interval"}) or stop ({"stop": true}) the sampling profiler (admin)
+ - GET  /admin/profile         -> profiler state and collapsed-stack files (admin)
+ - GET  /admin/profile/<file>  -> one collapsed-stack file, for flame graphs (admin)
 """
 import os
+import sys
 import sqlite3
 import hashlib
 import secrets
 import datetime
 import functools
-from flask import Flask, request, jsonify, g
+import threading
+import traceback
+from flask import Flask, request, jsonify, g, Response, stream_with_context, send_from_directory
 from pathlib import Path
 import json
+from collections import OrderedDict, deque
+from anomaly import AnomalyDetector
+from events import EventHub
+from snapshots import SnapshotService
+from decisions import DecisionEngine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # pubsub.py e profiler.py na raiz
+from profiler import SamplingProfiler
 
 # PubNub publisher helper (assumes you have a pubsub.py file that provides publish function)
 # If your pubsub.py exports a class or helper, adapt import below.
 try:
     from pubsub import AsyncConn
-    PUB = AsyncConn("AccessAPI", "access_channel")
-except Exception:
+    # só publica (a API não consome o canal); roteamento/resumos via PUBSUB_* (ver pubsub.py)
+    PUB = AsyncConn("AccessAPI", "access_channel", subscribe=False)
+except Exception as e:
+    print("[pubsub] PubNub desativado:", e)  # sem pubnub instalado, ou PUBSUB_* inválido
     PUB = None
 
+# fan-out local para /events/stream (SSE), alternativa ao PubNub (ver events.py)
+HUB = EventHub()
+
+# detector de anomalias em tempo real (ver anomaly.py); alertas também vão para o PubNub
+def _publicar_alerta(alerta):
+    print(f"[alerta] {alerta['rule']} {alerta['key']}")
+    HUB.publish({k: v for k, v in alerta.items() if k != "event"}, event="alert")
+    if PUB:
+        PUB.publish({"alert": {k: v for k, v in alerta.items() if k != "event"}}, channel=PUB.sub_channel("alerts"))
+
+DETECTOR = AnomalyDetector(sinks=[_publicar_alerta])
+
 DB_PATH = os.getenv("DB_PATH", "data.db")
 if not Path(DB_PATH).exists():
     print("DB not found - creating and running migrations...")
@@ -41,6 +77,28 @@ if not Path(DB_PATH).exists():
     conn.commit()
     conn.close()
 
+# bancos criados antes das colunas door (leitores multi-porta) e room (decisão no servidor)
+_conn = sqlite3.connect(DB_PATH)
+_colunas = [r[1] for r in _conn.execute("PRAGMA table_info(access_logs)")]
+for _col in ("door", "room"):
+    if _col not in _colunas:
+        _conn.execute(f"ALTER TABLE access_logs ADD COLUMN {_col} TEXT")
+_conn.commit()
+_conn.execute("CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp ON access_logs(timestamp)")
+_conn.commit()
+# WAL: leituras (e o backup das réplicas) não bloqueiam o push_log, e vice-versa
+_conn.execute("PRAGMA journal_mode=WAL")
+_conn.close()
+
+# réplicas somente leitura para o analytics (ver snapshots.py); SNAPSHOT_INTERVAL=0 = só sob demanda
+SNAPSHOTS = SnapshotService(DB_PATH)
+SNAPSHOTS.start()
+
+# decisões de acesso no servidor para leitores online (ver decisions.py): política
+# em memória, invalidada pelos endpoints de colaboradores
+DECISIONS = DecisionEngine(DB_PATH)
+DECISIONS.restore()
+
 app = Flask(__name__)
 
 def get_db():
@@ -66,18 +124,38 @@ def create_token(username):
     db.commit()
     return token
 
+def _autenticar(token):
+    """None if `token` is valid (sets g.username), else the error response."""
+    if not token:
+        return jsonify({"error":"missing token"}), 401
+    db = get_db()
+    row = db.execute("SELECT username, expires_at FROM api_tokens WHERE token = ?", (token,)).fetchone()
+    if not row:
+        return jsonify({"error":"invalid token"}), 403
+    if datetime.datetime.strptime(row["expires_at"], "%Y-%m-%d %H:%M:%S") < datetime.datetime.utcnow():
+        return jsonify({"error":"token expired"}), 403
+    g.username = row["username"]
+    return None
+
 def require_auth(fn):
     @functools.wraps(fn)
     def wrapper(*args, **kwargs):
-        token = request.headers.get("Authorization")
-        if not token:
-            return jsonify({"error":"missing token"}), 401
-        db = get_db()
-        row = db.execute("SELECT username, expires_at FROM api_tokens WHERE token = ?", (token,)).fetchone()
-        if not row:
-            return jsonify({"error":"invalid token"}), 403
-        if datetime.datetime.strptime(row["expires_at"], "%Y-%m-%d %H:%M:%S") < datetime.datetime.utcnow():
-            return jsonify({"error":"token expired"}), 403
+        erro = _autenticar(request.headers.get("Authorization"))
+        if erro:
+            return erro
+        return fn(*args, **kwargs)
+    return wrapper
+
+# papéis (collaborators.role) com acesso aos endpoints /admin
+ADMIN_ROLES = {r.strip().lower() for r in os.getenv("API_ADMIN_ROLES", "admin").split(",") if r.strip()}
+
+def require_admin(fn):
+    @functools.wraps(fn)
+    @require_auth
+    def wrapper(*args, **kwargs):
+        row = get_db().execute("SELECT role FROM collaborators WHERE username = ?", (g.username,)).fetchone()
+        if not row or (row["role"] or "").strip().lower() not in ADMIN_ROLES:
+            return jsonify({"error":"admin role required"}), 403
         return fn(*args, **kwargs)
     return wrapper
 
@@ -112,6 +190,7 @@ def create_collaborator():
         db.commit()
     except sqlite3.IntegrityError as e:
         return jsonify({"error":"integrity", "msg": str(e)}), 400
+    DECISIONS.policy.invalidate()
     return jsonify({"ok":True}), 201
 
 @app.route("/collaborators", methods=["GET"])
@@ -152,6 +231,7 @@ def update_collaborator(cid):
     db = get_db()
     db.execute(f"UPDATE collaborators SET {', '.join(sets)} WHERE id = ?", params)
     db.commit()
+    DECISIONS.policy.invalidate()
     return jsonify({"ok":True}), 200
 
 @app.route("/collaborators/<int:cid>", methods=["DELETE"])
@@ -160,8 +240,22 @@ def delete_collaborator(cid):
     db = get_db()
     db.execute("DELETE FROM collaborators WHERE id = ?", (cid,))
     db.commit()
+    DECISIONS.policy.invalidate()
     return jsonify({"ok":True}), 200
 
+def _difundir(payload):
+    HUB.publish(payload)
+    try:
+        DETECTOR.feed(payload)
+    except Exception:
+        pass
+    # publish via PubNub
+    try:
+        if PUB:
+            PUB.publish(payload)
+    except Exception:
+        pass
+
 @app.route("/logs", methods=["POST"])
 def push_log():
     d = request.json or {}
@@ -169,12 +263,95 @@ def push_log():
     event = d.get("event_type")
     result = d.get("result")
     reason = d.get("reason", "")
+    door = d.get("door")
+    room = d.get("room")
+    # event_id do leitor: o mesmo tap já decidido em /access/decide (resposta que
+    # chegou depois do timeout) ou já recebido (reenvio de pendente) não duplica
+    event_id = d.get("event_id")
+    if event_id and not DECISIONS.claim(event_id):
+        return jsonify({"ok":True, "duplicate":True}), 200
     db = get_db()
-    db.execute("INSERT INTO access_logs (badge_id,event_type,result,reason,timestamp) VALUES (?,?,?,?,?)",
-               (badge,event,result,reason, datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
-    db.commit()
-    payload = {"badge_id":badge,"event_type":event,"result":result,"reason":reason,"ts":datetime.datetime.utcnow().isoformat()}
-    # publish via PubNub
+    try:
+        db.execute("INSERT INTO access_logs (badge_id,event_type,result,reason,timestamp,door,room) VALUES (?,?,?,?,?,?,?)",
+                   (badge,event,result,reason, datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), door, room))
+        db.commit()
+    except Exception:
+        if event_id:
+            DECISIONS.release(event_id)
+        raise
+    # eventos decididos no leitor (offline) também movem a presença do servidor;
+    # ordenados pelo horário do evento no leitor, não pelo de chegada
+    ts = d.get("ts")
+    try:
+        ts = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        ts = None
+    try:
+        DECISIONS.observe(badge, event, result, room or door, ts)
+    except Exception:
+        # o log já está gravado: um erro aqui não pode virar 500 (o leitor reenviaria)
+        print("[decisions] erro em observe:", traceback.format_exc())
+    # horário do evento no leitor: pendentes reenviados juntos não parecem taps seguidos para o detector
+    payload = {"badge_id":badge,"event_type":event,"result":result,"reason":reason,"door":door,
+               "ts":ts.replace(" ", "T") if ts else datetime.datetime.utcnow().isoformat()}
+    _difundir(payload)
+    return jsonify({"ok":True}), 201
+
+@app.route("/access/decide", methods=["POST"])
+@require_auth
+def decide_access():
+    d = request.json or {}
+    badge = d.get("badge_id")
+    if badge is None or badge == "":
+        return jsonify({"error":"badge_id required"}), 400
+    door = d.get("door")
+    try:
+        decisao = DECISIONS.decide(badge, door, d.get("room"), d.get("event_id"))
+    except sqlite3.Error as e:
+        # nada foi registrado: o leitor decide com o cache local e envia o log depois
+        return jsonify({"error": f"decision not logged: {e}"}), 503
+    if decisao.get("duplicate"):
+        return jsonify(decisao), 200
+    _difundir({"badge_id":decisao["badge_id"],"event_type":decisao["event_type"],"result":decisao["decision"],
+               "reason":decisao["reason"],"door":door,"ts":datetime.datetime.utcnow().isoformat()})
+    return jsonify(decisao), 200
+
+# event_ids já gravados (o button.py retenta; uma resposta perdida não duplica o clique)
+_botoes_vistos = OrderedDict()
+_botoes_lock = threading.Lock()  # threaded=True: retentativas simultâneas do mesmo clique
+
+@app.route("/button", methods=["POST"])
+def push_button():
+    d = request.json or {}
+    event_id = d.get("event_id")
+    if event_id:
+        # reserva o id antes de gravar: a segunda cópia concorrente vê duplicata
+        with _botoes_lock:
+            if event_id in _botoes_vistos:
+                return jsonify({"ok":True, "duplicate":True}), 200
+            _botoes_vistos[event_id] = True
+            if len(_botoes_vistos) > 1000:
+                _botoes_vistos.popitem(last=False)
+    # horário do clique (o envio pode ter sido atrasado por retentativas)
+    ts = d.get("ts")
+    try:
+        ts = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        ts = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    door = d.get("door")
+    reason = d.get("data", "")
+    db = get_db()
+    try:
+        db.execute("INSERT INTO access_logs (badge_id,event_type,result,reason,timestamp,door) VALUES (?,?,?,?,?,?)",
+                   (None, "BOTAO", "PRESSED", reason, ts, door))
+        db.commit()
+    except Exception:
+        if event_id:
+            with _botoes_lock:
+                _botoes_vistos.pop(event_id, None)  # não gravou: a retentativa deve passar
+        raise
+    payload = {"badge_id":None,"event_type":"BOTAO","result":"PRESSED","reason":reason,"door":door,"ts":ts}
+    HUB.publish(payload, event="button")
     try:
         if PUB:
             PUB.publish(payload)
@@ -197,5 +374,123 @@ def get_logs():
     rows = db.execute(q, params).fetchall()
     return jsonify([dict(r) for r in rows])
 
+@app.route("/alerts", methods=["GET"])
+@require_auth
+def get_alerts():
+    return jsonify({"alerts": list(DETECTOR.recent), "state": DETECTOR.stats()}), 200
+
+# origem liberada para o EventSource (index.html aberto de file:// ou de outro host); vazio = sem CORS
+EVENTS_CORS_ORIGIN = os.getenv("EVENTS_CORS_ORIGIN", "*")
+
+@app.route("/events/stream", methods=["GET"])
+def events_stream():
+    # EventSource não envia cabeçalhos: o token também pode vir em ?token=
+    erro = _autenticar(request.headers.get("Authorization") or request.args.get("token"))
+    if erro:
+        return erro
+    last = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last = int(last) if last else None
+    except ValueError:
+        last = None
+    client = HUB.subscribe(last)
+    if client is None:
+        return jsonify({"error":"too many clients"}), 503
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if EVENTS_CORS_ORIGIN:
+        headers["Access-Control-Allow-Origin"] = EVENTS_CORS_ORIGIN
+    return Response(stream_with_context(HUB.stream(client)), mimetype="text/event-stream", headers=headers)
+
+# métricas enviadas pelos leitores: última + histórico curto por leitor, só em memória;
+# no máximo METRICS_MAX_READERS leitores (LRU: quem não envia há mais tempo sai primeiro)
+METRICS_HISTORY = int(os.getenv("METRICS_HISTORY", "60"))
+METRICS_MAX_READERS = int(os.getenv("METRICS_MAX_READERS", "256"))
+_metricas_leitores = OrderedDict()
+_metricas_lock = threading.Lock()
+
+@app.route("/metrics/readers", methods=["POST"])
+def push_reader_metrics():
+    d = request.json or {}
+    leitor = d.get("reader")
+    lote = d.get("batch")
+    if not leitor or not isinstance(lote, list):
+        return jsonify({"error":"reader and batch required"}), 400
+    if not all(isinstance(m, dict) for m in lote):
+        return jsonify({"error":"batch items must be objects"}), 400
+    leitor = str(leitor)
+    with _metricas_lock:
+        entrada = _metricas_leitores.get(leitor)
+        if entrada is None:
+            entrada = _metricas_leitores[leitor] = {"history": deque(maxlen=METRICS_HISTORY)}
+            if len(_metricas_leitores) > METRICS_MAX_READERS:
+                _metricas_leitores.popitem(last=False)
+        else:
+            _metricas_leitores.move_to_end(leitor)
+        entrada["history"].extend(lote)
+        entrada["latest"] = lote[-1] if lote else entrada.get("latest")
+        entrada["received_at"] = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    return jsonify({"ok":True, "received":len(lote)}), 201
+
+@app.route("/metrics/readers", methods=["GET"])
+@require_auth
+def get_reader_metrics():
+    leitor = request.args.get("reader")
+    with _metricas_lock:
+        if leitor:
+            entrada = _metricas_leitores.get(leitor)
+            if entrada is None:
+                return jsonify({"error":"unknown reader"}), 404
+            return jsonify({"reader": leitor, "received_at": entrada["received_at"],
+                            "history": list(entrada["history"])}), 200
+        return jsonify({k: {"received_at": v["received_at"], "latest": v.get("latest")}
+                        for k, v in _metricas_leitores.items()}), 200
+
+@app.route("/snapshots", methods=["POST"])
+@require_auth
+def take_snapshot():
+    try:
+        info = SNAPSHOTS.take()
+    except Exception as e:
+        return jsonify({"error": f"snapshot failed: {e}"}), 500
+    return jsonify(info), 201
+
+@app.route("/snapshots", methods=["GET"])
+@require_auth
+def list_snapshots():
+    return jsonify({"latest": SNAPSHOTS.latest(), "replicas": SNAPSHOTS.replicas(),
+                    "service": SNAPSHOTS.stats()}), 200
+
+# profiler de amostragem ligado sob demanda (ver profiler.py na raiz)
+PROFILER = SamplingProfiler("api")
+
+@app.route("/admin/profile", methods=["POST"])
+@require_admin
+def start_profile():
+    d = request.json or {}
+    if d.get("stop"):
+        PROFILER.stop()
+        return jsonify(PROFILER.status()), 200
+    try:
+        duration = float(d["duration"]) if d.get("duration") else None
+        interval = float(d["interval"]) if d.get("interval") else None
+    except (TypeError, ValueError):
+        return jsonify({"error":"duration and interval must be numbers"}), 400
+    if not PROFILER.start(duration, interval):
+        return jsonify({"error":"profiler already running"}), 409
+    return jsonify(PROFILER.status()), 202
+
+@app.route("/admin/profile", methods=["GET"])
+@require_admin
+def get_profile_status():
+    return jsonify(PROFILER.status()), 200
+
+@app.route("/admin/profile/<name>", methods=["GET"])
+@require_admin
+def get_profile(name):
+    if name not in PROFILER.files():
+        return jsonify({"error":"not found"}), 404
+    return send_from_directory(os.path.abspath(PROFILER.directory), name, mimetype="text/plain")
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=False)
+    # threaded: cada conexão SSE ocupa uma thread
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=False, threaded=True)
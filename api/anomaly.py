@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Streaming anomaly detector for access events.
+
+Fed one event at a time (push_log calls `feed` right after the INSERT), it
+keeps small sliding-window counters in memory and raises alerts immediately:
+ - negados   N ACESSO_NEGADO for the same badge within W seconds
+ - invasao   N INVASAO at the same door within W seconds
+ - cadencia  two events of the same badge less than ANOMALY_MIN_GAP seconds apart
+ - portas    ENTRADA at a different door less than ANOMALY_PORTAS_GAP seconds
+             after the previous ENTRADA of the badge (impossible walk)
+
+Every counter is a fixed ring of time buckets (O(1) per event, whatever the
+rate). State per badge/door lives in LRU maps capped at ANOMALY_MAX_KEYS, so
+memory is bounded; idle keys are the first evicted. The same alert
+(rule, key) is not repeated within ANOMALY_COOLDOWN seconds.
+
+Thresholds (env or constructor):
+  ANOMALY_NEGADOS=3/60  ANOMALY_INVASAO=3/30  ANOMALY_MIN_GAP=2
+  ANOMALY_PORTAS_GAP=10 ANOMALY_MAX_KEYS=10000 ANOMALY_COOLDOWN=60
+
+Replay mode evaluates thresholds against historical logs:
+  python api/anomaly.py --db data.db --start "2025-10-01" --negados 5/120
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict, deque, Counter
+from datetime import datetime
+
+
+def _limite(spec):
+    """'N/W' -> (N, W seconds)."""
+    n, w = str(spec).split("/")
+    return int(n), float(w)
+
+
+NEGADOS = _limite(os.getenv("ANOMALY_NEGADOS", "3/60"))
+INVASAO = _limite(os.getenv("ANOMALY_INVASAO", "3/30"))
+MIN_GAP = float(os.getenv("ANOMALY_MIN_GAP", "2"))
+PORTAS_GAP = float(os.getenv("ANOMALY_PORTAS_GAP", "10"))
+MAX_KEYS = int(os.getenv("ANOMALY_MAX_KEYS", "10000"))
+COOLDOWN = float(os.getenv("ANOMALY_COOLDOWN", "60"))
+RECENT = int(os.getenv("ANOMALY_RECENT", "200"))
+
+
+class SlidingCounter:
+    """Events in the last `window` seconds, kept in `buckets` time slots (O(buckets) = O(1)).
+
+    The window ends at the newest event seen; a late event (resent pending log)
+    older than the window is not counted and returns 0.
+    """
+    __slots__ = ("width", "counts", "slots", "ultimo")
+
+    def __init__(self, window, buckets=10):
+        self.width = window / buckets
+        self.counts = [0] * buckets
+        self.slots = [-1] * buckets
+        self.ultimo = -1  # slot mais novo já visto
+
+    def add(self, ts):
+        slot = int(ts // self.width)
+        self.ultimo = max(self.ultimo, slot)
+        minimo = self.ultimo - len(self.counts)
+        if slot <= minimo:
+            return 0  # fora da janela: o anel já reutilizou esse slot para contagens vivas
+        i = slot % len(self.counts)
+        if self.slots[i] != slot:
+            self.slots[i] = slot
+            self.counts[i] = 0
+        self.counts[i] += 1
+        return sum(c for c, s in zip(self.counts, self.slots) if s > minimo)
+
+
+class _Badge:
+    __slots__ = ("negados", "ultimo_ts", "ultima_entrada_ts", "ultima_porta")
+
+    def __init__(self, janela):
+        self.negados = SlidingCounter(janela)
+        self.ultimo_ts = None
+        self.ultima_entrada_ts = None
+        self.ultima_porta = None
+
+
+class _LRU(OrderedDict):
+    def __init__(self, max_keys, factory):
+        super().__init__()
+        self.max_keys = max_keys
+        self.factory = factory
+        self.evicted = 0
+
+    def obter(self, key):
+        v = self.get(key)
+        if v is None:
+            v = self[key] = self.factory()
+            if len(self) > self.max_keys:
+                self.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.move_to_end(key)
+        return v
+
+
+def _epoch(ts):
+    if ts is None:
+        return datetime.utcnow().timestamp()
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, datetime):
+        return ts.timestamp()
+    return datetime.fromisoformat(str(ts).replace("Z", "")).timestamp()
+
+
+class AnomalyDetector:
+    def __init__(self, negados=None, invasao=None, min_gap=None, portas_gap=None,
+                 max_keys=None, cooldown=None, sinks=None):
+        self.negados = negados or NEGADOS
+        self.invasao = invasao or INVASAO
+        self.min_gap = MIN_GAP if min_gap is None else min_gap
+        self.portas_gap = PORTAS_GAP if portas_gap is None else portas_gap
+        self.cooldown = COOLDOWN if cooldown is None else cooldown
+        max_keys = max_keys or MAX_KEYS
+        self.badges = _LRU(max_keys, lambda: _Badge(self.negados[1]))
+        self.portas = _LRU(max_keys, lambda: SlidingCounter(self.invasao[1]))
+        self._alertados = _LRU(max_keys, lambda: [None])
+        self.sinks = list(sinks or [])
+        self.recent = deque(maxlen=RECENT)
+        self.total = Counter()
+        self._lock = threading.Lock()
+
+    def _alerta(self, regra, chave, ts, evento, **extra):
+        ultimo = self._alertados.obter((regra, chave))
+        if ultimo[0] is not None and ts - ultimo[0] < self.cooldown:
+            return None
+        ultimo[0] = ts
+        alerta = {"rule": regra, "key": chave, "ts": datetime.fromtimestamp(ts).isoformat(),
+                  "event": evento, **extra}
+        self.recent.append(alerta)
+        self.total[regra] += 1
+        return alerta
+
+    def feed(self, evento, ts=None):
+        """Processes one event dict (badge_id, event_type, door, ts). Returns the alerts raised."""
+        ts = _epoch(ts if ts is not None else evento.get("ts"))
+        tipo = str(evento.get("event_type") or "").upper()
+        badge = evento.get("badge_id")
+        porta = evento.get("door")
+        alertas = []
+        with self._lock:
+            if badge is not None:
+                b = self.badges.obter(str(badge))
+                if b.ultimo_ts is not None and 0 <= ts - b.ultimo_ts < self.min_gap and tipo != "INVASAO":
+                    alertas.append(self._alerta("cadencia", str(badge), ts, evento,
+                                                gap_s=round(ts - b.ultimo_ts, 3)))
+                # evento atrasado (pendente reenviado) não recua a referência
+                b.ultimo_ts = ts if b.ultimo_ts is None else max(b.ultimo_ts, ts)
+                if tipo == "ACESSO_NEGADO":
+                    n = b.negados.add(ts)
+                    if n >= self.negados[0]:
+                        alertas.append(self._alerta("negados", str(badge), ts, evento,
+                                                    count=n, window_s=self.negados[1]))
+                elif tipo in ("ENTRADA", "ENTRY") and (b.ultima_entrada_ts is None or ts >= b.ultima_entrada_ts):
+                    if (b.ultima_entrada_ts is not None and porta is not None and b.ultima_porta is not None
+                            and porta != b.ultima_porta and ts - b.ultima_entrada_ts < self.portas_gap):
+                        alertas.append(self._alerta("portas", str(badge), ts, evento,
+                                                    from_door=b.ultima_porta, gap_s=round(ts - b.ultima_entrada_ts, 3)))
+                    b.ultima_entrada_ts = ts
+                    b.ultima_porta = porta
+            if tipo == "INVASAO":
+                n = self.portas.obter(str(porta)).add(ts)
+                if n >= self.invasao[0]:
+                    alertas.append(self._alerta("invasao", str(porta), ts, evento,
+                                                count=n, window_s=self.invasao[1]))
+        alertas = [a for a in alertas if a]
+        for a in alertas:
+            for sink in self.sinks:
+                try:
+                    sink(a)
+                except Exception:
+                    pass
+        return alertas
+
+    def stats(self):
+        with self._lock:
+            return {"badges": len(self.badges), "doors": len(self.portas),
+                    "evicted": self.badges.evicted + self.portas.evicted,
+                    "alerts": dict(self.total)}
+
+
+def replay(db, start=None, end=None, detector=None, **kwargs):
+    """Feeds historical access_logs (in id order) through a detector; returns (alerts, detector)."""
+    detector = detector or AnomalyDetector(**kwargs)
+    q = "SELECT badge_id, event_type, result, reason, timestamp, door FROM access_logs WHERE 1=1 "
+    params = []
+    if start:
+        q += " AND timestamp >= ? "; params.append(start)
+    if end:
+        q += " AND timestamp <= ? "; params.append(end)
+    q += " ORDER BY id"
+    conn = sqlite3.connect(f"file:{os.path.abspath(db)}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    alertas = []
+    try:
+        for row in conn.execute(q, params):
+            ev = dict(row)
+            alertas.extend(detector.feed(ev, ts=ev.pop("timestamp")))
+    finally:
+        conn.close()
+    return alertas, detector
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay do detector de anomalias sobre access_logs")
+    ap.add_argument("--db", default=os.getenv("DB_PATH", "data.db"))
+    ap.add_argument("--start")
+    ap.add_argument("--end")
+    ap.add_argument("--negados", type=_limite, help="N/W (ex. 3/60)")
+    ap.add_argument("--invasao", type=_limite, help="N/W (ex. 3/30)")
+    ap.add_argument("--min-gap", type=float)
+    ap.add_argument("--portas-gap", type=float)
+    ap.add_argument("--cooldown", type=float)
+    ap.add_argument("--quiet", action="store_true", help="só o resumo")
+    args = ap.parse_args(argv)
+
+    alertas, det = replay(args.db, args.start, args.end, negados=args.negados, invasao=args.invasao,
+                          min_gap=args.min_gap, portas_gap=args.portas_gap, cooldown=args.cooldown)
+    if not args.quiet:
+        for a in alertas:
+            print(f"{a['ts']}  {a['rule']:9s} {a['key']}  "
+                  + " ".join(f"{k}={v}" for k, v in a.items() if k not in ("rule", "key", "ts", "event")))
+    print(f"\n{len(alertas)} alertas: {dict(det.total)}  (estado: {det.stats()})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Server-side access decisions for thin readers (POST /access/decide).
+
+A reader in online mode (RFID_ONLINE=1) sends only {badge_id, door, room} and
+gets back the decision the reader would have taken with its own table:
+  INVASAO        badge not registered
+  ACESSO_NEGADO  permission_level < 1
+  ENTRADA/SAIDA  authorized; entry or exit depending on presence in the room
+plus the reason text the readers already log ("Primeira entrada do dia",
+"Permaneceu 42 minutos"...).
+
+ - PolicyCache keeps {badge_id: (name, authorized)} in memory, loaded with one
+   SELECT; the collaborator endpoints call invalidate(), and POLICY_TTL bounds
+   staleness when other processes write the table
+ - presence (room -> badge -> entry time) and the badges seen today live in
+   memory, rebuilt at startup from the last GRANTED ENTRADA/SAIDA of each
+   (room, badge) and kept current by observe() with the logs readers push
+   while offline
+ - decide() computes the transition, inserts the access_logs row and commits
+   under one lock, and only then applies the transition, so two readers of the
+   same room never both see "entry" and a failed insert changes nothing
+ - every tap carries the reader's event_id; an id already decided (or already
+   logged through POST /logs, see claim()) is not logged again, so a reply that
+   arrives after the reader timed out and fell back does not duplicate the event
+
+Timestamps are UTC, like the rest of access_logs, but days are the server's
+local days, like the readers' (rpi_reader/presence_store.virar_dia): at local
+midnight whoever is still inside stays inside, with the entry moved to
+midnight, and counts as already seen that day.
+"""
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+POLICY_TTL = float(os.getenv("POLICY_TTL", "300"))  # s; 0 = só invalidação explícita
+DEDUP_SIZE = int(os.getenv("DECISION_DEDUP_SIZE", "10000"))  # event_ids lembrados
+FORMATO = "%Y-%m-%d %H:%M:%S"
+
+
+def _dia_local(ts):
+    """Local day of a UTC 'YYYY-MM-DD HH:MM:SS' timestamp."""
+    return datetime.strptime(ts, FORMATO).replace(tzinfo=timezone.utc).astimezone().strftime("%Y-%m-%d")
+
+
+def _meia_noite_utc(dia):
+    """Local midnight of `dia` as a UTC timestamp string."""
+    return datetime.strptime(dia, "%Y-%m-%d").astimezone().astimezone(timezone.utc).strftime(FORMATO)
+
+
+class PolicyCache:
+    def __init__(self, db_path, ttl=None):
+        self.db_path = db_path
+        self.ttl = POLICY_TTL if ttl is None else ttl
+        self.version = 0
+        self._tabela = None
+        self._carregado = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._tabela = None
+
+    def _carregar(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT badge_id, name, username, permission_level FROM collaborators").fetchall()
+        finally:
+            conn.close()
+        # mesma regra dos leitores: permission_level >= 1 (padrão 1)
+        return {str(b): (name or username or "Sem Nome", (nivel if nivel is not None else 1) >= 1)
+                for b, name, username, nivel in rows}
+
+    def get(self, badge):
+        """(name, authorized) of a badge, or None if it is not registered."""
+        tabela = self._tabela
+        if tabela is None or (self.ttl and time.monotonic() - self._carregado > self.ttl):
+            with self._lock:
+                if self._tabela is None or (self.ttl and time.monotonic() - self._carregado > self.ttl):
+                    self._tabela = self._carregar()
+                    self._carregado = time.monotonic()
+                    self.version += 1
+                tabela = self._tabela
+        return tabela.get(str(badge))
+
+    def __len__(self):
+        return len(self._tabela or ())
+
+
+class DecisionEngine:
+    def __init__(self, db_path, policy=None):
+        self.db_path = db_path
+        self.policy = policy or PolicyCache(db_path)
+        self.presenca = {}   # sala -> {badge: horário de entrada}
+        self.hoje = set()    # badges com entrada no dia
+        self.ultimo = {}     # (sala, badge) -> timestamp do último evento aplicado
+        self.dia = None
+        self.meia_noite = ""  # início do dia local, em UTC
+        self.eventos = OrderedDict()  # event_id -> decisão (True: registrado via /logs)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # ------------------ Estado ------------------
+    def _db(self):
+        if self._conn is None:
+            # uma conexão, usada só com self._lock
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        return self._conn
+
+    def _virar_dia(self, agora):
+        dia = _dia_local(agora)
+        if self.dia is not None and dia <= self.dia:
+            return
+        # como presence_store.virar_dia: quem está dentro continua dentro, entrando à meia-noite
+        self.meia_noite = _meia_noite_utc(dia)
+        self.hoje = set()
+        self.ultimo = {}
+        for sala, presenca in self.presenca.items():
+            for badge in presenca:
+                presenca[badge] = self.meia_noite
+                self.hoje.add(badge)
+                self.ultimo[(sala, badge)] = self.meia_noite
+        self.dia = dia
+
+    def restore(self):
+        """Rebuilds presence from access_logs: who is inside, and who entered today."""
+        with self._lock:
+            self.presenca.clear()
+            self.hoje.clear()
+            self.ultimo.clear()
+            self.dia = None
+            self._virar_dia(datetime.utcnow().strftime(FORMATO))
+            db = self._db()
+            # último evento de cada (sala, badge), de qualquer dia: entrada sem saída = dentro
+            abertos = db.execute(
+                "SELECT l.badge_id, l.event_type, COALESCE(l.room, l.door), l.timestamp FROM access_logs l "
+                "JOIN (SELECT MAX(id) AS id FROM access_logs WHERE result = 'GRANTED' "
+                "      AND event_type IN ('ENTRADA','SAIDA') GROUP BY badge_id, COALESCE(room, door)) u "
+                "ON l.id = u.id").fetchall()
+            for badge, tipo, sala, ts in abertos:
+                if tipo == "ENTRADA":
+                    self._aplicar(str(badge), tipo, sala, str(ts))
+            for (badge,) in db.execute(
+                    "SELECT DISTINCT badge_id FROM access_logs WHERE timestamp >= ? AND result = 'GRANTED' "
+                    "AND event_type = 'ENTRADA'", (self.meia_noite,)):
+                self.hoje.add(str(badge))
+        return sum(len(p) for p in self.presenca.values())
+
+    def _aplicar(self, badge, tipo, sala, ts):
+        chave = (sala, badge)
+        if self.ultimo.get(chave, "") > ts:
+            return  # evento atrasado (pendente reenviado): o estado já é mais novo
+        self.ultimo[chave] = ts
+        presenca = self.presenca.setdefault(sala, {})
+        if tipo == "ENTRADA":
+            # entrada de um dia anterior ainda aberta conta a partir da meia-noite
+            presenca[badge] = max(ts, self.meia_noite)
+            self.hoje.add(badge)
+        else:
+            presenca.pop(badge, None)
+
+    def observe(self, badge, event_type, result, room, ts=None):
+        """Applies an event logged elsewhere (POST /logs) to the presence state."""
+        if badge is None or result != "GRANTED" or event_type not in ("ENTRADA", "SAIDA"):
+            return
+        ts = ts or datetime.utcnow().strftime(FORMATO)
+        with self._lock:
+            self._virar_dia(datetime.utcnow().strftime(FORMATO))
+            self._aplicar(str(badge), event_type, room, ts)
+
+    # ------------------ Duplicatas ------------------
+    def _lembrar(self, event_id, valor):
+        self.eventos[event_id] = valor
+        if len(self.eventos) > DEDUP_SIZE:
+            self.eventos.popitem(last=False)
+
+    def claim(self, event_id):
+        """True if `event_id` was not decided nor logged yet (and marks it as logged)."""
+        with self._lock:
+            if event_id in self.eventos:
+                return False
+            self._lembrar(event_id, True)
+            return True
+
+    def release(self, event_id):
+        """Undoes claim() when the log could not be stored (the reader will resend it)."""
+        with self._lock:
+            if self.eventos.get(event_id) is True:
+                del self.eventos[event_id]
+
+    # ------------------ Decisão ------------------
+    def decide(self, badge, door, room=None, event_id=None):
+        """Decision + presence transition; the access_logs row is committed before returning."""
+        badge = str(badge)
+        sala = room or door
+        politica = self.policy.get(badge)
+        with self._lock:
+            if event_id and event_id in self.eventos:
+                anterior = self.eventos[event_id]
+                if anterior is True:  # o leitor já registrou pelo cache local
+                    return {"badge_id": badge, "event_id": event_id, "duplicate": True}
+                return dict(anterior, duplicate=True)
+            agora = datetime.utcnow().strftime(FORMATO)
+            self._virar_dia(agora)
+            transicao = None
+            sessao_s = None
+            if politica is None:
+                nome, tipo, result, motivo = None, "INVASAO", "DENIED", "Tag não cadastrada"
+            elif not politica[1]:
+                nome, tipo, result, motivo = politica[0], "ACESSO_NEGADO", "DENIED", "Colaborador sem autorização"
+            else:
+                nome, result = politica[0], "GRANTED"
+                entrada = self.presenca.get(sala, {}).get(badge)
+                if entrada is None:
+                    tipo, transicao = "ENTRADA", "entry"
+                    motivo = "Retorno à sala" if badge in self.hoje else "Primeira entrada do dia"
+                else:
+                    tipo, transicao = "SAIDA", "exit"
+                    sessao_s = int((datetime.strptime(agora, FORMATO) - datetime.strptime(entrada, FORMATO)).total_seconds())
+                    motivo = f"Permaneceu {sessao_s // 60} minutos"
+            db = self._db()
+            try:
+                cur = db.execute("INSERT INTO access_logs (badge_id,event_type,result,reason,timestamp,door,room) "
+                                 "VALUES (?,?,?,?,?,?,?)", (badge, tipo, result, motivo, agora, door, room))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            if transicao:
+                self._aplicar(badge, tipo, sala, agora)
+            decisao = {"badge_id": badge, "door": door, "room": room, "name": nome,
+                       "decision": result, "event_type": tipo, "transition": transicao,
+                       "reason": motivo, "session_s": sessao_s, "timestamp": agora,
+                       "log_id": cur.lastrowid, "policy_version": self.policy.version,
+                       "event_id": event_id}
+            if event_id:
+                self._lembrar(event_id, decisao)
+        return decisao
+
+    def stats(self):
+        return {"policy_badges": len(self.policy), "policy_version": self.policy.version,
+                "inside": {sala: len(p) for sala, p in self.presenca.items()}, "day": self.dia}
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+In-process fan-out hub for server-sent events (GET /events/stream).
+
+push_log publishes every stored event into the hub; each connected dashboard
+gets its own bounded queue. The hub keeps:
+ - a ring buffer of the last EVENTS_RING events, so a client reconnecting with
+   `Last-Event-ID` (EventSource does it automatically) gets what it missed;
+   when the id is older than the ring, a `reset` event tells it to reload
+   through GET /logs
+ - bounded per-client queues (EVENTS_CLIENT_QUEUE): a client that falls that
+   far behind is disconnected instead of slowing push_log or growing memory;
+   its EventSource reconnects and catches up from the ring
+ - at most EVENTS_MAX_CLIENTS concurrent streams
+
+No network service involved, so it works (and can be tested) fully offline,
+alongside pubsub.AsyncConn.
+
+Wire format:  id: <n>\\nevent: <access|alert|button|reset>\\ndata: <json>\\n\\n
+plus a `: ping` comment every EVENTS_HEARTBEAT seconds.
+"""
+import os
+import json
+import queue
+import threading
+from collections import deque
+
+RING_SIZE = int(os.getenv("EVENTS_RING", "1000"))
+CLIENT_QUEUE = int(os.getenv("EVENTS_CLIENT_QUEUE", "256"))
+MAX_CLIENTS = int(os.getenv("EVENTS_MAX_CLIENTS", "100"))
+HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+
+_FIM = object()
+
+
+class Client:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lagged = False
+
+    def offer(self, item):
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.lagged = True
+            return False
+
+    def close(self):
+        # garante espaço para o marcador de fim
+        while True:
+            try:
+                self.queue.put_nowait(_FIM)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class EventHub:
+    def __init__(self, ring_size=None, client_queue=None, max_clients=None):
+        self.ring = deque(maxlen=ring_size or RING_SIZE)
+        self.client_queue = client_queue or CLIENT_QUEUE
+        self.max_clients = max_clients or MAX_CLIENTS
+        self.clients = set()
+        self.last_id = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def publish(self, data, event="access"):
+        """Assigns the next id, stores in the ring and fans out. Never blocks."""
+        with self._lock:
+            self.last_id += 1
+            item = (self.last_id, event, json.dumps(data, ensure_ascii=False, default=str))
+            self.ring.append(item)
+            lentos = [c for c in self.clients if not c.offer(item)]
+            for c in lentos:
+                self.clients.discard(c)
+                self.dropped += 1
+        for c in lentos:
+            c.close()
+        return item[0]
+
+    def subscribe(self, last_event_id=None):
+        """New client, pre-filled with the ring events after last_event_id. None when full."""
+        with self._lock:
+            if len(self.clients) >= self.max_clients:
+                return None
+            c = Client(self.client_queue + len(self.ring))
+            if last_event_id is not None:
+                primeiro = self.ring[0][0] if self.ring else self.last_id + 1
+                if last_event_id + 1 < primeiro:
+                    c.offer((self.last_id, "reset", json.dumps({"reason": "gap", "last_id": self.last_id})))
+                for item in self.ring:
+                    if item[0] > last_event_id:
+                        c.offer(item)
+            self.clients.add(c)
+            return c
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self.clients.discard(client)
+
+    def stream(self, client, heartbeat=None):
+        """Generator of SSE frames for `client` (ends when the client is dropped)."""
+        heartbeat = HEARTBEAT if heartbeat is None else heartbeat
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    item = client.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if item is _FIM:
+                    return
+                id_, event, data = item
+                yield f"id: {id_}\nevent: {event}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(client)
+
+    def stats(self):
+        with self._lock:
+            return {"clients": len(self.clients), "last_id": self.last_id,
+                    "ring": len(self.ring), "dropped_clients": self.dropped}
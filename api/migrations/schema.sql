@@ -16,8 +16,12 @@ CREATE TABLE IF NOT EXISTS access_logs (
   event_type TEXT,        -- "ENTRY", "EXIT", "ATTEMPT"
   result TEXT,            -- "GRANTED" ou "DENIED"
   reason TEXT,
-  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+  door TEXT,              -- porta/leitor que gerou o evento (leitores multi-porta)
+  room TEXT               -- sala da porta (presença das decisões no servidor)
 );
+-- filtros por período feitos no SQL (analytics)
+CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp ON access_logs(timestamp);
 
 -- tokens simples (opcional)
 CREATE TABLE IF NOT EXISTS api_tokens (
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Online, consistent read-only replicas of data.db for analytics.
+
+Long pandas reads on the live database hold read locks next to push_log's
+writes; analytics reads a replica instead. A replica is made with SQLite's
+online backup API, a few pages per step (SNAPSHOT_PAGES, sleeping
+SNAPSHOT_SLEEP between steps), so the API never waits on it:
+ - the API database runs in WAL mode; the backup holds one read transaction
+   on the source for its whole duration, so writers keep committing to the
+   WAL and the copy is the consistent state at the start of the backup
+   (without that, every write by another connection restarts the backup)
+ - with a rollback journal (WAL off) it still works step by step, but a
+   busy writer can make it restart
+ - the copy is switched to journal_mode=DELETE (a single file, readable with
+   mode=ro), made read-only (0444), renamed into place and published in
+   `latest.json`; only the last SNAPSHOT_KEEP replicas are kept
+
+  snapshots/
+    latest.json                      {"path", "taken_at", "max_id", "seconds", ...}
+    data-20251014T120000123456.db
+
+Analytics (analytics/loader.default_db) opens the replica in latest.json
+automatically. Replicas are taken every SNAPSHOT_INTERVAL seconds (0 = only on
+demand through POST /snapshots) or from the command line:
+  python api/snapshots.py --db data.db            # one replica now
+  python api/snapshots.py --db data.db --every 300
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "0"))
+SNAPSHOT_PAGES = int(os.getenv("SNAPSHOT_PAGES", "256"))
+SNAPSHOT_SLEEP = float(os.getenv("SNAPSHOT_SLEEP", "0.005"))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+MANIFEST = "latest.json"
+
+
+class SnapshotService:
+    def __init__(self, db, directory=None, interval=None, pages=None, sleep=None, keep=None):
+        self.db = db
+        self.directory = directory or SNAPSHOT_DIR
+        self.interval = SNAPSHOT_INTERVAL if interval is None else interval
+        self.pages = pages or SNAPSHOT_PAGES
+        self.sleep = SNAPSHOT_SLEEP if sleep is None else sleep
+        self.keep = max(1, keep or SNAPSHOT_KEEP)
+        self.taken = 0
+        self.failed = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------ Réplica ------------------
+    def take(self):
+        """Makes one replica and publishes it in latest.json. Returns its manifest entry."""
+        with self._lock:
+            try:
+                info = self._take()
+            except Exception as e:
+                self.failed += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            self.taken += 1
+            self.last_error = None
+            return info
+
+    def _take(self):
+        os.makedirs(self.directory, exist_ok=True)
+        agora = datetime.utcnow()
+        nome = f"data-{agora.strftime('%Y%m%dT%H%M%S%f')}.db"
+        destino = os.path.join(self.directory, nome)
+        tmp = destino + ".tmp"
+        passos = [0, 0, None]  # passos, reinícios, páginas restantes no passo anterior
+
+        def progresso(status, restantes, total):
+            passos[0] += 1
+            if passos[2] is not None and restantes > passos[2]:
+                passos[1] += 1  # fonte alterada por outra conexão: o backup recomeçou
+            passos[2] = restantes
+
+        inicio = time.perf_counter()
+        src = sqlite3.connect(self.db, timeout=30)
+        dst = sqlite3.connect(tmp)
+        try:
+            wal = src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+            if wal:
+                # transação de leitura aberta = cópia consistente sem bloquear quem escreve
+                src.execute("BEGIN")
+                src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            src.backup(dst, pages=self.pages, progress=progresso, sleep=self.sleep)
+            if wal:
+                src.rollback()
+            dst.execute("PRAGMA journal_mode=DELETE")  # arquivo único, abre com mode=ro
+            max_id, ultimo = dst.execute("SELECT MAX(id), MAX(timestamp) FROM access_logs").fetchone()
+            paginas = dst.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            src.close()
+            dst.close()
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, destino)
+        info = {"path": nome, "taken_at": agora.strftime("%Y-%m-%d %H:%M:%S"),
+                "max_id": max_id, "last_timestamp": ultimo, "pages": paginas,
+                "bytes": os.path.getsize(destino), "steps": passos[0], "restarts": passos[1],
+                "wal": wal, "seconds": round(time.perf_counter() - inicio, 3)}
+        manifesto = os.path.join(self.directory, MANIFEST)
+        with open(manifesto + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        os.replace(manifesto + ".tmp", manifesto)
+        self._podar()
+        return info
+
+    def _podar(self):
+        replicas = self.replicas()
+        for nome in replicas[:-self.keep]:
+            try:
+                os.remove(os.path.join(self.directory, nome))  # quem já abriu continua lendo (Linux)
+            except OSError:
+                pass
+
+    def replicas(self):
+        """Replica file names, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(n for n in os.listdir(self.directory) if n.startswith("data-") and n.endswith(".db"))
+
+    def latest(self):
+        return latest_replica_info(self.directory)
+
+    # ------------------ Periódico ------------------
+    def start(self):
+        if self.interval <= 0 or self._thread:
+            return None
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="snapshots")
+        self._thread.start()
+        return self._thread
+
+    def _worker(self):
+        while not self._stop.wait(self.interval):
+            try:
+                info = self.take()
+                print(f"[snapshot] {info['path']} ({info['bytes'] // 1024} KB, {info['seconds']}s)")
+            except Exception as e:
+                print("[snapshot] erro:", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self):
+        return {"taken": self.taken, "failed": self.failed, "last_error": self.last_error,
+                "interval_s": self.interval, "keep": self.keep, "directory": self.directory}
+
+
+def latest_replica_info(directory=None):
+    """Manifest of the newest replica (with an absolute `file`), or None."""
+    directory = directory or SNAPSHOT_DIR
+    try:
+        with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    info["file"] = os.path.abspath(os.path.join(directory, info["path"]))
+    return info if os.path.exists(info["file"]) else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Réplicas somente leitura do data.db (backup online do SQLite)")
+    ap.add_argument("--db", default=os.getenv("DB_PATH", "data.db"))
+    ap.add_argument("--dir", default=None, help=f"diretório das réplicas (padrão {SNAPSHOT_DIR})")
+    ap.add_argument("--every", type=float, default=0, help="repete a cada N segundos")
+    ap.add_argument("--pages", type=int, default=None, help=f"páginas por passo (padrão {SNAPSHOT_PAGES})")
+    ap.add_argument("--keep", type=int, default=None, help=f"réplicas mantidas (padrão {SNAPSHOT_KEEP})")
+    args = ap.parse_args(argv)
+
+    svc = SnapshotService(args.db, args.dir, pages=args.pages, keep=args.keep)
+    while True:
+        info = svc.take()
+        print(json.dumps(info, ensure_ascii=False))
+        if args.every <= 0:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
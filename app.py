@@ -6,7 +6,7 @@ import os
 
 DB_PATH = os.getenv("DB_PATH", "data.db")
 app = Flask(__name__)
-pub = AsyncConn("Access API", "meu_canal")
+pub = AsyncConn("Access API", "meu_canal", subscribe=False)  # só publica
 
 def get_db():
     if 'db' not in g:
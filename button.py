@@ -1,39 +1,171 @@
 
-import RPi.GPIO as GPIO
+import os
+import sys
+import json
+import uuid
+import queue
+import threading
+import time
+from datetime import datetime
+
 import requests
-from time import sleep
 
-pushbutton_pin = 8
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "rpi_reader"))
+import hardware
+from hardware import get_gpio
+
+# mesma variável dos leitores (rpi_reader/reader_core.py)
+API_URL = os.getenv("ACCESS_API_URL", "http://localhost:5000")
+BUTTON_URL = f"{API_URL}/button"
+pushbutton_pin = int(os.getenv("BUTTON_PIN", "8"))
+PORTA = os.getenv("RFID_PORTA", "principal")
+DEBOUNCE_MS = int(os.getenv("BUTTON_DEBOUNCE_MS", "200"))
+PENDING_FILE = os.getenv("BUTTON_PENDING_FILE", "button_pending.jsonl")
+RETRY_MAX_S = float(os.getenv("BUTTON_RETRY_MAX_S", "30"))
 
+GPIO = get_gpio()
 GPIO.setmode(GPIO.BOARD)
 GPIO.setup(pushbutton_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
+# Cada pressionamento vira um evento na fila (o callback da interrupção só enfileira);
+# a thread de envio entrega com retentativas, então nenhum clique se perde durante um POST.
+fila_botao = queue.Queue()
+stop_event = threading.Event()
+ultimo_clique = 0.0
+descartados_debounce = 0
+# event_ids lidos de PENDING_FILE ainda não entregues: o arquivo só sai quando todos forem
+pendentes_carregados = set()
+pendentes_lock = threading.Lock()
+
+
+def novo_evento():
+    return {"event_id": uuid.uuid4().hex, "data": "Botão pressionado", "door": PORTA,
+            "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")}
+
+
+# Callback da interrupção (thread do RPi.GPIO): debounce em software + fila
+def on_press(channel):
+    global ultimo_clique, descartados_debounce
+    agora = time.monotonic()
+    if agora - ultimo_clique < DEBOUNCE_MS / 1000.0:
+        descartados_debounce += 1
+        return
+    ultimo_clique = agora
+    fila_botao.put(novo_evento())
+    print("Botão pressionado")
+
+
 # Função para enviar o POST request
-def send_post_request():
-    data = {'data': 'Botão pressionado'}
+def send_post_request(evento=None):
+    evento = evento or novo_evento()
     try:
-        response = requests.post('http://localhost:5000', json=data)
-        if response.status_code == 201:
+        response = requests.post(BUTTON_URL, json=evento, timeout=5)
+        if response.status_code in (200, 201):
             print("Mensagem enviada com sucesso!")
-        else:
-            print(f"Erro ao enviar mensagem: {response.status_code}")
+            return True
+        print(f"Erro ao enviar mensagem: {response.status_code}")
     except Exception as e:
         print(f"Erro na conexão: {e}")
+    return False
+
+
+def sender_worker():
+    espera = 0.5
+    while True:
+        evento = fila_botao.get()
+        if evento is None:
+            return
+        # retenta o mesmo evento (backoff exponencial) até entregar ou encerrar;
+        # event_id permite à API descartar duplicatas de uma resposta perdida
+        while not send_post_request(evento):
+            if stop_event.wait(espera):
+                salvar_pendentes([evento])
+                return
+            espera = min(espera * 2, RETRY_MAX_S)
+        espera = 0.5
+        entregue(evento)
+
+
+# Pendentes sobrevivem a reinícios (arquivo JSONL)
+def salvar_pendentes(extra=()):
+    eventos = list(extra)
+    while True:
+        try:
+            e = fila_botao.get_nowait()
+        except queue.Empty:
+            break
+        if e is not None:
+            eventos.append(e)
+    if not eventos:
+        return
+    # os não entregues do arquivo estão na fila (ou em `extra`): reescreve no lugar do antigo
+    with pendentes_lock:
+        with open(PENDING_FILE + ".tmp", "w", encoding="utf-8") as f:
+            for e in eventos:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(PENDING_FILE + ".tmp", PENDING_FILE)
+        pendentes_carregados.clear()
+    print(f"{len(eventos)} clique(s) salvos em {PENDING_FILE}")
+
+
+def carregar_pendentes():
+    # o arquivo fica até a entrega (ver entregue): uma queda agora não perde os cliques
+    if not os.path.exists(PENDING_FILE):
+        return
+    with open(PENDING_FILE, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                evento = json.loads(linha)
+            except ValueError:
+                continue
+            pendentes_carregados.add(evento.get("event_id"))
+            fila_botao.put(evento)
+    if not pendentes_carregados and os.path.exists(PENDING_FILE):
+        os.remove(PENDING_FILE)
+
+
+def entregue(evento):
+    """Removes PENDING_FILE once every click loaded from it was delivered."""
+    with pendentes_lock:
+        if evento.get("event_id") not in pendentes_carregados:
+            return
+        pendentes_carregados.discard(evento.get("event_id"))
+        if not pendentes_carregados and os.path.exists(PENDING_FILE):
+            os.remove(PENDING_FILE)
+
+
+def simular_cliques():
+    # RFID_HARDWARE=sim: cada Enter no terminal é um clique
+    for _ in sys.stdin:
+        GPIO.press(pushbutton_pin)
+
 
 if __name__ == "__main__":
     result = int(input("1-Executar método\n2-Iniciar aplicação"))
-    
+
     if result == 1:
         send_post_request()
     else:
+        carregar_pendentes()
+        sender = threading.Thread(target=sender_worker, daemon=True)
+        sender.start()
+        # borda de subida por interrupção: CPU ~0 enquanto ninguém aperta
+        GPIO.add_event_detect(pushbutton_pin, GPIO.RISING, callback=on_press, bouncetime=DEBOUNCE_MS)
+        if hardware.HARDWARE == "sim":
+            threading.Thread(target=simular_cliques, daemon=True).start()
         try:
-            while True:
-                if GPIO.input(pushbutton_pin) == GPIO.HIGH:
-                    print("Botão pressionado")
-                    send_post_request()
-                    sleep(0.5)
+            while not stop_event.wait(1.0):
+                pass
         except KeyboardInterrupt:
             print("Programa interrompido")
         finally:
+            GPIO.remove_event_detect(pushbutton_pin)
+            stop_event.set()
+            fila_botao.put(None)
+            sender.join(timeout=10)
+            salvar_pendentes()
+            if descartados_debounce:
+                print(f"{descartados_debounce} bounce(s) descartados")
             GPIO.cleanup()
-
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+On-demand sampling profiler for the API and the readers (no extra dependency).
+
+While enabled, a daemon thread wakes every PROF_INTERVAL seconds, takes the
+stack of every other thread with sys._current_frames() and counts it. Nothing
+is traced per call, so the profiled code runs at full speed; the cost is the
+sampling itself, which holds the GIL for a moment. That cost is measured on
+every sample and the sampler sleeps longer when it goes above PROF_MAX_OVERHEAD
+(fraction of wall time, default 1%). A run stops after its duration (at most
+PROF_MAX_S) or on stop(), and is written in collapsed-stack format, one line
+per distinct stack, ready for flamegraph.pl or speedscope:
+
+  MainThread;main_loop (reader_core.py:621);wait (threading.py:604) 412
+  leitor-principal;reader_worker (reader_core.py:560);processar_acesso (reader_core.py:398) 37
+
+Files go to PROF_DIR as <name>-<UTC time>.folded.
+  API:     POST /admin/profile {"duration": 30}; GET /admin/profile/<file>
+  readers: kill -USR2 <pid> starts a run; a second USR2 stops it early
+
+Example:
+  prof = SamplingProfiler("api")
+  prof.start(duration=30)
+  ...
+  prof.stop(); prof.wait(); prof.last["file"]
+"""
+import os
+import sys
+import time
+import signal
+import threading
+from collections import Counter
+from datetime import datetime
+
+PROF_DIR = os.getenv("PROF_DIR", "profiles")
+PROF_INTERVAL = float(os.getenv("PROF_INTERVAL", "0.01"))      # segundos entre amostras
+PROF_DURATION = float(os.getenv("PROF_DURATION", "30"))        # duração padrão de uma coleta
+PROF_MAX_S = float(os.getenv("PROF_MAX_S", "300"))             # teto de duração, mesmo se pedido mais
+PROF_MAX_OVERHEAD = float(os.getenv("PROF_MAX_OVERHEAD", "0.01"))
+PROF_MAX_DEPTH = int(os.getenv("PROF_MAX_DEPTH", "64"))
+
+
+def _frame(f):
+    co = f.f_code
+    # primeira linha da função (não a linha atual): uma função = um quadro no flame graph
+    return f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})"
+
+
+def collapse(frame, prefix, max_depth=PROF_MAX_DEPTH):
+    """'prefix;outermost;...;innermost' for one thread's current frame."""
+    pilha = []
+    while frame is not None and len(pilha) < max_depth:
+        pilha.append(_frame(frame))
+        frame = frame.f_back
+    pilha.append(prefix)
+    return ";".join(reversed(pilha))
+
+
+class SamplingProfiler:
+    def __init__(self, name="proc", directory=None, interval=None, max_overhead=None):
+        self.name = name
+        self.directory = directory or PROF_DIR
+        self.interval = interval or PROF_INTERVAL
+        self.max_overhead = max_overhead or PROF_MAX_OVERHEAD
+        self.last = None  # resumo da última coleta concluída
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._run = None
+
+    # ------------------ Controle ------------------
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=None, interval=None):
+        """Starts a run in the background; False if one is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            duration = min(float(duration or PROF_DURATION), PROF_MAX_S)
+            self._stop.clear()
+            self._run = {"started_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                         "duration_s": duration, "interval_s": float(interval or self.interval),
+                         "samples": 0, "overhead": 0.0}
+            self._thread = threading.Thread(target=self._sample, args=(self._run,),
+                                            daemon=True, name="profiler")
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Ends the running collection early (the file is written by the sampler thread)."""
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        t = self._thread
+        if t is not None:
+            t.join(timeout)
+        return self.last
+
+    def toggle(self, duration=None):
+        if self.running:
+            self.stop()
+            return False
+        return self.start(duration)
+
+    def status(self):
+        return {"running": self.running, "current": dict(self._run) if self.running else None,
+                "last": self.last, "files": self.files()}
+
+    def files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(n for n in os.listdir(self.directory) if n.endswith(".folded"))
+
+    # ------------------ Coleta ------------------
+    def _sample(self, run):
+        proprio = threading.get_ident()
+        pilhas = Counter()
+        intervalo = run["interval_s"]
+        limite = self.max_overhead
+        inicio = time.perf_counter()
+        fim = inicio + run["duration_s"]
+        custo_total = 0.0
+        espera = intervalo
+        while not self._stop.wait(espera):
+            t0 = time.perf_counter()
+            if t0 >= fim:
+                break
+            nomes = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid != proprio:
+                    pilhas[collapse(frame, nomes.get(tid, f"thread-{tid}"))] += 1
+            run["samples"] += 1
+            custo = time.perf_counter() - t0
+            custo_total += custo
+            # se a amostra custou mais que o orçamento, espaça as próximas
+            espera = max(intervalo, custo * (1 - limite) / limite)
+            run["overhead"] = round(custo_total / max(time.perf_counter() - inicio, 1e-9), 5)
+        run["elapsed_s"] = round(time.perf_counter() - inicio, 3)
+        run["stacks"] = len(pilhas)
+        run["file"] = self._gravar(pilhas)
+        self.last = run
+
+    def _gravar(self, pilhas):
+        os.makedirs(self.directory, exist_ok=True)
+        # microssegundos no nome: duas coletas no mesmo segundo não se sobrescrevem
+        nome = f"{self.name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.folded"
+        path = os.path.join(self.directory, nome)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for pilha, n in pilhas.most_common():
+                f.write(f"{pilha} {n}\n")
+        os.replace(path + ".tmp", path)
+        print(f"[profiler] {len(pilhas)} pilhas em {path}")
+        return nome
+
+    # ------------------ Sinal ------------------
+    def install_signal(self, signum=getattr(signal, "SIGUSR2", None), duration=None):
+        """kill -USR2 <pid> starts a run of `duration` s; a second one stops it (main thread only)."""
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False  # Windows, ou fora da thread principal (signal.signal não permite)
+
+        def handler(sig, frame):
+            print("[profiler] iniciado" if self.toggle(duration) else "[profiler] parando")
+
+        signal.signal(signum, handler)
+        return True
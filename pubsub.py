@@ -1,24 +1,150 @@
 
+import os
+import time
+import threading
+from collections import Counter, defaultdict
+
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.pubnub import PubNub
 
+# Roteamento por site/porta: com PUBSUB_ROUTE=1 cada evento vai para
+# "<canal>.<site>.<porta>" (ex. access_channel.matriz.principal), alertas para
+# "<canal>.alerts" e resumos para "<canal>.summary". Um dashboard assina só as
+# portas que mostra (ou "<canal>.<site>.*" com wildcard habilitado no PubNub).
+SITE = os.getenv("PUBSUB_SITE", "site")
+ROUTE = os.getenv("PUBSUB_ROUTE", "0") == "1"
+PUBLISH_ONLY = os.getenv("PUBSUB_PUBLISH_ONLY", "0") == "1"
+SUMMARY_INTERVAL = float(os.getenv("PUBSUB_SUMMARY_INTERVAL", "0"))  # 0 = sem resumos
+RAW = os.getenv("PUBSUB_RAW", "1") == "1"  # 0 = só resumos, sem um publish por evento
+
+
+def _canal_seguro(nome):
+    # PubNub não aceita , : * / \ espaço em nomes de canal
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(nome))
+
+
 class AsyncConn:
-    def __init__(self, id: str, channel_name: str) -> None:
+    def __init__(self, id: str, channel_name: str, subscribe: bool = None, route: bool = None,
+                 site: str = None, summary_interval: float = None, raw: bool = None) -> None:
+        self.raw = RAW if raw is None else raw
+        self.summary_interval = SUMMARY_INTERVAL if summary_interval is None else summary_interval
+        if not self.raw and self.summary_interval <= 0:
+            # sem eventos crus e sem resumos, publish() descartaria tudo em silêncio
+            raise ValueError("raw=False (PUBSUB_RAW=0) exige summary_interval > 0 (PUBSUB_SUMMARY_INTERVAL)")
+        self.subscribe_enabled = (not PUBLISH_ONLY) if subscribe is None else subscribe
         config = PNConfiguration()
         config.subscribe_key = 'sub-c-7926c31d-f8fd-45e1-b1ea-3547d857274c'
         config.publish_key = 'pub-c-9b1959c5-4f1d-4ce6-b22e-66e5225235e5'
         config.user_id = id
-        config.enable_subscribe = True
+        config.enable_subscribe = self.subscribe_enabled
         config.daemon = True
 
         self.pubnub = PubNub(config)
         self.channel_name = channel_name
+        self.route = ROUTE if route is None else route
+        self.site = site or SITE
+        self.subscriptions = []
+        self.publicadas = 0
+
+        if self.subscribe_enabled:
+            print(f"Configurando conexão com o canal '{self.channel_name}'...")
+            self.subscribe([self.channel_name])
+        else:
+            print(f"Conexão só de publicação no canal '{self.channel_name}'")
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._resumo_reset()
+        self._thread = None
+        if self.summary_interval > 0:
+            self._thread = threading.Thread(target=self._summary_worker, daemon=True)
+            self._thread.start()
 
-        print(f"Configurando conexão com o canal '{self.channel_name}'...")
-        subscription = self.pubnub.channel(self.channel_name).subscription()
-        subscription.subscribe()
+    # ------------------ Canais ------------------
+    def sub_channel(self, *partes):
+        """Channel for a message class ("alerts", "summary", ...) — the base channel when routing is off."""
+        if not self.route:
+            return self.channel_name
+        return ".".join([self.channel_name] + [_canal_seguro(p) for p in partes])
 
-    def publish(self, data: dict):
+    def channel_for(self, data: dict):
+        """Channel of an access event: <canal>.<site>.<porta> when routing, else the base channel."""
+        return self.sub_channel(data.get("site") or self.site, data.get("door") or "geral")
+
+    def subscribe(self, channels, on_message=None):
+        """Subscribes to `channels` (e.g. only the doors a dashboard shows); on_message(channel, data)."""
+        if not self.subscribe_enabled:
+            raise RuntimeError("conexão criada só para publicação (subscribe=False)")
+        for ch in channels:
+            subscription = self.pubnub.channel(ch).subscription()
+            if on_message:
+                subscription.on_message = lambda m, cb=on_message: cb(m.channel, m.message)
+            subscription.subscribe()
+            self.subscriptions.append(subscription)
+
+    # ------------------ Publicação ------------------
+    def publish(self, data: dict, channel: str = None):
+        if channel is None and "event_type" in data:
+            self._contar(data)
+            if not self.raw:
+                return
+            channel = self.channel_for(data)
+        channel = channel or self.channel_name
         print("tentando enviar uma mensagem")
-        self.pubnub.publish().channel(self.channel_name).message(data).sync()
+        self.pubnub.publish().channel(channel).message(data).sync()
+        self.publicadas += 1
+
+    # ------------------ Resumos periódicos ------------------
+    def _resumo_reset(self):
+        self._inicio = time.time()
+        self._tipos = Counter()
+        self._portas = defaultdict(Counter)
+
+    def _contar(self, data):
+        if self.summary_interval <= 0:
+            return
+        tipo = str(data.get("event_type") or "")
+        porta = data.get("door") or "geral"
+        with self._lock:
+            self._tipos[tipo] += 1
+            self._portas[porta][tipo] += 1
+
+    def summary(self):
+        """Counts since the last summary (and resets them): per event type and per door, with occupancy delta."""
+        with self._lock:
+            fim = time.time()
+            msg = {
+                "type": "summary", "site": self.site,
+                "from": self._inicio, "to": fim, "window_s": round(fim - self._inicio, 3),
+                "counts": dict(self._tipos),
+                "doors": {p: {"counts": dict(c),
+                              "occupancy_delta": c["ENTRADA"] + c["ENTRY"] - c["SAIDA"] - c["EXIT"]}
+                          for p, c in self._portas.items()},
+            }
+            self._resumo_reset()
+        return msg
+
+    def _summary_worker(self):
+        while not self._stop.wait(self.summary_interval):
+            msg = self.summary()
+            if not msg["counts"]:
+                continue  # nada a resumir: não gasta mensagem
+            try:
+                self.publish(msg, channel=self.sub_channel("summary"))
+            except Exception as e:
+                print("Erro ao publicar resumo:", e)
 
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self.summary_interval > 0:
+            msg = self.summary()
+            if msg["counts"]:
+                try:
+                    self.publish(msg, channel=self.sub_channel("summary"))
+                except Exception as e:
+                    print("Erro ao publicar resumo:", e)
+        if self.subscribe_enabled:
+            self.pubnub.unsubscribe_all()
+        self.pubnub.stop()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Storage benchmark for the reader backends (storage.py): json, sqlite, memory.
+
+For each backend, in a fresh temporary directory, measures:
+ - append   pending logs appended one by one (what the sender does while the API is down)
+ - drain    pending() + remove_pending() in batches (what the flush worker does)
+ - cache    save_collaborators(), cold load_collaborators() on a reopened backend,
+            and lookups in the loaded table
+ - presence journal appends + one snapshot
+and the bytes written by each phase, from /proc/self/io: `wchar` (bytes handed
+to write()) and `write_bytes` (bytes sent to the block device, the SD-card
+wear; 0 on tmpfs). Run it on the device itself, on the card the reader uses:
+
+  python rpi_reader/bench_storage.py --dir /home/pi/bench --logs 2000 --colabs 20000
+  RFID_PENDING_FSYNC=0 RFID_SQLITE_SYNC=FULL python rpi_reader/bench_storage.py --json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+import storage
+
+
+def io_counters():
+    """(wchar, write_bytes) of this process, or (None, None) outside Linux."""
+    try:
+        with open("/proc/self/io", "r") as f:
+            campos = dict(linha.split(": ") for linha in f.read().splitlines())
+        return int(campos["wchar"]), int(campos["write_bytes"])
+    except Exception:
+        return None, None
+
+
+class Fase:
+    def __init__(self):
+        self.segundos = 0.0
+        self.wchar = None
+        self.write_bytes = None
+
+    def __enter__(self):
+        self._io = io_counters()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self._t0
+        fim = io_counters()
+        if self._io[0] is not None and fim[0] is not None:
+            self.wchar = fim[0] - self._io[0]
+            self.write_bytes = fim[1] - self._io[1]
+        return False
+
+    def resumo(self, n=None, unidade="ops"):
+        out = {"s": round(self.segundos, 4), "wchar": self.wchar, "write_bytes": self.write_bytes}
+        if n:
+            out[f"{unidade}_por_s"] = round(n / max(self.segundos, 1e-9), 1)
+        return out
+
+
+def tamanho_dir(path):
+    total = 0
+    for raiz, _, arquivos in os.walk(path):
+        for a in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, a))
+            except OSError:
+                pass
+    return total
+
+
+def abrir(nome, diretorio):
+    if nome == "json":
+        return storage.JsonStorage(directory=diretorio)
+    if nome == "sqlite":
+        return storage.SqliteStorage(path=os.path.join(diretorio, "rpi_local.db"))
+    return storage.MemoryStorage()
+
+
+def medir_backend(nome, base, n_logs=2000, n_colabs=20000, n_lookups=20000, n_presenca=2000, lote=100, seed=42):
+    rnd = random.Random(seed)
+    diretorio = tempfile.mkdtemp(prefix=f"bench_storage_{nome}_", dir=base)
+    cwd = os.getcwd()
+    os.chdir(diretorio)  # estado/ legado do SQLite é relativo ao diretório
+    res = {"backend": nome, "dir": diretorio}
+    try:
+        st = abrir(nome, diretorio)
+        logs = [{"badge_id": 100000000 + rnd.randrange(n_colabs), "event_type": rnd.choice(("ENTRADA", "SAIDA")),
+                 "result": "GRANTED", "reason": "Retorno à sala", "door": "principal"} for _ in range(n_logs)]
+
+        with Fase() as f:
+            for log in logs:
+                st.append_pending(log)
+        res["append"] = f.resumo(n_logs, "logs")
+
+        with Fase() as f:
+            drenados = 0
+            while True:
+                itens = st.pending(lote)
+                if not itens:
+                    break
+                st.remove_pending([pid for pid, _ in itens])
+                drenados += len(itens)
+        res["drain"] = f.resumo(drenados, "logs")
+
+        colabs = [(100000000 + i, {"nome": f"Colaborador {i}", "autorizado": i % 30 != 0}) for i in range(n_colabs)]
+        with Fase() as f:
+            st.save_collaborators(colabs)
+        res["cache_save"] = f.resumo(n_colabs, "colabs")
+        if nome != "memory":  # reabre: leitura a frio, como num boot
+            st.close()
+            st = abrir(nome, diretorio)
+        with Fase() as f:
+            tabela = st.load_collaborators()
+        res["cache_load"] = f.resumo(n_colabs, "colabs")
+        tags = [100000000 + rnd.randrange(n_colabs * 2) for _ in range(n_lookups)]
+        with Fase() as f:
+            for t in tags:
+                tabela.get(t)
+        res["lookup"] = f.resumo(n_lookups, "lookups")
+
+        with Fase() as f:
+            agora = datetime.now()
+            for i in range(n_presenca):
+                st.journal("entrada" if i % 2 == 0 else "saida", 100000000 + (i // 2) % n_colabs, "sala", agora)
+        res["presence_journal"] = f.resumo(n_presenca, "ops")
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            estado = st.restore()
+        with Fase() as f:
+            st.snapshot(estado)
+        res["presence_snapshot"] = f.resumo()
+        st.close()
+        res["disco_bytes"] = tamanho_dir(diretorio)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(diretorio, ignore_errors=True)
+    return res
+
+
+def _kb(v):
+    return "-" if v is None else f"{v / 1024:.0f}"
+
+
+def imprimir(resultados):
+    print("=" * 78)
+    print("💾 BENCHMARK DE ARMAZENAMENTO DO LEITOR")
+    print("=" * 78)
+    print(f"{'fase':18s}" + "".join(f"{r['backend']:>20s}" for r in resultados))
+    linhas = (("append", "logs_por_s", "append logs/s"), ("drain", "logs_por_s", "drain logs/s"),
+              ("cache_save", "colabs_por_s", "cache save col/s"), ("cache_load", "s", "cache load s"),
+              ("lookup", "lookups_por_s", "lookups/s"), ("presence_journal", "ops_por_s", "presença ops/s"),
+              ("presence_snapshot", "s", "snapshot s"))
+    for fase, chave, rotulo in linhas:
+        print(f"{rotulo:18s}" + "".join(f"{r[fase][chave]:>20}" for r in resultados))
+    print("\nKB escritos (wchar / write_bytes):")
+    for fase in ("append", "drain", "cache_save", "presence_journal", "presence_snapshot"):
+        print(f"  {fase:16s}" + "".join(
+            f"{_kb(r[fase]['wchar']) + ' / ' + _kb(r[fase]['write_bytes']):>20s}" for r in resultados))
+    print(f"{'disco final KB':18s}" + "".join(f"{_kb(r['disco_bytes']):>20s}" for r in resultados))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Vazão e volume de escrita dos backends de armazenamento do leitor")
+    ap.add_argument("--backends", default="json,sqlite,memory")
+    ap.add_argument("--dir", help="onde criar os arquivos (use o cartão SD do leitor); padrão: tmp")
+    ap.add_argument("--logs", type=int, default=2000)
+    ap.add_argument("--colabs", type=int, default=20000)
+    ap.add_argument("--lookups", type=int, default=20000)
+    ap.add_argument("--presenca", type=int, default=2000)
+    ap.add_argument("--lote", type=int, default=100, help="pendentes por lote no drain")
+    ap.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = ap.parse_args(argv)
+
+    resultados = []
+    for nome in args.backends.split(","):
+        nome = nome.strip()
+        if nome not in storage.BACKENDS:
+            ap.error(f"backend desconhecido: {nome}")
+        resultados.append(medir_backend(nome, args.dir, args.logs, args.colabs, args.lookups,
+                                        args.presenca, args.lote))
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    else:
+        imprimir(resultados)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
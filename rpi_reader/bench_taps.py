@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Tap-replay benchmark for the RFID readers (runs on any Linux box, no Pi needed).
+
+Replays a shift-change trace through the reader's own `main_loop`/`main` and
+`processar_acesso` using the simulated hardware backend, and reports:
+ - taps per minute (offered by the trace and actually processed)
+ - tap -> decision latency (tag presented -> registrar_evento called)
+ - tap -> feedback latency (tag presented -> first LED/buzzer change)
+ - pending-queue growth (logs that could not be pushed to the API)
+ - per-stage breakdown from the reader's own instrumentation (metrics.py)
+
+All times are simulated seconds; `--speed` only compresses wall-clock time.
+
+Usage:
+  python rpi_reader/bench_taps.py --reader tag_reader_rpi.py --colabs 300 --speed 50
+  python rpi_reader/bench_taps.py --reader rpi_reader/tag_reader_rpi_sqlite.py --api-fail 0.3
+  python rpi_reader/bench_taps.py --storage memory   # motor com outro backend
+  python rpi_reader/bench_taps.py --save-trace turno.csv   # só gera o trace
+"""
+import os
+import io
+import sys
+import json
+import random
+import argparse
+import tempfile
+import importlib.util
+import contextlib
+from datetime import datetime, timedelta
+
+import hardware
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE = os.path.join(ROOT, "rpi_reader", "reader_core.py")
+
+
+# ------------------ Geração de trace de troca de turno ------------------
+def gerar_trace_troca_turno(n_colabs=200, janela=900, seed=42,
+                            frac_negados=0.03, frac_desconhecidos=0.01, frac_repique=0.05):
+    """
+    Builds a shift-change trace: half the staff (shift A) is inside and leaves,
+    the other half (shift B) arrives, both waves peaking in the middle of `janela` seconds.
+    Returns (trace, colaboradores, dentro) where `dentro` are the badges already inside.
+    """
+    rnd = random.Random(seed)
+    colaboradores = {}
+    badges = [100000000 + i for i in range(n_colabs)]
+    for b in badges:
+        colaboradores[b] = {"nome": f"Colab {b}", "autorizado": rnd.random() >= frac_negados}
+    turno_a = set(badges[: n_colabs // 2])
+    taps = []
+    meio = janela / 2.0
+    for b in badges:
+        # chegadas/saídas concentradas no meio da janela (triangular)
+        t = rnd.triangular(0, janela, meio)
+        taps.append((t, b))
+        if rnd.random() < frac_repique:
+            taps.append((t + rnd.uniform(0.2, 2.0), b))  # crachá aproximado duas vezes
+    for _ in range(max(1, int(n_colabs * frac_desconhecidos))):
+        taps.append((rnd.uniform(0, janela), 900000000 + rnd.randrange(100000)))
+    taps.sort(key=lambda t: t[0])
+    dentro = {b for b in turno_a if colaboradores[b]["autorizado"]}
+    return taps, colaboradores, dentro
+
+
+# ------------------ Utilitários ------------------
+def percentis(valores, ps=(50, 90, 99)):
+    if not valores:
+        out = {f"p{p}": None for p in ps}
+        out["max"] = None
+        return out
+    v = sorted(valores)
+    out = {}
+    for p in ps:
+        k = min(len(v) - 1, max(0, int(round(p / 100.0 * (len(v) - 1)))))
+        out[f"p{p}"] = round(v[k], 4)
+    out["max"] = round(v[-1], 4)
+    return out
+
+
+def _importar(path, nome):
+    spec = importlib.util.spec_from_file_location(nome, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def carregar_leitor(path, storage=None):
+    """Imports a reader as a fresh module (nothing runs until main_loop/main).
+    Thin scripts (STORAGE = ...) resolve to a fresh reader_core with that backend."""
+    mod = _importar(path, "leitor_bench")
+    storage = storage or getattr(mod, "STORAGE", None)
+    if storage:
+        os.environ["RFID_STORAGE"] = storage
+        mod = _importar(CORE, "leitor_bench_core")
+    return mod
+
+
+def tamanho_pending(mod):
+    """Logs not yet accepted by the API: outbound queue + pending store."""
+    fila = mod.fila_envio.qsize() if hasattr(mod, "fila_envio") else 0
+    if getattr(mod, "storage", None) is not None:
+        return fila + mod.storage.pending_stats()[0]
+    if hasattr(mod, "load_pending"):
+        return fila + len(mod.load_pending())
+    if hasattr(mod, "get_pending_sqlite"):
+        return fila + len(mod.get_pending_sqlite())
+    return fila
+
+
+# ------------------ Execução ------------------
+def run(reader_path, trace, colaboradores, dentro=(), speed=50.0,
+        api_latency=0.05, api_fail=0.0, seed=1, verbose=False, storage=None):
+    hardware.HARDWARE = "sim"
+    rnd = random.Random(seed)
+    clock = hardware.SimClock(speed)
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_taps_")
+    os.chdir(workdir)
+    try:
+        mod = carregar_leitor(reader_path, storage)
+        mod.time = clock
+        if hasattr(mod, "metricas"):
+            mod.metricas.relogio = clock.monotonic  # etapas em segundos simulados
+        mod.FLUSH_INTERVAL = max(0.05, getattr(mod, "FLUSH_INTERVAL", 20) / speed)
+
+        # API falsa: latência e taxa de falha configuráveis
+        def fake_push(log):
+            clock.sleep(api_latency)
+            return rnd.random() >= api_fail
+
+        # mesma estrutura que o leitor usa após sincronizar (tabela compacta, ver badge_table.py)
+        tabela = mod.BadgeTable.from_items(colaboradores.items()) if hasattr(mod, "BadgeTable") else dict(colaboradores)
+
+        def fake_fetch():
+            mod.colaboradores = tabela
+            return True
+
+        mod.push_log_to_api = fake_push
+        mod.fetch_collaborators_from_api = fake_fetch
+        mod.colaboradores = tabela
+        for b in dentro:
+            mod.presenca_sala[b] = {"dentro": True, "entrada": datetime.now() - timedelta(hours=8),
+                                    "tempo_total": timedelta(0)}
+            mod.historico_diario[b] = True
+
+        mod.init_hardware()
+        reader = hardware.SimulatedReader(trace, clock)
+        mod.leitorRfid = reader
+        for p in getattr(mod, "portas", {}).values():
+            p["leitor"] = reader
+        gpio = mod.GPIO
+
+        taps = []
+        fila = []  # (t, pendentes)
+        atual = [None]
+
+        def on_gpio(ts, pin, value):
+            rec = atual[0]
+            if rec is not None and rec["feedback"] is None and value not in (0, ("pwm_duty", 0)):
+                rec["feedback"] = ts
+
+        gpio.listeners.append(on_gpio)
+
+        orig_processar = mod.processar_acesso
+        orig_registrar = mod.registrar_evento
+
+        def processar(tag_id, *args):
+            rec = {"tag": tag_id, "tap": reader.last_scheduled_at, "read": reader.last_read_at,
+                   "decision": None, "feedback": None}
+            atual[0] = rec
+            orig_processar(tag_id, *args)
+            atual[0] = None
+            taps.append(rec)
+            fila.append((clock.time(), tamanho_pending(mod)))
+
+        def registrar(*args, **kwargs):
+            rec = atual[0]
+            if rec is not None and rec["decision"] is None:
+                rec["decision"] = clock.time()
+            return orig_registrar(*args, **kwargs)
+
+        mod.processar_acesso = processar
+        mod.registrar_evento = registrar
+
+        entry = getattr(mod, "main_loop", None) or getattr(mod, "main")
+        t_inicio = clock.time()
+        out = sys.stdout if verbose else io.StringIO()
+        with contextlib.redirect_stdout(out):
+            entry()
+        t_fim = clock.time()
+        etapas = mod.metricas.snapshot()["stages"] if hasattr(mod, "metricas") else {}
+    finally:
+        os.chdir(cwd)
+
+    duracao_trace = (trace[-1][0] - trace[0][0]) if len(trace) > 1 else 0.0
+    decisao = [r["decision"] - r["tap"] for r in taps if r["decision"] is not None]
+    feedback = [r["feedback"] - r["tap"] for r in taps if r["feedback"] is not None]
+    espera = [r["read"] - r["tap"] for r in taps if r["read"] is not None]
+    pend_final = fila[-1][1] if fila else 0
+    pend_max = max((p for _, p in fila), default=0)
+    elapsed = max(1e-9, t_fim - t_inicio)
+    return {
+        "reader": os.path.relpath(reader_path, ROOT) + (f" [{mod.storage.nome}]" if getattr(mod, "storage", None) else ""),
+        "taps_trace": len(trace),
+        "taps_processados": len(taps),
+        "taps_descartados_debounce": len(trace) - len(taps),
+        "taps_por_minuto_oferecidos": round(len(trace) / max(duracao_trace / 60.0, 1e-9), 2),
+        "taps_por_minuto_processados": round(len(taps) / (elapsed / 60.0), 2),
+        "espera_na_porta_s": percentis(espera),
+        "tap_para_decisao_s": percentis(decisao),
+        "tap_para_feedback_s": percentis(feedback),
+        "pending_max": pend_max,
+        "pending_final": pend_final,
+        "pending_crescimento_por_min": round(pend_final / (elapsed / 60.0), 2),
+        "duracao_simulada_s": round(elapsed, 1),
+        "etapas": etapas,
+        "workdir": workdir,
+    }
+
+
+def imprimir(res):
+    print("=" * 60)
+    print(f"📈 BENCHMARK DE TAPS - {res['reader']}")
+    print("=" * 60)
+    print(f"  Taps no trace: {res['taps_trace']}  processados: {res['taps_processados']}"
+          f"  descartados (debounce): {res['taps_descartados_debounce']}")
+    print(f"  Taps/min oferecidos: {res['taps_por_minuto_oferecidos']}"
+          f"  processados: {res['taps_por_minuto_processados']}")
+    for k, rotulo in (("espera_na_porta_s", "Espera na porta"),
+                      ("tap_para_decisao_s", "Tap -> decisão"),
+                      ("tap_para_feedback_s", "Tap -> feedback")):
+        p = res[k]
+        print(f"  {rotulo:16s} p50={p['p50']}s p90={p['p90']}s p99={p['p99']}s max={p['max']}s")
+    print(f"  Pending: max={res['pending_max']} final={res['pending_final']}"
+          f" (+{res['pending_crescimento_por_min']}/min)")
+    if res.get("etapas"):
+        print("  Etapas (ms):")
+        for nome, e in sorted(res["etapas"].items()):
+            if e["count"]:
+                print(f"    {nome:20s} n={e['count']:<6} p50={e['p50_ms']} p90={e['p90_ms']} max={e['max_ms']}")
+    print(f"  Duração simulada: {res['duracao_simulada_s']}s  (arquivos em {res['workdir']})")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay de taps pelos leitores RFID com hardware simulado")
+    ap.add_argument("--reader", default=os.path.join(ROOT, "tag_reader_rpi.py"),
+                    help="script do leitor (tag_reader_rpi.py ou rpi_reader/tag_reader_rpi_sqlite.py)")
+    ap.add_argument("--storage", choices=("json", "sqlite", "memory"),
+                    help="backend do reader_core (padrão: o do script)")
+    ap.add_argument("--trace", help="CSV offset_s,tag_id; se omitido gera uma troca de turno")
+    ap.add_argument("--save-trace", help="salva o trace gerado e sai")
+    ap.add_argument("--colabs", type=int, default=200)
+    ap.add_argument("--janela", type=float, default=900, help="duração da troca de turno (s)")
+    ap.add_argument("--speed", type=float, default=50.0, help="fator de aceleração do relógio")
+    ap.add_argument("--api-latency", type=float, default=0.05, help="latência simulada do POST /logs (s)")
+    ap.add_argument("--api-fail", type=float, default=0.0, help="fração de POST /logs que falham")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    ap.add_argument("--verbose", action="store_true", help="mostra a saída do leitor")
+    args = ap.parse_args(argv)
+
+    trace, colabs, dentro = gerar_trace_troca_turno(args.colabs, args.janela, args.seed)
+    if args.save_trace:
+        hardware.save_trace(args.save_trace, trace)
+        print(f"Trace salvo em {args.save_trace} ({len(trace)} taps)")
+        return
+    if args.trace:
+        trace = hardware.load_trace(args.trace)
+
+    res = run(os.path.abspath(args.reader), trace, colabs, dentro, args.speed,
+              args.api_latency, args.api_fail, args.seed, args.verbose, args.storage)
+    if args.json:
+        print(json.dumps(res, indent=2, ensure_ascii=False))
+    else:
+        imprimir(res)
+
+
+if __name__ == "__main__":
+    main()
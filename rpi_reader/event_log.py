@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Bounded-memory streaming event log for the readers.
+
+Every event is appended to a CSV file as soon as it happens (so a power loss
+loses at most the last unflushed line). Files rotate by size and/or time and
+closed files can be gzip-compressed in background. Memory holds only:
+ - a ring buffer with the last N events (`recent()`, iteration, len())
+ - running aggregates used by the end-of-day report (`resumo()`; the reader
+   clears them with `zerar_resumo()` at the day rollover)
+
+Config (env):
+  EVENT_LOG_DIR        pasta dos CSVs (default "relatorios")
+  EVENT_LOG_MAX_BYTES  rotaciona quando o arquivo passa deste tamanho (default 5 MB, 0 = sem limite)
+  EVENT_LOG_ROTATE     "none", "hourly" ou "daily" (default "daily")
+  EVENT_LOG_GZIP       "1" para comprimir arquivos rotacionados
+  EVENT_LOG_KEEP       quantos arquivos rotacionados manter (default 0 = todos)
+  EVENT_LOG_BUFFER     tamanho do ring buffer em memória (default 500)
+  EVENT_LOG_FSYNC      "1" para fsync a cada evento (mais seguro, mais escrita no SD)
+"""
+import os
+import csv
+import gzip
+import glob
+import shutil
+import threading
+import traceback
+from collections import deque, Counter
+from datetime import datetime
+
+FIELDNAMES = ['timestamp', 'tipo_evento', 'tag_id', 'nome', 'autorizado', 'resultado', 'porta', 'sala']
+
+_ROTATE_FORMATS = {"hourly": "%Y%m%d%H", "daily": "%Y%m%d", "none": None}
+
+
+class EventLog:
+    def __init__(self, directory=None, prefix="eventos", fieldnames=FIELDNAMES,
+                 max_bytes=None, rotate=None, compress=None, keep=None,
+                 buffer_size=None, fsync=None):
+        self.directory = directory or os.getenv("EVENT_LOG_DIR", "relatorios")
+        self.prefix = prefix
+        self.fieldnames = list(fieldnames)
+        self.max_bytes = int(os.getenv("EVENT_LOG_MAX_BYTES", str(5 * 1024 * 1024))) if max_bytes is None else max_bytes
+        self.rotate = (os.getenv("EVENT_LOG_ROTATE", "daily") if rotate is None else rotate).lower()
+        self.compress = os.getenv("EVENT_LOG_GZIP", "0") == "1" if compress is None else compress
+        self.keep = int(os.getenv("EVENT_LOG_KEEP", "0")) if keep is None else keep
+        self.fsync = os.getenv("EVENT_LOG_FSYNC", "0") == "1" if fsync is None else fsync
+        size = int(os.getenv("EVENT_LOG_BUFFER", "500")) if buffer_size is None else buffer_size
+
+        self._recent = deque(maxlen=max(1, size))
+        self._lock = threading.RLock()
+        self._file = None
+        self._writer = None
+        self._path = None
+        self._period = None
+        self._seq = 0
+
+        # agregados usados no relatório (nunca crescem com o número de eventos,
+        # apenas com o número de tipos/tags distintos)
+        self.total = 0
+        self.por_tipo = Counter()
+        self.primeiro = None
+        self.ultimo = None
+
+    # ------------------ API de lista (compatível com o antigo eventos_log) ------------------
+    def append(self, evento):
+        with self._lock:
+            self._recent.append(evento)
+            self.total += 1
+            self.por_tipo[evento.get("tipo_evento")] += 1
+            ts = evento.get("timestamp")
+            if self.primeiro is None:
+                self.primeiro = ts
+            self.ultimo = ts
+            try:
+                self._write(evento)
+            except Exception:
+                print("[eventlog] Erro ao gravar evento:", traceback.format_exc())
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._recent))
+
+    def __len__(self):
+        return len(self._recent)
+
+    def __bool__(self):
+        return self.total > 0
+
+    def recent(self, n=None):
+        with self._lock:
+            items = list(self._recent)
+        return items if n is None else items[-n:]
+
+    def resumo(self):
+        with self._lock:
+            return {"total": self.total, "por_tipo": dict(self.por_tipo),
+                    "primeiro": self.primeiro, "ultimo": self.ultimo}
+
+    def zerar_resumo(self):
+        """Starts the aggregates over (new day); returns the previous resumo()."""
+        with self._lock:
+            anterior = self.resumo()
+            self.total = 0
+            self.por_tipo = Counter()
+            self.primeiro = None
+            self.ultimo = None
+            return anterior
+
+    @property
+    def current_path(self):
+        return self._path
+
+    def files(self):
+        """All event files of this log on disk (rotated + current), oldest first."""
+        return sorted(glob.glob(os.path.join(self.directory, f"{self.prefix}_*.csv*")))
+
+    # ------------------ Escrita / rotação ------------------
+    def _period_key(self, now):
+        fmt = _ROTATE_FORMATS.get(self.rotate)
+        return now.strftime(fmt) if fmt else ""
+
+    def _open(self, now):
+        os.makedirs(self.directory, exist_ok=True)
+        self._period = self._period_key(now)
+        self._seq += 1
+        name = f"{self.prefix}_{now.strftime('%Y%m%d_%H%M%S')}_{self._seq:03d}.csv"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def _needs_rotation(self, now):
+        if self._file is None:
+            return False
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return self._period_key(now) != self._period
+
+    def _write(self, evento):
+        now = datetime.now()
+        if self._needs_rotation(now):
+            self._close_current()
+        if self._file is None:
+            self._open(now)
+        self._writer.writerow(evento)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _close_current(self):
+        """Closes the current file; returns (final path, compression thread or None)."""
+        if self._file is None:
+            return None, None
+        self._file.close()
+        closed = self._path
+        self._file = self._writer = self._path = None
+        if self.compress:
+            t = threading.Thread(target=self._compress, args=(closed,), daemon=True)
+            t.start()
+            return closed + ".gz", t
+        self._prune()
+        return closed, None
+
+    def _compress(self, path):
+        try:
+            with open(path, 'rb') as src, gzip.open(path + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except Exception:
+            print("[eventlog] Erro ao comprimir", path, traceback.format_exc())
+        self._prune()
+
+    def _prune(self):
+        if not self.keep:
+            return
+        with self._lock:
+            current = self._path
+        old = [p for p in self.files() if p != current]
+        for p in old[:-self.keep]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def rotate_now(self):
+        with self._lock:
+            self._close_current()
+
+    def close(self, wait=False):
+        """Closes the current file like a rotation (gzip, prune); the next append opens a new one.
+
+        Returns the closed file's final path. wait=True finishes the compression
+        before returning (shutdown: a daemon thread would be cut mid-gzip).
+        """
+        with self._lock:
+            path, t = self._close_current()
+        if wait and t is not None:
+            t.join()  # fora do lock: _compress -> _prune também o pega
+        return path
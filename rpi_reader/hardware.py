@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Hardware abstraction for the RFID readers.
+Backends (RFID_HARDWARE env var):
+ - real -> RPi.GPIO + mfrc522.SimpleMFRC522 (default, Raspberry Pi)
+ - sim  -> fake GPIO/PWM + reader that replays a timed tag trace (any Linux box)
+
+Trace file (RFID_TRACE) is a CSV with header `offset_s,tag_id[,door]`: each row is one
+tap, `offset_s` seconds after the reader starts; with several readers in one process the
+optional `door` column routes the tap to that door's reader. Without a trace the
+simulated reader reads tag ids typed on stdin.
+"""
+import os
+import csv
+import sys
+import time
+import queue
+import threading
+
+HARDWARE = os.getenv("RFID_HARDWARE", "real")  # "real" ou "sim"
+TRACE_FILE = os.getenv("RFID_TRACE", "")
+
+
+class TraceExhausted(KeyboardInterrupt):
+    """Raised by SimulatedReader when the trace ends; main loops treat it like Ctrl+C."""
+
+
+# ------------------ Relógio (permite acelerar a simulação) ------------------
+class SimClock:
+    """Drop-in for the `time` module functions used by the readers, running `speed` times faster."""
+
+    def __init__(self, speed=1.0):
+        self.speed = float(speed) if speed and speed > 0 else 1.0
+        self._t0 = time.time()
+        self._m0 = time.monotonic()
+
+    def time(self):
+        return self._t0 + (time.monotonic() - self._m0) * self.speed
+
+    def monotonic(self):
+        return self._m0 + (time.monotonic() - self._m0) * self.speed
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+
+# ------------------ GPIO / PWM falsos ------------------
+class FakePWM:
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0
+
+    def start(self, duty):
+        self.duty = duty
+        self.gpio._record(self.pin, ("pwm_start", duty))
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+        self.gpio._record(self.pin, ("pwm_duty", duty))
+
+    def stop(self):
+        self.duty = 0
+        self.gpio._record(self.pin, ("pwm_stop", 0))
+
+
+class FakeGPIO:
+    """Subset of the RPi.GPIO API used in this project. Keeps pin state and a change history."""
+    BCM = "BCM"
+    BOARD = "BOARD"
+    OUT = "OUT"
+    IN = "IN"
+    HIGH = 1
+    LOW = 0
+    PUD_UP = "PUD_UP"
+    PUD_DOWN = "PUD_DOWN"
+    RISING = "RISING"
+    FALLING = "FALLING"
+    BOTH = "BOTH"
+
+    def __init__(self, clock=time):
+        self.clock = clock
+        self.mode = None
+        self.pins = {}
+        self.history = []      # (timestamp, pin, value)
+        self.listeners = []    # callables(timestamp, pin, value) - usados pelo benchmark
+        self.edge_callbacks = {}  # pin -> (edge, [callbacks])
+        self._lock = threading.Lock()
+
+    def _record(self, pin, value):
+        ts = self.clock.time()
+        with self._lock:
+            self.history.append((ts, pin, value))
+            if len(self.history) > 10000:
+                del self.history[:5000]
+        for cb in list(self.listeners):
+            cb(ts, pin, value)
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self.pins[pin] = initial if initial is not None else self.LOW
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+        self._record(pin, value)
+
+    def input(self, pin):
+        return self.pins.get(pin, self.LOW)
+
+    def PWM(self, pin, frequency):
+        return FakePWM(self, pin, frequency)
+
+    # ------------------ Interrupções ------------------
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.edge_callbacks[pin] = (edge, [callback] if callback else [])
+
+    def add_event_callback(self, pin, callback):
+        self.edge_callbacks[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        self.edge_callbacks.pop(pin, None)
+
+    def set_input(self, pin, value):
+        """Simulates an external level change on an input pin, firing edge callbacks like RPi.GPIO."""
+        anterior = self.pins.get(pin, self.LOW)
+        self.pins[pin] = value
+        if value == anterior or pin not in self.edge_callbacks:
+            return
+        edge, callbacks = self.edge_callbacks[pin]
+        if edge == self.BOTH or (edge == self.RISING) == (value == self.HIGH):
+            for cb in list(callbacks):
+                cb(pin)
+
+    def press(self, pin, hold=0.05):
+        """One button press (rising edge, hold, falling edge)."""
+        self.set_input(pin, self.HIGH)
+        self.clock.sleep(hold)
+        self.set_input(pin, self.LOW)
+
+    def cleanup(self, *args):
+        self.pins.clear()
+        self.edge_callbacks.clear()
+
+
+# ------------------ Leitor simulado ------------------
+def load_trace(path, door=None):
+    """Loads a tap trace CSV -> sorted list of (offset_s, tag_id), optionally only one door's taps."""
+    trace = []
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if door is not None and row.get("door") not in (None, "", door):
+                continue
+            try:
+                trace.append((float(row["offset_s"]), int(row["tag_id"])))
+            except (KeyError, ValueError):
+                continue
+    trace.sort(key=lambda t: t[0])
+    return trace
+
+
+def save_trace(path, trace):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["offset_s", "tag_id"])
+        for offset, tag_id in trace:
+            writer.writerow([f"{offset:.3f}", tag_id])
+
+
+_stdin = None
+
+
+def _linhas_stdin():
+    """Queue fed by one daemon thread reading stdin (None at EOF), shared by every simulated reader."""
+    global _stdin
+    if _stdin is None:
+        _stdin = queue.Queue()
+
+        def ler():
+            for line in sys.stdin:
+                _stdin.put(line)
+            _stdin.put(None)
+
+        threading.Thread(target=ler, daemon=True, name="stdin-tags").start()
+    return _stdin
+
+
+class SimulatedReader:
+    """Same interface as SimpleMFRC522.read(): blocks until the next tap of the trace."""
+
+    def __init__(self, trace=None, clock=time):
+        self.trace = list(trace) if trace is not None else None
+        self.clock = clock
+        self._idx = 0
+        self._t0 = None
+        self.last_read_at = None       # timestamp (clock) do último read() devolvido
+        self.last_scheduled_at = None  # quando a tag foi de fato aproximada segundo o trace
+
+    def read(self):
+        if self.trace is None:
+            line = _linhas_stdin().get()
+            if line is None:
+                _stdin.put(None)  # EOF vale para os outros leitores também
+                raise TraceExhausted()
+            tag_id = int(line.strip() or 0)
+            self.last_scheduled_at = self.clock.time()
+        else:
+            if self._t0 is None:
+                self._t0 = self.clock.time()
+            if self._idx >= len(self.trace):
+                raise TraceExhausted()
+            offset, tag_id = self.trace[self._idx]
+            self._idx += 1
+            self.last_scheduled_at = self._t0 + offset
+            wait = self.last_scheduled_at - self.clock.time()
+            if wait > 0:
+                self.clock.sleep(wait)
+        self.last_read_at = self.clock.time()
+        return tag_id, ""
+
+    def read_id(self):
+        return self.read()[0]
+
+    def read_no_block(self):
+        """Like SimpleMFRC522.read_no_block(): (None, None) when no tag is due yet."""
+        if self.trace is None:
+            # stdin lido por outra thread: sem linha digitada o poll volta na hora,
+            # como o leitor real (e startup.pronto() não fica esperando o teclado)
+            if _linhas_stdin().empty():
+                return None, None
+            return self.read()
+        if self._t0 is None:
+            self._t0 = self.clock.time()
+        if self._idx >= len(self.trace):
+            raise TraceExhausted()
+        if self._t0 + self.trace[self._idx][0] > self.clock.time():
+            return None, None
+        return self.read()
+
+
+# ------------------ Fábrica de backends ------------------
+_gpio = None
+
+
+def get_gpio(clock=time):
+    """Returns the GPIO module for the configured backend (shared instance in sim mode)."""
+    global _gpio
+    if _gpio is None:
+        if HARDWARE == "sim":
+            _gpio = FakeGPIO(clock)
+        else:
+            import RPi.GPIO as GPIO
+            _gpio = GPIO
+    return _gpio
+
+
+def get_reader(clock=time, trace=None, bus=0, device=0, door=None):
+    """
+    Returns an RFID reader for the configured backend.
+    `bus`/`device` select the SPI chip-select (/dev/spidev<bus>.<device>) of a real MFRC522;
+    `door` filters the simulated trace when several readers share one process.
+    """
+    if HARDWARE == "sim":
+        if trace is None and TRACE_FILE:
+            trace = load_trace(TRACE_FILE, door)
+        return SimulatedReader(trace, clock)
+    from mfrc522 import SimpleMFRC522, MFRC522
+    reader = SimpleMFRC522()
+    if (bus, device) != (0, 0):
+        reader.READER = MFRC522(bus=bus, device=device)
+    return reader
+
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Low-overhead instrumentation for the readers.
+
+Each stage of a tap (RFID read, decision, waits on `lock`/`estado_lock`,
+registrar_evento, actuators, API push, queue lag, syncs) is timed with two
+perf_counter() calls and recorded into a fixed-bucket histogram (count, sum,
+max, approximate p50/p90/p99). Nothing is kept per event, so memory stays
+constant. Counters (debounce drops, push failures...) and gauges (pending queue
+depth, age of the oldest pending event) complete the picture.
+
+Exposed locally (no extra dependency):
+  RFID_METRICS_PORT=9108           GET http://127.0.0.1:9108/metrics (JSON)
+  RFID_METRICS_SOCKET=/run/rfid.sock
+                                   curl --unix-socket /run/rfid.sock http://leitor/metrics
+and optionally shipped to the API (POST /metrics/readers) every
+RFID_METRICS_SHIP_INTERVAL seconds. Snapshots that cannot be delivered are
+kept (at most RFID_METRICS_SHIP_BATCH) and sent together on the next try.
+Values are cumulative since the reader started, so a lost or repeated
+snapshot does no harm.
+
+Example:
+  metricas = Metrics()
+  with metricas.medir("registrar_evento"):
+      ...
+  with metricas.esperar_lock(lock, "lock"):   # acquires `lock`, records the wait
+      ...
+"""
+import os
+import json
+import time
+import socket
+import bisect
+import threading
+import socketserver
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORTA = int(os.getenv("RFID_METRICS_PORT", "0"))  # 0 = sem endpoint HTTP
+BIND = os.getenv("RFID_METRICS_BIND", "127.0.0.1")
+SOCKET_PATH = os.getenv("RFID_METRICS_SOCKET", "")
+SHIP_INTERVAL = float(os.getenv("RFID_METRICS_SHIP_INTERVAL", "0"))  # 0 = não envia à API
+SHIP_BATCH = int(os.getenv("RFID_METRICS_SHIP_BATCH", "30"))
+LEITOR_ID = os.getenv("RFID_LEITOR_ID") or socket.gethostname()
+
+# limites dos buckets (segundos); o último é +inf
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histograma:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LIMITES) + 1)
+
+    def observar(self, s):
+        self.count += 1
+        self.total += s
+        if s > self.max:
+            self.max = s
+        self.buckets[bisect.bisect_left(LIMITES, s)] += 1
+
+    def _percentil(self, q):
+        # interpolação linear dentro do bucket que contém o percentil (teto = máximo observado)
+        alvo = q * self.count
+        acumulado = 0
+        for i, n in enumerate(self.buckets):
+            if n and acumulado + n >= alvo:
+                baixo = LIMITES[i - 1] if i else 0.0
+                alto = min(LIMITES[i], self.max) if i < len(LIMITES) else self.max
+                return baixo + (alto - baixo) * (alvo - acumulado) / n
+            acumulado += n
+        return self.max
+
+    def resumo(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "total_s": round(self.total, 6),
+                "avg_ms": round(self.total / self.count * 1000, 3), "max_ms": round(self.max * 1000, 3),
+                "p50_ms": round(self._percentil(0.5) * 1000, 3),
+                "p90_ms": round(self._percentil(0.9) * 1000, 3),
+                "p99_ms": round(self._percentil(0.99) * 1000, 3)}
+
+
+class _Medicao:
+    __slots__ = ("metrics", "etapa", "t0")
+
+    def __init__(self, metrics, etapa):
+        self.metrics = metrics
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.t0 = self.metrics.relogio()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observar(self.etapa, self.metrics.relogio() - self.t0)
+        return False
+
+
+class _EsperaLock:
+    __slots__ = ("metrics", "lock", "nome")
+
+    def __init__(self, metrics, lock, nome):
+        self.metrics = metrics
+        self.lock = lock
+        self.nome = nome
+
+    def __enter__(self):
+        relogio = self.metrics.relogio
+        t0 = relogio()
+        self.lock.acquire()
+        self.metrics.observar(self.nome, relogio() - t0)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+
+class Metrics:
+    def __init__(self, leitor=None, relogio=time.perf_counter):
+        self.leitor = leitor or LEITOR_ID
+        self.relogio = relogio  # o bench troca pelo relógio simulado
+        self.etapas = {}
+        self.contadores = {}
+        self.gauges = {}
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+        self._servidores = []
+
+    # ------------------ Registro ------------------
+    def agora(self):
+        return self.relogio()
+
+    def medir(self, etapa):
+        """Context manager timing one stage."""
+        return _Medicao(self, etapa)
+
+    def esperar_lock(self, lock, nome):
+        """Acquires `lock` (use instead of `with lock:`), recording the wait under `nome`."""
+        return _EsperaLock(self, lock, nome)
+
+    def observar(self, etapa, segundos):
+        with self._lock:
+            h = self.etapas.get(etapa)
+            if h is None:
+                h = self.etapas[etapa] = Histograma()
+            h.observar(segundos)
+
+    def contar(self, nome, n=1):
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + n
+
+    def gauge(self, nome, fn):
+        """Registers `fn()` to be evaluated at each snapshot (queue depth, oldest pending age...)."""
+        self.gauges[nome] = fn
+
+    def snapshot(self):
+        with self._lock:
+            etapas = {k: h.resumo() for k, h in self.etapas.items()}
+            contadores = dict(self.contadores)
+        gauges = {}
+        for nome, fn in list(self.gauges.items()):
+            try:
+                gauges[nome] = fn()
+            except Exception:
+                gauges[nome] = None
+        return {"reader": self.leitor, "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                "uptime_s": round(time.time() - self.inicio, 1),
+                "stages": etapas, "counters": contadores, "gauges": gauges}
+
+    # ------------------ Endpoint local ------------------
+    def servir(self, porta=None, socket_path=None, bind=None):
+        """Starts the /metrics endpoint on a local TCP port and/or Unix socket (env defaults)."""
+        porta = PORTA if porta is None else porta
+        socket_path = SOCKET_PATH if socket_path is None else socket_path
+        handler = _handler(self)
+        if porta:
+            srv = ThreadingHTTPServer((bind or BIND, porta), handler)
+            srv.daemon_threads = True
+            self._iniciar(srv)
+            print(f"[metrics] http://{bind or BIND}:{srv.server_address[1]}/metrics")
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)  # socket velho de uma execução anterior
+            srv = _UnixHTTPServer(socket_path, handler)
+            self._iniciar(srv)
+            print(f"[metrics] unix:{socket_path} /metrics")
+        return self._servidores
+
+    def _iniciar(self, srv):
+        threading.Thread(target=srv.serve_forever, daemon=True, name="metrics").start()
+        self._servidores.append(srv)
+
+    # ------------------ Envio em lote para a API ------------------
+    def enviar_lotes(self, url, stop_event, intervalo=None, headers=None, post=None):
+        """Ships snapshots to `url` every `intervalo` s until stop_event; undelivered ones are batched."""
+        intervalo = SHIP_INTERVAL if intervalo is None else intervalo
+        if intervalo <= 0:
+            return None
+
+        def worker():
+            lote = deque(maxlen=SHIP_BATCH)
+            while not stop_event.wait(intervalo):
+                lote.append(self.snapshot())
+                try:
+                    enviar = post or _requests_post
+                    r = enviar(url, json={"reader": self.leitor, "batch": list(lote)},
+                               headers=headers or {}, timeout=5)
+                    if r.status_code in (200, 201):
+                        lote.clear()
+                        self.contar("metrics_lotes_enviados")
+                        continue
+                except Exception:
+                    pass
+                self.contar("metrics_lotes_falhos")
+
+        t = threading.Thread(target=worker, daemon=True, name="metrics-envio")
+        t.start()
+        return t
+
+    def close(self):
+        for srv in self._servidores:
+            srv.shutdown()
+            srv.server_close()
+            if isinstance(srv, _UnixHTTPServer):
+                try:
+                    os.remove(srv.server_address)
+                except OSError:
+                    pass
+        self._servidores = []
+
+
+def _requests_post(*args, **kwargs):
+    # import tardio, como nos leitores
+    import requests
+    return requests.post(*args, **kwargs)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _handler(metrics):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # não polui a saída do leitor (e socket Unix não tem endereço de cliente)
+
+    return Handler
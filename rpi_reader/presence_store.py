@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Crash-safe presence state for the readers (journal + periodic snapshot).
+
+Every presence transition (entrada, saida, negado, invasao) is appended as one
+JSON line to `presenca.journal`; every PRESENCE_SNAPSHOT_INTERVAL seconds (or
+after PRESENCE_SNAPSHOT_EVERY transitions) the whole state is written atomically
+to `presenca.snapshot.json` and the journal is truncated. On startup `restore()`
+loads the snapshot and replays the journal tail, so a reboot keeps who is inside
+and the accumulated time.
+
+State layout (same structures the readers keep in memory):
+  {"dia": "YYYY-MM-DD",
+   "presenca": {sala: {tag_id: {"dentro", "entrada" (datetime), "tempo_total" (timedelta)}}},
+   "historico": {tag_id: True}, "negadas": {tag_id: n}, "invasoes": n}
+When the day changes, people still inside stay inside (entry moved to midnight)
+and time/counters start from zero.
+"""
+import os
+import json
+import time
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+STATE_DIR = os.getenv("PRESENCE_DIR", "estado")
+SNAPSHOT_INTERVAL = float(os.getenv("PRESENCE_SNAPSHOT_INTERVAL", "300"))
+SNAPSHOT_EVERY = int(os.getenv("PRESENCE_SNAPSHOT_EVERY", "500"))
+FSYNC = os.getenv("PRESENCE_FSYNC", "1") == "1"
+
+
+def estado_vazio(dia):
+    return {"dia": dia, "presenca": {}, "historico": {}, "negadas": {}, "invasoes": 0}
+
+
+def _tag(k):
+    try:
+        return int(k)
+    except (TypeError, ValueError):
+        return k
+
+
+def virar_dia(estado, dia):
+    """Rolls `estado` over to `dia` in place."""
+    meia_noite = datetime.strptime(dia, "%Y-%m-%d")
+    historico = {}
+    for sala, presenca in estado["presenca"].items():
+        for tag_id, dados in list(presenca.items()):
+            if dados["dentro"]:
+                dados["entrada"] = meia_noite
+                dados["tempo_total"] = timedelta(0)
+                historico[tag_id] = True
+            else:
+                del presenca[tag_id]
+    estado["dia"] = dia
+    estado["historico"].clear()
+    estado["historico"].update(historico)
+    estado["negadas"].clear()
+    estado["invasoes"] = 0
+    return estado
+
+
+def aplicar(estado, op):
+    """Applies one journal entry to `estado` (used on replay)."""
+    ts = datetime.fromisoformat(op["ts"])
+    dia = ts.strftime("%Y-%m-%d")
+    if dia > estado["dia"]:
+        virar_dia(estado, dia)
+    tipo = op["op"]
+    tag_id = op.get("tag")
+    if tipo == "entrada":
+        presenca = estado["presenca"].setdefault(op.get("sala"), {})
+        dados = presenca.setdefault(tag_id, {"dentro": False, "entrada": None, "tempo_total": timedelta(0)})
+        dados["dentro"] = True
+        dados["entrada"] = ts
+        estado["historico"][tag_id] = True
+    elif tipo == "saida":
+        dados = estado["presenca"].get(op.get("sala"), {}).get(tag_id)
+        if dados and dados["dentro"]:
+            dados["tempo_total"] += ts - dados["entrada"]
+            dados["dentro"] = False
+            dados["entrada"] = None
+    elif tipo == "negado":
+        estado["negadas"][tag_id] = estado["negadas"].get(tag_id, 0) + 1
+    elif tipo == "invasao":
+        estado["invasoes"] += 1
+
+
+def serializar(estado):
+    return {
+        "dia": estado["dia"],
+        "presenca": {
+            sala: {str(t): {"dentro": d["dentro"],
+                            "entrada": d["entrada"].isoformat() if d["entrada"] else None,
+                            "tempo_total_s": d["tempo_total"].total_seconds()}
+                   for t, d in presenca.items()}
+            for sala, presenca in estado["presenca"].items()
+        },
+        "historico": [str(t) for t in estado["historico"]],
+        "negadas": {str(t): n for t, n in estado["negadas"].items()},
+        "invasoes": estado["invasoes"],
+    }
+
+
+def desserializar(data):
+    return {
+        "dia": data["dia"],
+        "presenca": {
+            sala: {_tag(t): {"dentro": d["dentro"],
+                             "entrada": datetime.fromisoformat(d["entrada"]) if d["entrada"] else None,
+                             "tempo_total": timedelta(seconds=d["tempo_total_s"])}
+                   for t, d in presenca.items()}
+            for sala, presenca in data.get("presenca", {}).items()
+        },
+        "historico": {_tag(t): True for t in data.get("historico", [])},
+        "negadas": {_tag(t): n for t, n in data.get("negadas", {}).items()},
+        "invasoes": data.get("invasoes", 0),
+    }
+
+
+def reconstruir(snapshot, ops, hoje):
+    """Rebuilds the state from a serialized snapshot (or None) plus journal ops (dicts with seq).
+    Returns (estado, last seq, replayed ops); shared by every storage backend."""
+    estado = None
+    snap_seq = 0
+    if snapshot is not None:
+        try:
+            estado = desserializar(snapshot)
+            snap_seq = snapshot.get("seq", 0)
+        except Exception:
+            print("[presenca] Snapshot ilegível, usando só o journal:", traceback.format_exc())
+    if estado is None:
+        estado = estado_vazio(hoje)
+    seq = snap_seq
+    replay = 0
+    for op in ops:
+        if op.get("seq", 0) <= snap_seq:
+            continue
+        op["tag"] = _tag(op.get("tag"))
+        aplicar(estado, op)
+        seq = max(seq, op["seq"])
+        replay += 1
+    if estado["dia"] < hoje:
+        virar_dia(estado, hoje)
+    return estado, seq, replay
+
+
+class PresenceStore:
+    def __init__(self, directory=None, snapshot_interval=None, snapshot_every=None, fsync=None):
+        self.directory = directory or STATE_DIR
+        self.snapshot_interval = SNAPSHOT_INTERVAL if snapshot_interval is None else snapshot_interval
+        self.snapshot_every = SNAPSHOT_EVERY if snapshot_every is None else snapshot_every
+        self.fsync = FSYNC if fsync is None else fsync
+        self.snapshot_path = os.path.join(self.directory, "presenca.snapshot.json")
+        self.journal_path = os.path.join(self.directory, "presenca.journal")
+        self._lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._desde_snapshot = 0
+        self._ultimo_snapshot = time.monotonic()
+
+    # ------------------ Restauração ------------------
+    def existe(self):
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.journal_path)
+
+    def restore(self, hoje=None):
+        """Latest snapshot + journal tail, rolled over to `hoje` (default: today)."""
+        hoje = hoje or datetime.now().strftime("%Y-%m-%d")
+        inicio = time.perf_counter()
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except Exception:
+                print("[presenca] Snapshot ilegível, usando só o journal:", traceback.format_exc())
+        estado, self._seq, replay = reconstruir(snapshot, self._ler_journal(), hoje)
+        if replay or os.path.exists(self.journal_path):
+            # compacta já no boot (também descarta uma eventual linha truncada)
+            self.snapshot(estado)
+        ms = (time.perf_counter() - inicio) * 1000
+        dentro = sum(1 for p in estado["presenca"].values() for d in p.values() if d["dentro"])
+        print(f"[presenca] Estado restaurado em {ms:.1f} ms ({dentro} dentro, {replay} eventos do journal)")
+        return estado
+
+    def _ler_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # linha truncada por queda de energia
+
+    # ------------------ Journal ------------------
+    def journal(self, op, tag_id=None, sala=None, ts=None):
+        ts = ts or datetime.now()
+        with self._lock:
+            self._seq += 1
+            linha = json.dumps({"seq": self._seq, "op": op, "tag": tag_id, "sala": sala, "ts": ts.isoformat()})
+            try:
+                if self._journal is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._journal = open(self.journal_path, 'a', encoding='utf-8')
+                self._journal.write(linha + "\n")
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            except Exception:
+                print("[presenca] Erro ao gravar journal:", traceback.format_exc())
+            self._desde_snapshot += 1
+
+    # ------------------ Snapshot ------------------
+    def precisa_snapshot(self):
+        if not self._desde_snapshot:
+            return False
+        return (self._desde_snapshot >= self.snapshot_every or
+                time.monotonic() - self._ultimo_snapshot >= self.snapshot_interval)
+
+    def snapshot(self, estado):
+        """Writes `estado` atomically and truncates the journal. Caller must hold its state lock."""
+        with self._lock:
+            data = serializar(estado)
+            data["seq"] = self._seq
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = self.snapshot_path + ".tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                os.replace(tmp, self.snapshot_path)
+                # journal antigo já está no snapshot (seq <= data["seq"])
+                if self._journal is not None:
+                    self._journal.close()
+                self._journal = open(self.journal_path, 'w', encoding='utf-8')
+                self._desde_snapshot = 0
+                self._ultimo_snapshot = time.monotonic()
+            except Exception:
+                print("[presenca] Erro ao gravar snapshot:", traceback.format_exc())
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
@@ -0,0 +1,765 @@
+#!/usr/bin/env python3
+"""
+Reader engine shared by every reader script (one thread per door, one sender thread).
+
+Access logic, presence, debounce, actuators and the API client live here once;
+what changes per device is only where things are persisted, chosen by
+RFID_STORAGE (see storage.py):
+  json    files (collab_cache.bin, pending_logs.jsonl, estado/)  - tag_reader_rpi_json.py
+  sqlite  rpi_local.db                                           - tag_reader_rpi_sqlite.py
+  memory  nothing on disk
+tag_reader_rpi_pubnub.py adds a PubNub publisher through `publicadores`.
+"""
+import startup  # primeiro: marca o início do boot
+import time
+from datetime import datetime, timedelta
+import csv
+import os
+import sys
+import json
+import threading
+import queue
+import traceback
+import uuid
+
+import hardware  # RPi.GPIO/mfrc522 reais ou simulados, ver RFID_HARDWARE
+from event_log import EventLog
+from presence_store import virar_dia
+from badge_table import BadgeTable
+from metrics import Metrics
+from storage import get_storage, idade_s
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # profiler.py na raiz
+from profiler import SamplingProfiler
+
+# ======= CONFIG =======
+API_URL = os.getenv("ACCESS_API_URL", "http://192.168.0.100:5000")  # ajustar
+API_TOKEN = os.getenv("ACCESS_API_TOKEN", "")  # se usar autenticação, coloque "Bearer <token>" ou só o token conforme API
+FLUSH_INTERVAL = 20  # segundos entre tentativas de reenviar pendentes
+# Vários leitores/portas no mesmo processo: JSON com uma lista de
+# {"porta", "sala", "bus", "device", "led_verde", "led_vermelho", "buzzer"}
+READERS_FILE = os.getenv("RFID_READERS_FILE", "")
+PORTA_PADRAO = os.getenv("RFID_PORTA", "principal")
+SALA_PADRAO = os.getenv("RFID_SALA", "sala")
+POLL_INTERVAL = 0.05  # segundos entre leituras não bloqueantes de cada leitor
+# Modo online: a API decide cada tap (POST /access/decide, ver api/decisions.py);
+# sem resposta em RFID_DECIDE_TIMEOUT s o leitor decide pelo cache local e só
+# volta a tentar a API depois de RFID_OFFLINE_RETRY s
+ONLINE = os.getenv("RFID_ONLINE", "0") == "1"
+DECIDE_TIMEOUT = float(os.getenv("RFID_DECIDE_TIMEOUT", "0.3"))
+OFFLINE_RETRY = float(os.getenv("RFID_OFFLINE_RETRY", "30"))
+# ======================
+
+# Configuração dos pinos GPIO
+LED_VERDE = 17
+LED_VERMELHO = 27
+BUZZER = 22  # Pino do buzzer
+
+# Inicializados em init_hardware() (nada é configurado no import do módulo)
+GPIO = None
+buzzer_pwm = None
+leitorRfid = None
+# porta -> {"cfg": {...}, "pwm": PWM do buzzer, "leitor": leitor RFID}
+portas = {}
+
+def carregar_config_leitores():
+    padrao = {"porta": PORTA_PADRAO, "sala": SALA_PADRAO, "bus": 0, "device": 0,
+              "led_verde": LED_VERDE, "led_vermelho": LED_VERMELHO, "buzzer": BUZZER}
+    if READERS_FILE and os.path.exists(READERS_FILE):
+        try:
+            with open(READERS_FILE, 'r', encoding='utf-8') as f:
+                return [dict(padrao, **c) for c in json.load(f)]
+        except Exception:
+            print("Erro ao ler configuração dos leitores:", traceback.format_exc())
+    return [padrao]
+
+def init_hardware():
+    global GPIO, buzzer_pwm, leitorRfid
+    GPIO = hardware.get_gpio(time)
+    GPIO.setmode(GPIO.BCM)
+    pwms = {}  # portas podem compartilhar o buzzer; um PWM por pino
+    for cfg in carregar_config_leitores():
+        GPIO.setup(cfg["led_verde"], GPIO.OUT)
+        GPIO.setup(cfg["led_vermelho"], GPIO.OUT)
+        if cfg["buzzer"] not in pwms:
+            GPIO.setup(cfg["buzzer"], GPIO.OUT)
+            # Configurar PWM para o buzzer
+            pwms[cfg["buzzer"]] = GPIO.PWM(cfg["buzzer"], 1000)  # Frequência inicial de 1000 Hz
+        leitor = hardware.get_reader(time, bus=cfg["bus"], device=cfg["device"], door=cfg["porta"])
+        portas[cfg["porta"]] = {"cfg": cfg, "pwm": pwms[cfg["buzzer"]], "leitor": leitor}
+        presenca_por_sala.setdefault(cfg["sala"], {})
+    primeira = next(iter(portas.values()))
+    buzzer_pwm = primeira["pwm"]
+    leitorRfid = primeira["leitor"]
+
+def atuadores(porta=None):
+    """(pwm do buzzer, pino led verde, pino led vermelho) da porta; padrão = primeira porta."""
+    p = portas.get(porta)
+    if p is None:
+        return buzzer_pwm, LED_VERDE, LED_VERMELHO
+    return p["pwm"], p["cfg"]["led_verde"], p["cfg"]["led_vermelho"]
+
+def sala_da_porta(porta=None):
+    p = portas.get(porta)
+    return p["cfg"]["sala"] if p else SALA_PADRAO
+
+# Base de dados de colaboradores autorizados (carregada da API ou do cache).
+# Tabela compacta somente leitura: cada sincronização grava um arquivo novo e troca a referência.
+colaboradores = BadgeTable.from_items({
+    # valores iniciais opcionais; será substituído por cache/API em init
+    2677980090: {"nome": "Joao Silva", "autorizado": True},
+    219403520343: {"nome": "Maria Santos", "autorizado": False},
+}.items())
+
+# Controle de presença e acessos (presença por sala; presenca_sala = sala padrão)
+presenca_por_sala = {SALA_PADRAO: {}}
+presenca_sala = presenca_por_sala[SALA_PADRAO]
+historico_diario = {}
+tentativas_negadas = {}
+tentativas_invasao = 0
+dia_atual = datetime.now().strftime("%Y-%m-%d")
+
+# Colaboradores, pendentes e presença (journal + snapshot, restaurados no boot) ficam
+# no backend escolhido por RFID_STORAGE (ver storage.py); aberto em main_loop()
+storage = None
+
+# Eventos gravados em CSV rotativo à medida que acontecem; em memória só os últimos N
+# (ver rpi_reader/event_log.py para rotação/compressão)
+eventos_log = EventLog(prefix="relatorio_acesso")
+
+# Lock para thread-safe nos arquivos pendentes e os dados em memória
+lock = threading.Lock()
+estado_lock = threading.Lock()     # presença/contadores (um thread por leitor)
+pending_lock = threading.RLock()   # um reenvio de pendentes por vez
+stop_event = threading.Event()
+
+# Fila única de saída: leitores só enfileiram, um thread envia para a API
+fila_envio = queue.Queue()
+
+# Tempo de cada etapa do tap, filas e sincronizações (ver rpi_reader/metrics.py;
+# endpoint local com RFID_METRICS_PORT/RFID_METRICS_SOCKET)
+metricas = Metrics()
+
+# Profiler de amostragem sob demanda: kill -USR2 <pid> liga por PROF_DURATION s
+# (outro USR2 para antes) e grava pilhas em PROF_DIR (ver profiler.py na raiz)
+profiler = SamplingProfiler(f"leitor-{metricas.leitor}")
+
+# Chamados com cada log do leitor (ex. publicação no PubNub, ver tag_reader_rpi_pubnub.py)
+publicadores = []
+
+# ------------------ Som e LEDs (mantidos) ------------------
+def tocar_som_autorizado(porta=None):
+    pwm, _, _ = atuadores(porta)
+    pwm.start(50)
+    pwm.ChangeFrequency(523)
+    time.sleep(0.15)
+    pwm.ChangeDutyCycle(0)
+    time.sleep(0.05)
+    pwm.ChangeDutyCycle(50)
+    pwm.ChangeFrequency(659)
+    time.sleep(0.15)
+    pwm.ChangeDutyCycle(0)
+
+def tocar_som_negado(porta=None):
+    pwm, _, _ = atuadores(porta)
+    pwm.start(50)
+    pwm.ChangeFrequency(587)
+    time.sleep(0.2)
+    pwm.ChangeDutyCycle(0)
+    time.sleep(0.05)
+    pwm.ChangeDutyCycle(50)
+    pwm.ChangeFrequency(440)
+    time.sleep(0.3)
+    pwm.ChangeDutyCycle(0)
+
+def tocar_alarme_invasao(porta=None):
+    pwm, _, _ = atuadores(porta)
+    pwm.start(50)
+    for i in range(10):
+        pwm.ChangeFrequency(800)
+        time.sleep(0.15)
+        pwm.ChangeFrequency(400)
+        time.sleep(0.15)
+    pwm.ChangeDutyCycle(0)
+
+def acender_led_verde(porta=None):
+    _, led, _ = atuadores(porta)
+    GPIO.output(led, GPIO.HIGH)
+    time.sleep(5)
+    GPIO.output(led, GPIO.LOW)
+
+def acender_led_vermelho(porta=None):
+    _, _, led = atuadores(porta)
+    GPIO.output(led, GPIO.HIGH)
+    time.sleep(5)
+    GPIO.output(led, GPIO.LOW)
+
+def piscar_led_vermelho(porta=None):
+    _, _, led = atuadores(porta)
+    for _ in range(10):
+        GPIO.output(led, GPIO.HIGH)
+        time.sleep(0.3)
+        GPIO.output(led, GPIO.LOW)
+        time.sleep(0.3)
+
+# ------------------ Utilitários de cache/pending ------------------
+def save_collab_cache():
+    global colaboradores
+    try:
+        with lock:
+            colaboradores = storage.save_collaborators(colaboradores.items())
+    except Exception:
+        print("Erro ao salvar cache de colaboradores:", traceback.format_exc())
+
+def load_collab_cache():
+    global colaboradores
+    try:
+        tabela = storage.load_collaborators()
+        if tabela is not None:
+            colaboradores = tabela
+            print(f"[cache] Carregado {len(colaboradores)} colaboradores ({storage.nome}).")
+    except Exception:
+        print("Erro ao ler cache de colaboradores:", traceback.format_exc())
+
+def idade_pendente_mais_antigo():
+    return idade_s(storage.pending_stats()[1])
+
+# ------------------ Integração com API ------------------
+def _requests():
+    # import tardio: requests custa centenas de ms num Pi Zero e não é
+    # necessário para decidir acessos com o cache local
+    import requests
+    return requests
+
+def fetch_collaborators_from_api():
+    with metricas.medir("sync_colaboradores"):
+        ok = _fetch_collaborators()
+    metricas.contar("sync_ok" if ok else "sync_falhas")
+    return ok
+
+def _fetch_collaborators():
+    global colaboradores
+    url = f"{API_URL}/collaborators"
+    headers = {}
+    if API_TOKEN:
+        headers["Authorization"] = API_TOKEN
+    try:
+        r = _requests().get(url, headers=headers, timeout=5)
+        if r.status_code == 200:
+            arr = r.json()
+            registros = []
+            for c in arr:
+                # badge_id pode ser string ou int; a tabela guarda só badges numéricos
+                registros.append((c.get("badge_id"), {
+                    "nome": c.get("name") or c.get("nome") or c.get("username") or "Sem Nome",
+                    "autorizado": True if c.get("permission_level",1) >= 1 else False
+                }))
+            # grava a tabela nova e troca a referência de uma vez
+            with metricas.esperar_lock(lock, "lock"):
+                colaboradores = storage.save_collaborators(registros)
+            print(f"[api] Sincronizado {len(colaboradores)} colaboradores.")
+            return True
+        else:
+            print(f"[api] Erro ao buscar colaboradores: {r.status_code} {r.text}")
+    except Exception:
+        print("[api] Exceção ao buscar colaboradores:", traceback.format_exc())
+    return False
+
+# uma sessão (keep-alive) por thread de leitor: a decisão online não paga conexão nova
+_sessoes = threading.local()
+_offline_ate = 0.0
+
+def decidir_online(tag_id, porta=None, sala=None, event_id=None):
+    """Decision from the API, or None (offline/error) to decide with the local cache."""
+    global _offline_ate
+    if time.monotonic() < _offline_ate:
+        return None
+    headers = {"Authorization": API_TOKEN} if API_TOKEN else {}
+    try:
+        sessao = getattr(_sessoes, "sessao", None)
+        if sessao is None:
+            sessao = _sessoes.sessao = _requests().Session()
+        with metricas.medir("decisao_online"):
+            r = sessao.post(f"{API_URL}/access/decide", json={"badge_id": tag_id, "door": porta or PORTA_PADRAO,
+                            "room": sala, "event_id": event_id}, headers=headers, timeout=DECIDE_TIMEOUT)
+        if r.status_code == 200 and "event_type" in r.json():
+            return r.json()
+        print(f"[api] decisão online: {r.status_code} - {r.text}")
+    except Exception as e:
+        print(f"[api] decisão online indisponível ({type(e).__name__}), usando cache local")
+    metricas.contar("decisao_fallback_local")
+    _offline_ate = time.monotonic() + OFFLINE_RETRY
+    return None
+
+def push_log_to_api(log):
+    url = f"{API_URL}/logs"
+    headers = {"Content-Type":"application/json"}
+    if API_TOKEN:
+        headers["Authorization"] = API_TOKEN
+    try:
+        r = _requests().post(url, json=log, headers=headers, timeout=5)
+        if r.status_code in (200,201):
+            return True
+        else:
+            print(f"[api] push_log resposta: {r.status_code} - {r.text}")
+    except Exception:
+        print("[api] Exceção ao enviar log:", traceback.format_exc())
+    return False
+
+# ------------------ Eventos e persistência local (CSV) ------------------
+def registrar_evento(tipo, tag_id, nome="Desconhecido", autorizado=None, resultado="", porta=None, enviar=True,
+                     event_id=None):
+    with metricas.medir("registrar_evento"):
+        _registrar_evento(tipo, tag_id, nome, autorizado, resultado, porta, enviar, event_id)
+
+def _registrar_evento(tipo, tag_id, nome, autorizado, resultado, porta, enviar=True, event_id=None):
+    porta = porta or PORTA_PADRAO
+    evento = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "tipo_evento": tipo,
+        "tag_id": tag_id,
+        "nome": nome,
+        "autorizado": autorizado,
+        "resultado": resultado,
+        "porta": porta,
+        "sala": sala_da_porta(porta)
+    }
+    with metricas.esperar_lock(lock, "lock"):
+        eventos_log.append(evento)
+    # envio feito pelo sender_worker (não bloqueia o leitor)
+    log_for_api = {
+        "badge_id": tag_id,
+        "event_type": tipo,
+        "result": "GRANTED" if autorizado else "DENIED",
+        "reason": resultado,
+        "door": porta,
+        "room": evento["sala"],
+        "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),  # idade dos pendentes
+        # a API descarta o mesmo tap já decidido online ou um reenvio de pendente
+        "event_id": event_id or uuid.uuid4().hex
+    }
+    if not enviar:
+        # decidido (e já registrado) pela API no modo online: só os publicadores
+        publicar(log_for_api)
+        return
+    fila_envio.put((metricas.agora(), log_for_api))
+
+def adicionar_pending(log):
+    try:
+        storage.append_pending(log)
+    except Exception:
+        print("Erro ao salvar pending log:", traceback.format_exc())
+
+def publicar(log):
+    for pub in publicadores:
+        try:
+            pub(log)
+        except Exception:
+            print("[publicador] erro:", traceback.format_exc())
+
+# ------------------ Thread única que envia os eventos de todas as portas ------------------
+def sender_worker():
+    while True:
+        item = fila_envio.get()
+        if item is None:
+            break
+        enfileirado, log = item
+        metricas.observar("fila_envio", metricas.agora() - enfileirado)
+        try:
+            with metricas.medir("envio_api"):
+                ok = push_log_to_api(log)
+            if not ok:
+                # salvar pendente
+                metricas.contar("envio_falhas")
+                adicionar_pending(log)
+        except Exception:
+            print("[sender] erro:", traceback.format_exc())
+            adicionar_pending(log)
+        # tempo real mesmo com a API fora do ar (o log fica pendente para a API)
+        publicar(log)
+
+# ------------------ Presença / lógica original (mantida) ------------------
+def registrar_entrada(tag_id, nome, sala=None):
+    sala = sala or SALA_PADRAO
+    agora = datetime.now()
+    presenca = presenca_por_sala.setdefault(sala, {})
+    if tag_id not in presenca:
+        presenca[tag_id] = {"dentro": False, "entrada": None, "tempo_total": timedelta(0)}
+    presenca[tag_id]["dentro"] = True
+    presenca[tag_id]["entrada"] = agora
+    storage.journal("entrada", tag_id, sala, agora)
+
+def registrar_saida(tag_id, sala=None):
+    sala = sala or SALA_PADRAO
+    presenca = presenca_por_sala.setdefault(sala, {})
+    if tag_id in presenca and presenca[tag_id]["dentro"]:
+        agora = datetime.now()
+        entrada = presenca[tag_id]["entrada"]
+        tempo_sessao = agora - entrada
+        presenca[tag_id]["tempo_total"] += tempo_sessao
+        presenca[tag_id]["dentro"] = False
+        presenca[tag_id]["entrada"] = None
+        storage.journal("saida", tag_id, sala, agora)
+
+# ------------------ Estado persistente (snapshot/journal) ------------------
+def estado_atual():
+    return {"dia": dia_atual, "presenca": presenca_por_sala, "historico": historico_diario,
+            "negadas": tentativas_negadas, "invasoes": tentativas_invasao}
+
+def restaurar_estado():
+    global tentativas_invasao, dia_atual
+    if not storage.existe():
+        return
+    estado = storage.restore()
+    with estado_lock:
+        for presenca in presenca_por_sala.values():
+            presenca.clear()
+        for sala, presenca in estado["presenca"].items():
+            presenca_por_sala.setdefault(sala, {}).update(presenca)
+        historico_diario.clear()
+        historico_diario.update(estado["historico"])
+        tentativas_negadas.clear()
+        tentativas_negadas.update(estado["negadas"])
+        tentativas_invasao = estado["invasoes"]
+        dia_atual = estado["dia"]
+
+def salvar_estado(forcar=False):
+    if forcar or storage.precisa_snapshot():
+        with estado_lock:
+            storage.snapshot(estado_atual())
+
+def verificar_virada_dia():
+    """Chamado com estado_lock: fecha o dia anterior e zera tempos/contadores."""
+    global tentativas_invasao, dia_atual
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    if hoje == dia_atual:
+        return
+    print(f"\n📅 Virada de dia ({dia_atual} -> {hoje}), exportando resumo do dia anterior...")
+    try:
+        exportar_csv()
+    except Exception:
+        print("Erro ao exportar resumo do dia:", traceback.format_exc())
+    eventos_log.zerar_resumo()  # EVENTOS REGISTRADOS do relatório conta só o dia
+    virar_dia(estado_atual(), hoje)
+    tentativas_invasao = 0
+    dia_atual = hoje
+    storage.snapshot(estado_atual())
+
+def processar_acesso(tag_id, porta=None):
+    with metricas.medir("processar_acesso"):
+        _processar_acesso(tag_id, porta)
+
+def _processar_acesso(tag_id, porta=None):
+    global tentativas_invasao
+    try:
+        sala = sala_da_porta(porta)
+        with metricas.esperar_lock(estado_lock, "estado_lock"):
+            verificar_virada_dia()
+        # modo online: a API decide e já registra o evento; o estado local só acompanha
+        # mesmo id na decisão online e no log local: se a resposta da API chegar
+        # depois do timeout, o log do fallback não duplica o evento
+        event_id = uuid.uuid4().hex
+        decisao = decidir_online(tag_id, porta, sala, event_id) if ONLINE else None
+        if decisao is not None:
+            tipo = decisao["event_type"]
+            nome = decisao.get("name") or "Desconhecido"
+        else:
+            colaborador = colaboradores.get(tag_id)
+            if colaborador is None:
+                tipo, nome = "INVASAO", "Desconhecido"
+            else:
+                nome = colaborador["nome"]
+                tipo = None if colaborador["autorizado"] else "ACESSO_NEGADO"
+        enviar = decisao is None
+
+        # Tag não cadastrada - possível invasão
+        if tipo == "INVASAO":
+            print("\n" + "="*50)
+            print("⚠️  ALERTA DE SEGURANÇA!")
+            print("Identificação não encontrada!")
+            print("="*50 + "\n")
+            with metricas.esperar_lock(estado_lock, "estado_lock"):
+                tentativas_invasao += 1
+                storage.journal("invasao", tag_id, sala)
+            registrar_evento("INVASAO", tag_id, "Desconhecido", False, "Tag não cadastrada", porta, enviar, event_id)
+            with metricas.medir("atuadores"):
+                tocar_alarme_invasao(porta)
+                piscar_led_vermelho(porta)
+            return
+
+        # Colaborador não autorizado
+        if tipo == "ACESSO_NEGADO":
+            print("\n" + "="*50)
+            print(f"❌ Você não tem acesso a este projeto, {nome}")
+            print("="*50 + "\n")
+            with metricas.esperar_lock(estado_lock, "estado_lock"):
+                tentativas_negadas[tag_id] = tentativas_negadas.get(tag_id, 0) + 1
+                storage.journal("negado", tag_id, sala)
+            registrar_evento("ACESSO_NEGADO", tag_id, nome, False, "Colaborador sem autorização", porta, enviar, event_id)
+            with metricas.medir("atuadores"):
+                tocar_som_negado(porta)
+                acender_led_vermelho(porta)
+            return
+
+        # Colaborador autorizado - verificar se está entrando ou saindo (decisão atômica
+        # entre os leitores da mesma sala; no modo online a transição vem da API)
+        with metricas.esperar_lock(estado_lock, "estado_lock"):
+            presenca = presenca_por_sala.setdefault(sala, {})
+            if decisao is not None:
+                entrando = decisao["transition"] == "entry"
+            else:
+                entrando = tag_id not in presenca or not presenca[tag_id]["dentro"]
+            if entrando:
+                primeira_vez_hoje = tag_id not in historico_diario
+                historico_diario[tag_id] = True
+                registrar_entrada(tag_id, nome, sala)
+            else:
+                dentro = tag_id in presenca and presenca[tag_id]["dentro"]
+                tempo_sessao = datetime.now() - presenca[tag_id]["entrada"] if dentro else timedelta(0)
+                registrar_saida(tag_id, sala)
+
+        if entrando:
+            if decisao is not None:
+                primeira_vez_hoje = decisao["reason"] == "Primeira entrada do dia"
+            if primeira_vez_hoje:
+                print("\n" + "="*50)
+                print(f"✅ Bem-vindo, {nome}")
+                print("="*50 + "\n")
+                registrar_evento("ENTRADA", tag_id, nome, True, "Primeira entrada do dia", porta, enviar, event_id)
+            else:
+                print("\n" + "="*50)
+                print(f"✅ Bem-vindo de volta, {nome}")
+                print("="*50 + "\n")
+                registrar_evento("ENTRADA", tag_id, nome, True, "Retorno à sala", porta, enviar, event_id)
+        else:
+            print("\n" + "="*50)
+            print(f"👋 Até logo, {nome}")
+            print("="*50 + "\n")
+            if decisao is not None:
+                motivo = decisao["reason"]
+            else:
+                motivo = f"Permaneceu {int(tempo_sessao.total_seconds() // 60)} minutos"
+            registrar_evento("SAIDA", tag_id, nome, True, motivo, porta, enviar, event_id)
+        with metricas.medir("atuadores"):
+            tocar_som_autorizado(porta)
+            acender_led_verde(porta)
+    except Exception:
+        print("Erro em processar_acesso:", traceback.format_exc())
+
+# ------------------ Export CSV (mantido) ------------------
+def exportar_csv(encerrando=False):
+    timestamp_arquivo = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if not os.path.exists("relatorios"):
+        os.makedirs("relatorios")
+    # os eventos já estão em disco; só fecha o arquivo corrente (gzip/limpeza como
+    # numa rotação, ver EVENT_LOG_GZIP/EVENT_LOG_KEEP); no encerramento espera o gzip
+    caminho_completo = eventos_log.close(wait=encerrando)
+    nome_resumo = f"resumo_acesso_{timestamp_arquivo}.csv"
+    caminho_resumo = os.path.join("relatorios", nome_resumo)
+    with open(caminho_resumo, 'w', newline='', encoding='utf-8') as csvfile:
+        fieldnames = ['sala', 'tag_id', 'nome', 'tempo_total_horas', 'tempo_total_minutos', 'tentativas_negadas']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for sala, tag_id, dados in iter_presenca():
+            if dados["dentro"]:
+                tempo_sessao = datetime.now() - dados["entrada"]
+                tempo_final = dados["tempo_total"] + tempo_sessao
+            else:
+                tempo_final = dados["tempo_total"]
+            nome = colaboradores.get(tag_id, {}).get("nome", "Desconhecido")
+            horas = int(tempo_final.total_seconds() // 3600)
+            minutos = int((tempo_final.total_seconds() % 3600) // 60)
+            tentativas = tentativas_negadas.get(tag_id, 0)
+            writer.writerow({
+                'sala': sala,
+                'tag_id': tag_id,
+                'nome': nome,
+                'tempo_total_horas': horas,
+                'tempo_total_minutos': minutos,
+                'tentativas_negadas': tentativas
+            })
+    print(f"\n📄 Relatórios exportados: {caminho_completo} e {caminho_resumo}")
+    arquivos = eventos_log.files()
+    if len(arquivos) > 1:
+        print(f"   ({len(arquivos)} arquivos de eventos em relatorios/)")
+    return caminho_completo, caminho_resumo
+
+def iter_presenca():
+    """(sala, tag_id, dados) de todas as salas."""
+    for sala, presenca in list(presenca_por_sala.items()):
+        for tag_id, dados in list(presenca.items()):
+            yield sala, tag_id, dados
+
+def gerar_relatorio():
+    print("\n" + "="*60)
+    print("📊 RELATÓRIO FINAL DO DIA")
+    print("="*60)
+    varias_salas = len(presenca_por_sala) > 1
+    if any(presenca_por_sala.values()):
+        for sala, tag_id, dados in iter_presenca():
+            if dados["dentro"]:
+                tempo_sessao = datetime.now() - dados["entrada"]
+                tempo_final = dados["tempo_total"] + tempo_sessao
+            else:
+                tempo_final = dados["tempo_total"]
+            nome = colaboradores.get(tag_id, {}).get("nome", "Desconhecido")
+            horas = int(tempo_final.total_seconds() // 3600)
+            minutos = int((tempo_final.total_seconds() % 3600) // 60)
+            segundos = int(tempo_final.total_seconds() % 60)
+            local = f" [{sala}]" if varias_salas else ""
+            print(f"  • {nome}{local}: {horas}h {minutos}m {segundos}s")
+    else:
+        print("  Nenhum colaborador registrado hoje.")
+    print("\n🚫 TENTATIVAS DE ACESSO NÃO AUTORIZADAS:")
+    if tentativas_negadas:
+        for tag_id, tentativas in tentativas_negadas.items():
+            nome = colaboradores.get(tag_id, {}).get("nome", "Desconhecido")
+            print(f"  • {nome}: {tentativas} tentativa(s)")
+    else:
+        print("  Nenhuma tentativa de acesso negada.")
+    print("\n⚠️  TENTATIVAS DE INVASÃO:")
+    print(f"  Total de tentativas com tags não cadastradas: {tentativas_invasao}")
+    resumo = eventos_log.resumo()
+    print(f"\n🧾 EVENTOS REGISTRADOS: {resumo['total']}")
+    for tipo, total in sorted(resumo["por_tipo"].items()):
+        print(f"  • {tipo}: {total}")
+    print("\n💾 Exportando relatórios em CSV...")
+    exportar_csv(encerrando=True)
+    print("\nSistema encerrado com sucesso!")
+
+# ------------------ Thread que tenta reenviar pendentes ------------------
+def reenviar_pendentes(prefixo):
+    with metricas.medir("reenvio_pendentes"), pending_lock:
+        pending = storage.pending()
+        if not pending:
+            return
+        print(f"{prefixo} Tentando reenviar {len(pending)} logs pendentes...")
+        enviados = []
+        for pid, log in pending:
+            if push_log_to_api(log):
+                enviados.append(pid)
+        storage.remove_pending(enviados)
+
+def pending_flush_worker():
+    while not stop_event.is_set():
+        try:
+            # atualizar colaboradores primeiro: a primeira sincronização do boot
+            # acontece aqui, com o leitor já atendendo a partir do cache local
+            fetch_collaborators_from_api()
+            reenviar_pendentes("[flush]")
+            salvar_estado()
+        except Exception:
+            print("[flush] erro no worker:", traceback.format_exc())
+        # aguarda
+        stop_event.wait(FLUSH_INTERVAL)
+
+# ------------------ Um thread por leitor/porta ------------------
+leitores_ativos = []
+
+def reader_worker(porta):
+    leitor = portas[porta]["leitor"]
+    tag_anterior = None
+    tempo_ultimo_acesso = None
+    try:
+        while not stop_event.is_set():
+            with metricas.medir("leitura_rfid"):
+                tag_id, text = leitor.read_no_block()
+            if startup.pronto():
+                stop_event.set()
+                break
+            if tag_id is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            agora = time.time()
+            # debounce (por porta)
+            if tag_id == tag_anterior and tempo_ultimo_acesso and (agora - tempo_ultimo_acesso) < 3:
+                metricas.contar("debounce_descartados")
+                continue
+            tag_anterior = tag_id
+            tempo_ultimo_acesso = agora
+            processar_acesso(tag_id, porta)
+            time.sleep(1)
+    except hardware.TraceExhausted:
+        pass
+    except Exception:
+        print(f"Erro inesperado no leitor {porta}:", traceback.format_exc())
+    finally:
+        with estado_lock:
+            leitores_ativos.remove(porta)
+            if not leitores_ativos:
+                stop_event.set()
+
+# ------------------ Programa principal ------------------
+def main_loop():
+    global storage
+    if storage is None:
+        storage = get_storage()
+    if leitorRfid is None:
+        init_hardware()
+        startup.marcar("hardware")
+    sender = threading.Thread(target=sender_worker, daemon=True)
+    sender.start()
+    try:
+        restaurar_estado()
+        startup.marcar("estado restaurado")
+        metricas.gauge("fila_envio", fila_envio.qsize)
+        metricas.gauge("pendentes", lambda: storage.pending_stats()[0])
+        metricas.gauge("pendente_mais_antigo_s", idade_pendente_mais_antigo)
+        metricas.gauge("colaboradores", lambda: len(colaboradores))
+        metricas.servir()
+        profiler.install_signal()
+        metricas.enviar_lotes(f"{API_URL}/metrics/readers", stop_event,
+                              headers={"Authorization": API_TOKEN} if API_TOKEN else None)
+        # decide acessos pelo cache local desde o primeiro tap; a sincronização
+        # com a API roda em background no pending_flush_worker
+        load_collab_cache()
+        startup.marcar("cache de colaboradores")
+        # inicia thread de flush (sincronização única para todas as portas)
+        t = threading.Thread(target=pending_flush_worker, daemon=True)
+        t.start()
+
+        print("\n" + "="*60)
+        print("🎮 SISTEMA DE CONTROLE DE ACESSO - ESTÚDIO DE GAMES (RPI)")
+        print("="*60)
+        print(f"Leitores ativos: {', '.join(portas)}")
+        print("Aproxime o crachá do leitor para registrar entrada/saída")
+        print("Pressione Ctrl+C para encerrar e ver o relatório")
+        print("="*60 + "\n")
+
+        print("⏳ Aguardando leitura da tag...")
+        for porta in portas:
+            leitores_ativos.append(porta)
+            threading.Thread(target=reader_worker, args=(porta,), daemon=True, name=f"leitor-{porta}").start()
+        while not stop_event.is_set():
+            stop_event.wait(0.5)
+    except KeyboardInterrupt:
+        print("\n\n🛑 Encerrando sistema...")
+    except Exception:
+        print("Erro inesperado no main loop:", traceback.format_exc())
+    finally:
+        # sinaliza threads para parar e aguarda um pouco
+        stop_event.set()
+        time.sleep(1)
+        # esvazia a fila de saída (o que não for enviado vira pendente)
+        fila_envio.put(None)
+        sender.join(timeout=30)
+        # tenta reenviar pendentes antes de sair
+        try:
+            reenviar_pendentes("[shutdown]")
+        except Exception:
+            print("[shutdown] Erro ao flush final:", traceback.format_exc())
+        salvar_estado(forcar=True)
+        storage.close()
+        metricas.close()
+        if profiler.running:
+            profiler.stop()
+            profiler.wait(timeout=5)
+
+        gerar_relatorio()
+        for pwm in {p["pwm"] for p in portas.values()}:
+            pwm.stop()
+        GPIO.cleanup()
+        print("GPIO limpo. Sistema encerrado.")
+
+if __name__ == "__main__":
+    main_loop()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Startup timeline for the readers.
+
+Run a reader with RFID_STARTUP_BENCH=1 (or `--startup-time`) and it prints how
+long each boot stage took and the time-to-first-ready-read (process start ->
+reader polling for the first tag), then shuts down. Without the flag the marks
+are just kept in memory (a few tuples).
+"""
+import os
+import sys
+import time
+
+ATIVO = os.getenv("RFID_STARTUP_BENCH", "0") == "1" or "--startup-time" in sys.argv
+
+_t0 = time.perf_counter()
+_etapas = []
+_pronto = False
+
+
+def idade_processo():
+    """Seconds since the OS started this process (Linux /proc), or None."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+        inicio = int(campos[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - inicio)
+    except Exception:
+        return None
+
+
+def marcar(etapa):
+    _etapas.append((etapa, time.perf_counter()))
+
+
+def pronto():
+    """Marks the first ready read. Returns True when running in measurement mode (caller should stop)."""
+    global _pronto
+    if _pronto:
+        return False
+    _pronto = True
+    marcar("primeira leitura pronta")
+    if not ATIVO:
+        return False
+    print("\n⏱️  TEMPO DE INICIALIZAÇÃO")
+    anterior = _t0
+    for etapa, t in _etapas:
+        print(f"  • {etapa:28s} +{(t - anterior) * 1000:8.1f} ms  ({(t - _t0) * 1000:8.1f} ms)")
+        anterior = t
+    idade = idade_processo()
+    if idade is not None:
+        print(f"  Processo iniciado -> primeira leitura pronta: {idade * 1000:.1f} ms")
+    return True
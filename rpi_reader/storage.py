@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Storage backends for the reader engine (reader_core.py).
+
+A backend keeps the three things a reader must not lose across a reboot:
+  collaborators  load_collaborators() / save_collaborators(items) -> lookup table
+  pending queue  append_pending(log), pending(limit), remove_pending(ids), pending_stats()
+  presence       existe(), restore(), journal(op, tag, sala, ts), precisa_snapshot(), snapshot(estado)
+
+Backends (RFID_STORAGE):
+  json    collab_cache.bin (mmap, badge_table.py), pending_logs.jsonl (append-only
+          journal with tombstones, compacted when drained) and estado/ (presence_store.py)
+  sqlite  everything in rpi_local.db (WAL): collab_cache, pending_logs, presence_journal,
+          presence_snapshot
+  memory  nothing on disk (lost on restart): benchmarks, tests, devices without
+          writable storage
+
+Pick one per device with `python rpi_reader/bench_storage.py` (append/drain/cache-load
+throughput and bytes written for each backend).
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+
+from badge_table import BadgeTable
+from presence_store import PresenceStore, reconstruir, serializar, STATE_DIR, SNAPSHOT_INTERVAL, SNAPSHOT_EVERY
+
+STORAGE = os.getenv("RFID_STORAGE", "json")
+PENDING_FSYNC = os.getenv("RFID_PENDING_FSYNC", "1") == "1"
+PENDING_COMPACT_EVERY = int(os.getenv("RFID_PENDING_COMPACT_EVERY", "1000"))
+SQLITE_SYNC = os.getenv("RFID_SQLITE_SYNC", "NORMAL")  # NORMAL (WAL) ou FULL
+
+
+def _agora_utc():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def idade_s(ts):
+    """Seconds since a 'YYYY-MM-DD HH:MM:SS' UTC timestamp (None passes through)."""
+    if ts is None:
+        return None
+    return round((datetime.utcnow() - datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")).total_seconds(), 1)
+
+
+class Storage:
+    """Interface shared by the backends (see module docstring)."""
+    nome = "base"
+
+    # ------------------ Colaboradores ------------------
+    def load_collaborators(self):
+        """Cached lookup table, or None when there is no cache yet."""
+        raise NotImplementedError
+
+    def save_collaborators(self, items):
+        """Persists (tag, {"nome", "autorizado"}) pairs; returns the table to use for lookups."""
+        raise NotImplementedError
+
+    # ------------------ Pendentes ------------------
+    def append_pending(self, log):
+        raise NotImplementedError
+
+    def pending(self, limit=None):
+        """[(id, log)] oldest first."""
+        raise NotImplementedError
+
+    def remove_pending(self, ids):
+        raise NotImplementedError
+
+    def pending_stats(self):
+        """(count, 'ts' of the oldest pending log or None)."""
+        raise NotImplementedError
+
+    # ------------------ Presença ------------------
+    def existe(self):
+        raise NotImplementedError
+
+    def restore(self, hoje=None):
+        raise NotImplementedError
+
+    def journal(self, op, tag_id=None, sala=None, ts=None):
+        raise NotImplementedError
+
+    def precisa_snapshot(self):
+        raise NotImplementedError
+
+    def snapshot(self, estado):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# ------------------ JSON (arquivos) ------------------
+class JsonStorage(Storage):
+    nome = "json"
+
+    def __init__(self, directory=".", fsync=None, compact_every=None):
+        self.directory = directory
+        self.fsync = PENDING_FSYNC if fsync is None else fsync
+        self.compact_every = compact_every or PENDING_COMPACT_EVERY
+        self.collab_path = os.path.join(directory, "collab_cache.bin")
+        self.collab_legado = os.path.join(directory, "collab_cache.json")
+        self.pending_path = os.path.join(directory, "pending_logs.jsonl")
+        self.pending_legado = os.path.join(directory, "pending_logs.json")
+        self.presenca = PresenceStore(os.path.join(directory, STATE_DIR))
+        self._lock = threading.Lock()
+        self._pendentes = OrderedDict()
+        self._proximo_id = 1
+        self._removidos = 0
+        self._arquivo = None
+        self._carregar_pendentes()
+
+    # colaboradores: tabela compacta mapeada em memória
+    def load_collaborators(self):
+        if not os.path.exists(self.collab_path) and os.path.exists(self.collab_legado):
+            # migra o cache JSON antigo
+            with open(self.collab_legado, 'r', encoding='utf-8') as f:
+                BadgeTable.write(json.load(f).items(), self.collab_path)
+        if not os.path.exists(self.collab_path):
+            return None
+        return BadgeTable.open(self.collab_path)
+
+    def save_collaborators(self, items):
+        # grava ao lado da antiga e troca (quem já mapeou a antiga continua lendo o inode velho)
+        BadgeTable.write(items, self.collab_path)
+        return BadgeTable.open(self.collab_path)
+
+    # pendentes: journal JSONL ({"id", "log"} por linha, {"del": [ids]} para remoções)
+    def _carregar_pendentes(self):
+        if os.path.exists(self.pending_path):
+            with open(self.pending_path, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        item = json.loads(linha)
+                    except ValueError:
+                        continue  # linha truncada por queda de energia
+                    if "del" in item:
+                        for i in item["del"]:
+                            self._pendentes.pop(i, None)
+                        self._removidos += len(item["del"])
+                    else:
+                        self._pendentes[item["id"]] = item["log"]
+                        self._proximo_id = max(self._proximo_id, item["id"] + 1)
+        if os.path.exists(self.pending_legado):
+            # formato antigo (lista JSON reescrita inteira a cada pendente)
+            try:
+                with open(self.pending_legado, 'r', encoding='utf-8') as f:
+                    for log in json.load(f):
+                        self.append_pending(log)
+                os.remove(self.pending_legado)
+            except Exception:
+                print("Erro ao migrar pending logs:", traceback.format_exc())
+
+    def _gravar(self, item):
+        if self._arquivo is None:
+            self._arquivo = open(self.pending_path, 'a', encoding='utf-8')
+        self._arquivo.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+        self._arquivo.flush()
+        if self.fsync:
+            os.fsync(self._arquivo.fileno())
+
+    def append_pending(self, log):
+        log = dict(log)
+        log.setdefault("ts", _agora_utc())
+        with self._lock:
+            i = self._proximo_id
+            self._proximo_id += 1
+            self._gravar({"id": i, "log": log})
+            self._pendentes[i] = log
+
+    def pending(self, limit=None):
+        with self._lock:
+            itens = list(self._pendentes.items())
+        return itens[:limit] if limit else itens
+
+    def remove_pending(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            for i in ids:
+                self._pendentes.pop(i, None)
+            self._removidos += len(ids)
+            if not self._pendentes:
+                # tudo entregue: zera o journal
+                if self._arquivo is not None:
+                    self._arquivo.close()
+                self._arquivo = open(self.pending_path, 'w', encoding='utf-8')
+                self._removidos = 0
+            elif self._removidos >= self.compact_every:
+                self._compactar()
+            else:
+                self._gravar({"del": list(ids)})
+
+    def _compactar(self):
+        tmp = self.pending_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for i, log in self._pendentes.items():
+                f.write(json.dumps({"id": i, "log": log}, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+        os.replace(tmp, self.pending_path)
+        self._removidos = 0
+
+    def pending_stats(self):
+        with self._lock:
+            if not self._pendentes:
+                return 0, None
+            return len(self._pendentes), next(iter(self._pendentes.values())).get("ts")
+
+    # presença: journal + snapshot JSON (presence_store.py)
+    def existe(self):
+        return self.presenca.existe()
+
+    def restore(self, hoje=None):
+        return self.presenca.restore(hoje)
+
+    def journal(self, op, tag_id=None, sala=None, ts=None):
+        self.presenca.journal(op, tag_id, sala, ts)
+
+    def precisa_snapshot(self):
+        return self.presenca.precisa_snapshot()
+
+    def snapshot(self, estado):
+        self.presenca.snapshot(estado)
+
+    def close(self):
+        with self._lock:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+        self.presenca.close()
+
+
+# ------------------ Presença sem arquivos próprios (SQLite e memória) ------------------
+class _PresencaSeq:
+    """Snapshot cadence shared by the SQLite and memory backends (same knobs as PresenceStore)."""
+
+    def _init_presenca(self):
+        self.snapshot_interval = SNAPSHOT_INTERVAL
+        self.snapshot_every = SNAPSHOT_EVERY
+        self._seq = 0
+        self._desde_snapshot = 0
+        self._ultimo_snapshot = time.monotonic()
+
+    def precisa_snapshot(self):
+        if not self._desde_snapshot:
+            return False
+        return (self._desde_snapshot >= self.snapshot_every or
+                time.monotonic() - self._ultimo_snapshot >= self.snapshot_interval)
+
+    def _op(self, op, tag_id, sala, ts):
+        self._seq += 1
+        self._desde_snapshot += 1
+        return {"seq": self._seq, "op": op, "tag": tag_id, "sala": sala, "ts": (ts or datetime.now()).isoformat()}
+
+    def _restaurado(self, snapshot, ops, hoje):
+        inicio = time.perf_counter()
+        estado, self._seq, replay = reconstruir(snapshot, ops, hoje or datetime.now().strftime("%Y-%m-%d"))
+        self.snapshot(estado)
+        ms = (time.perf_counter() - inicio) * 1000
+        dentro = sum(1 for p in estado["presenca"].values() for d in p.values() if d["dentro"])
+        print(f"[presenca] Estado restaurado em {ms:.1f} ms ({dentro} dentro, {replay} eventos do journal)")
+        return estado
+
+
+# ------------------ SQLite ------------------
+class SqliteStorage(_PresencaSeq, Storage):
+    nome = "sqlite"
+
+    def __init__(self, path="rpi_local.db", synchronous=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._init_presenca()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous or SQLITE_SYNC}")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pending_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                badge_id TEXT,
+                event_type TEXT,
+                result TEXT,
+                reason TEXT,
+                timestamp DATETIME
+            );
+            CREATE TABLE IF NOT EXISTS collab_cache (
+                badge_id TEXT PRIMARY KEY,
+                name TEXT,
+                autorizado INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS presence_journal (
+                seq INTEGER PRIMARY KEY,
+                op TEXT
+            );
+            CREATE TABLE IF NOT EXISTS presence_snapshot (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                seq INTEGER,
+                data TEXT
+            );
+        """)
+        # bancos criados antes dos leitores multi-porta (door), da sala nos logs (room)
+        # e do id de evento que a API usa para descartar duplicatas (event_id)
+        colunas = [r[1] for r in self.conn.execute("PRAGMA table_info(pending_logs)")]
+        for col in ("door", "room", "event_id"):
+            if col not in colunas:
+                self.conn.execute(f"ALTER TABLE pending_logs ADD COLUMN {col} TEXT")
+        self.conn.commit()
+        # estado/ de antes do backend SQLite, migrado no primeiro restore
+        self._legado = PresenceStore(os.path.join(os.path.dirname(path), STATE_DIR))
+
+    # colaboradores
+    def load_collaborators(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT badge_id,name,autorizado FROM collab_cache").fetchall()
+        if not rows:
+            return None
+        return BadgeTable.from_items((r[0], {"nome": r[1], "autorizado": bool(r[2])}) for r in rows)
+
+    def save_collaborators(self, items):
+        tabela = BadgeTable.from_items(items)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM collab_cache")
+            self.conn.executemany("INSERT INTO collab_cache(badge_id,name,autorizado) VALUES (?,?,?)",
+                                  ((str(t), c["nome"], 1 if c["autorizado"] else 0) for t, c in tabela.items()))
+        return tabela
+
+    # pendentes
+    def append_pending(self, log):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO pending_logs(badge_id,event_type,result,reason,timestamp,door,room,event_id) VALUES (?,?,?,?,?,?,?,?)",
+                              (log.get("badge_id"), log.get("event_type"), log.get("result"), log.get("reason"),
+                               log.get("ts") or _agora_utc(), log.get("door"), log.get("room"), log.get("event_id")))
+
+    def pending(self, limit=None):
+        q = "SELECT id,badge_id,event_type,result,reason,timestamp,door,room,event_id FROM pending_logs ORDER BY id ASC"
+        if limit:
+            q += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self.conn.execute(q).fetchall()
+        return [(r[0], {"badge_id": r[1], "event_type": r[2], "result": r[3], "reason": r[4],
+                        "ts": r[5], "door": r[6], "room": r[7], "event_id": r[8]}) for r in rows]
+
+    def remove_pending(self, ids):
+        if not ids:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM pending_logs WHERE id = ?", ((i,) for i in ids))
+
+    def pending_stats(self):
+        with self._lock:
+            n, mais_antigo = self.conn.execute("SELECT COUNT(*), MIN(timestamp) FROM pending_logs").fetchone()
+        return n, mais_antigo
+
+    # presença
+    def existe(self):
+        with self._lock:
+            tem = self.conn.execute("SELECT EXISTS(SELECT 1 FROM presence_snapshot) OR EXISTS(SELECT 1 FROM presence_journal)").fetchone()[0]
+        return bool(tem) or self._legado.existe()
+
+    def restore(self, hoje=None):
+        with self._lock:
+            snap = self.conn.execute("SELECT data FROM presence_snapshot WHERE id = 1").fetchone()
+            ops = [json.loads(r[0]) for r in self.conn.execute("SELECT op FROM presence_journal ORDER BY seq")]
+        if snap is None and not ops and self._legado.existe():
+            estado = self._legado.restore(hoje)
+            self.snapshot(estado)
+            return estado
+        return self._restaurado(json.loads(snap[0]) if snap else None, ops, hoje)
+
+    def journal(self, op, tag_id=None, sala=None, ts=None):
+        try:
+            with self._lock, self.conn:
+                item = self._op(op, tag_id, sala, ts)
+                self.conn.execute("INSERT INTO presence_journal(seq, op) VALUES (?, ?)", (item["seq"], json.dumps(item)))
+        except Exception:
+            print("[presenca] Erro ao gravar journal:", traceback.format_exc())
+
+    def snapshot(self, estado):
+        data = serializar(estado)
+        try:
+            with self._lock, self.conn:
+                data["seq"] = self._seq
+                self.conn.execute("INSERT OR REPLACE INTO presence_snapshot(id, seq, data) VALUES (1, ?, ?)",
+                                  (self._seq, json.dumps(data, ensure_ascii=False)))
+                self.conn.execute("DELETE FROM presence_journal WHERE seq <= ?", (self._seq,))
+                self._desde_snapshot = 0
+                self._ultimo_snapshot = time.monotonic()
+        except Exception:
+            print("[presenca] Erro ao gravar snapshot:", traceback.format_exc())
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+# ------------------ Memória ------------------
+class MemoryStorage(_PresencaSeq, Storage):
+    nome = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._init_presenca()
+        self._colaboradores = None
+        self._pendentes = OrderedDict()
+        self._proximo_id = 1
+        self._snapshot = None
+        self._ops = []
+
+    def load_collaborators(self):
+        return self._colaboradores
+
+    def save_collaborators(self, items):
+        self._colaboradores = BadgeTable.from_items(items)
+        return self._colaboradores
+
+    def append_pending(self, log):
+        log = dict(log)
+        log.setdefault("ts", _agora_utc())
+        with self._lock:
+            self._pendentes[self._proximo_id] = log
+            self._proximo_id += 1
+
+    def pending(self, limit=None):
+        with self._lock:
+            itens = list(self._pendentes.items())
+        return itens[:limit] if limit else itens
+
+    def remove_pending(self, ids):
+        with self._lock:
+            for i in ids:
+                self._pendentes.pop(i, None)
+
+    def pending_stats(self):
+        with self._lock:
+            if not self._pendentes:
+                return 0, None
+            return len(self._pendentes), next(iter(self._pendentes.values())).get("ts")
+
+    def existe(self):
+        return self._snapshot is not None or bool(self._ops)
+
+    def restore(self, hoje=None):
+        return self._restaurado(self._snapshot, [dict(op) for op in self._ops], hoje)
+
+    def journal(self, op, tag_id=None, sala=None, ts=None):
+        with self._lock:
+            self._ops.append(self._op(op, tag_id, sala, ts))
+
+    def snapshot(self, estado):
+        with self._lock:
+            self._snapshot = serializar(estado)
+            self._snapshot["seq"] = self._seq
+            self._ops = []
+            self._desde_snapshot = 0
+            self._ultimo_snapshot = time.monotonic()
+
+
+BACKENDS = {"json": JsonStorage, "sqlite": SqliteStorage, "memory": MemoryStorage}
+
+
+def get_storage(nome=None, **kwargs):
+    """Backend by name (default RFID_STORAGE, read at call time so entry scripts can set it)."""
+    nome = (nome or os.getenv("RFID_STORAGE") or STORAGE).lower()
+    if nome not in BACKENDS:
+        raise ValueError(f"RFID_STORAGE inválido: {nome} (use {', '.join(BACKENDS)})")
+    return BACKENDS[nome](**kwargs)
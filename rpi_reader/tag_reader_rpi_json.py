@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+Reader persisting to plain files: collab_cache.bin (memory-mapped table),
+pending_logs.jsonl (append-only journal) and estado/ (presence journal + snapshot).
+The engine is reader_core.py; only the storage backend is chosen here.
+"""
+import os
+
+STORAGE = "json"
+
+if __name__ == "__main__":
+    os.environ["RFID_STORAGE"] = STORAGE
+    import reader_core
+    reader_core.main_loop()
@@ -1,9 +1,22 @@
-# mesmo início do script anterior; importe seu AsyncConn e inicialize publisher
-from pubsub import AsyncConn
-PUB = AsyncConn("RPI Reader", "access_channel")  # mantém mesmo canal da API
-# ... dentro de registrar_evento(), depois de push_log_to_api/log saved:
-try:
-    PUB.publish({"badge_id": tag_id, "event_type": tipo, "result": "GRANTED" if autorizado else "DENIED", "reason": resultado, "ts": datetime.utcnow().isoformat()})
-except Exception:
-    pass
-# (o restante do código é semelhante ao sqlite version; só adicione a publish)
+#!/usr/bin/env python3
+"""
+Reader that also publishes every event straight to PubNub (same channel as the
+API, publish-only), so dashboards update even while the API is unreachable.
+The engine is reader_core.py; storage comes from RFID_STORAGE (default sqlite).
+"""
+import os
+import sys
+
+STORAGE = os.getenv("RFID_STORAGE", "sqlite")
+
+if __name__ == "__main__":
+    os.environ["RFID_STORAGE"] = STORAGE
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # pubsub.py na raiz
+    import reader_core
+    from pubsub import AsyncConn
+    PUB = AsyncConn("RPI Reader", "access_channel", subscribe=False)  # mantém mesmo canal da API; só publica
+    reader_core.publicadores.append(PUB.publish)
+    try:
+        reader_core.main_loop()
+    finally:
+        PUB.close()